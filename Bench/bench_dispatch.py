@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du chemin d'un ordre, du sender au postdict envoyé à bitmex.
+
+Mesure d'abord les briques: la copie de l'ordre (l'ancien aller-retour
+pickle de Chronos, un dict.copy et Order.copy), le postdict (create_order
+de BitMEX et Order.postdict) et la taille en mémoire d'un ordre.  Puis le
+chemin complet d'un Limit: OrderConditionned.get_load, la file de Chronos,
+Chronos.process, BitMEX.place (sans réseau, la requête est simulée) et
+l'ajout de sa validation, n fois, puis sans la validation (la recherche
+dans la table execution) pour ne garder que le traitement de l'ordre.
+Enfin le put et get d'un load dans la Queue et dans la LoadQueue de Chronos.
+python -m Bench.bench_dispatch -n 5000
+"""
+from queue import Queue
+from time import perf_counter, perf_counter_ns
+import argparse
+import json
+import pickle
+import sys
+
+import numpy as np
+
+from kolaBitMEXBot.kola.bargain import Bargain
+from kolaBitMEXBot.kola.chronos import Chronos
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+from kolaBitMEXBot.kola.custom_bitmex import BitMEX
+from kolaBitMEXBot.kola.orders.loadqueue import LoadQueue
+from kolaBitMEXBot.kola.orders.order import Load
+from kolaBitMEXBot.kola.orders.ordercond import OrderConditionned
+from kolaBitMEXBot.kola.settings import ORDERID_PREFIX
+from kolaBitMEXBot.kola.utils.orderfunc import create_order
+
+SYMBOL = "XBTUSD"
+
+
+class NoSocket:
+    """Le websocket n'est jamais connecté."""
+
+    def close(self):
+        pass
+
+
+def new_execution(i):
+    """Return a fake execution row, for the validations to search."""
+    return {
+        "execID": f"e{i}",
+        "orderID": f"o{i}",
+        "clOrdID": f"{ORDERID_PREFIX}Src{i % 50}-SO_F",
+        "symbol": SYMBOL,
+        "side": "Buy",
+        "orderQty": 100,
+        "price": 11000.0,
+        "ordType": "Limit",
+        "ordStatus": "Filled" if i % 2 else "New",
+        "triggered": "",
+        "transactTime": f"2020-08-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000Z",
+        "timestamp": "2020-08-01T00:00:00.000Z",
+    }
+
+
+class Cond:
+    """Une condition jamais évaluée, le sender envoie directement."""
+
+    def __repr__(self, short=True):
+        return "Cond()"
+
+
+def new_bitmex(nExecutions):
+    """Return a BitMEX whose requests return the orders they place."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol=SYMBOL)
+    ws.ws = NoSocket()  # __del__ ferme ws.ws
+    partial = {
+        "table": "execution",
+        "action": "partial",
+        "keys": ["execID"],
+        "data": [new_execution(i) for i in range(nExecutions)],
+    }
+    ws.handle_message(json.dumps(partial))
+    url = "https://testnet.bitmex.com/api/v1/"
+    bto = BitMEX(url, symbol=SYMBOL, apiKey="k", apiSecret="s", ws=ws)
+    bto._curl_bitmex = lambda path, postdict=None, **kwargs: postdict["orders"]
+    return bto
+
+
+def new_order():
+    """Return a buy Limit order as created from the command line."""
+    return create_order("buy", 100, "lastPrice", "Limit", "", prices=(11000, 11001))
+
+
+def timeit(name, fn, n):
+    """Run fn n times and print the time per call."""
+    start = perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = perf_counter() - start
+    print(f"{name:30s}: {elapsed / n * 1e6:8.2f} µs")
+
+
+def run_blocks(n):
+    """Time the copies and postdicts of an order."""
+    order = new_order()
+    order["clOrdID"] = "mlk_bench"
+    asDict = dict(order.items())
+    bto = new_bitmex(0)
+
+    print(f"Un ordre, {n} fois")
+    timeit("copie pickle (ancienne)", lambda: pickle.loads(pickle.dumps(asDict)), n)
+    timeit("dict.copy", asDict.copy, n)
+    timeit("Order.copy", order.copy, n)
+    timeit("Order.amend", lambda: order.amend(price=11002.0), n)
+    timeit("BitMEX.create_order", lambda: bto.create_order(**asDict), n)
+    timeit("Order.postdict", lambda: order.postdict(SYMBOL), n)
+    print(
+        f"{'taille dict / Order':30s}: "
+        f"{sys.getsizeof(asDict)} / {sys.getsizeof(order)} octets"
+    )
+
+
+def run_dispatch(nExecutions, n, validate=True):
+    """Time the whole path of n Limit orders, print the quantiles."""
+    bto = new_bitmex(nExecutions)
+    brg = Bargain(symbol=SYMBOL, dbo=bto)
+    queue = Queue()
+    chrs = Chronos(brg, queue, Queue(), amendWindow=0)
+    if not validate:
+        chrs.start_validation = lambda *args: None
+    sender = OrderConditionned(queue, new_order(), Cond(), nameT="bench")
+
+    durations = np.empty(n)
+    for i in range(n):
+        start = perf_counter_ns()
+        load, _ = sender.get_load()
+        queue.put(load)
+        chrs.process(queue.get())
+        durations[i] = perf_counter_ns() - start
+
+    durations /= 1e3
+    name = "get_load -> place" + (" -> valid." if validate else "")
+    print(
+        f"{name:30s}: {durations.mean():8.2f} µs"
+        f" (p50 {np.quantile(durations, 0.5):.2f}, "
+        f"p99 {np.quantile(durations, 0.99):.2f})"
+    )
+
+
+def run_queues(n):
+    """Time a put and a get of a load in Queue and LoadQueue."""
+    load = Load(new_order(), symbol=SYMBOL)
+    print(f"Un load, {n} fois")
+    for queue in [Queue(), LoadQueue()]:
+
+        def put_get():
+            queue.put(load)
+            queue.get()
+
+        timeit(f"{type(queue).__name__} put + get", put_get, n)
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-e",
+        "--nExecutions",
+        type=int,
+        default=100,
+        help="taille de la table execution (def. 100)",
+    )
+    parser.add_argument("-n", type=int, default=5000, help="nb d'ordres (def. 5000)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    run_blocks(args.n)
+    print(f"{args.n} ordres, table execution de {args.nExecutions} lignes")
+    run_dispatch(args.nExecutions, args.n)
+    run_dispatch(args.nExecutions, args.n, validate=False)
+    run_queues(args.n)
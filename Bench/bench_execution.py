@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de la lecture de la table execution par les hooks.
+
+Remplit la table execution d'un BitMEXWebsocket (non connecté) puis mesure
+les appels à Bargain.order_reached_status et get_exec_clID_with_, comme
+une condition hook, quand la table ne change pas (snapshot réutilisé) et
+quand chaque appel suit un insert.  L'ancienne lecture (DataFrame d'une
+deepcopy des lignes puis tri) sert de référence.
+python -m Bench.bench_execution -e 1000 -n 2000
+"""
+from copy import deepcopy
+from time import perf_counter
+import argparse
+import json
+
+from pandas import DataFrame
+
+from kolaBitMEXBot.kola.bargain import Bargain
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+from kolaBitMEXBot.kola.settings import ORDERID_PREFIX
+
+SYMBOL = "XBTUSD"
+
+
+class WSBroker:
+    """Le strict nécessaire d'un BitMEX pour lire la table execution."""
+
+    dummy = False
+
+    def __init__(self, ws):
+        self.ws = ws
+
+
+class NoSocket:
+    """Le websocket n'est jamais connecté."""
+
+    def close(self):
+        pass
+
+
+def new_execution(i):
+    """Return a fake execution row."""
+    return {
+        "execID": f"e{i}",
+        "orderID": f"o{i}",
+        "clOrdID": f"{ORDERID_PREFIX}Src{i % 50}-SO_F",
+        "symbol": SYMBOL,
+        "side": "Buy",
+        "orderQty": 100,
+        "price": 11000.0,
+        "ordType": "Limit",
+        "ordStatus": "Filled" if i % 2 else "New",
+        "triggered": "",
+        "transactTime": f"2020-08-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000Z",
+        "timestamp": "2020-08-01T00:00:00.000Z",
+    }
+
+
+def new_bargain(nExecutions):
+    """Return a bargain reading the execution table of a fake websocket."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol=SYMBOL)
+    ws.ws = NoSocket()  # __del__ ferme ws.ws
+    partial = {
+        "table": "execution",
+        "action": "partial",
+        "keys": ["execID"],
+        "data": [new_execution(i) for i in range(nExecutions)],
+    }
+    ws.handle_message(json.dumps(partial))
+    brg = Bargain(symbol=SYMBOL, dbo=WSBroker(ws))
+    brg.dbo = None  # lit le ws comme un bargain connecté
+    return brg
+
+
+def hook(brg):
+    """What a hook condition reads at each evaluation."""
+    clOrdIDs = brg.get_exec_clID_with_("Src7-S")
+    return brg.order_reached_status(clOrdIDs[-1], "Filled")
+
+
+def deepcopy_hook(brg):
+    """The same with the former deepcopy reading of the table."""
+    df = DataFrame(deepcopy(list(brg.bto.ws.data["execution"])))
+    df = df.sort_values("transactTime")
+    return df.loc[df.clOrdID == df.clOrdID.iloc[-1]].iloc[-1].ordStatus == "Filled"
+
+
+def timeit(name, fn, n):
+    """Run fn n times and print the rate."""
+    start = perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = perf_counter() - start
+    print(f"{name:30s}: {elapsed:.4f}s ({n / elapsed:,.0f} /s)")
+
+
+def run(nExecutions, n):
+    """Time the readings and print the results."""
+    brg = new_bargain(nExecutions)
+    ws = brg.bto.ws
+
+    def insert(i):
+        rows = [new_execution(nExecutions + i)]
+        message = {"table": "execution", "action": "insert", "data": rows}
+        ws.handle_message(json.dumps(message))
+
+    print(f"{nExecutions} executions, {n} évaluations")
+    timeit("deepcopy + DataFrame + tri", lambda i: deepcopy_hook(brg), n)
+    timeit("snapshot, table inchangée", lambda i: hook(brg), n)
+    timeit("snapshot, un insert par appel", lambda i: (insert(i), hook(brg)), n)
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-e",
+        "--nExecutions",
+        type=int,
+        default=1000,
+        help="taille de la table (def. 1000)",
+    )
+    parser.add_argument(
+        "-n", type=int, default=2000, help="nb d'évaluations (def. 2000)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    run(args.nExecutions, args.n)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark des décodeurs json sur un corpus de messages du websocket.
+
+Le corpus est un fichier texte (ou .gz) avec un message brut par ligne.
+Sans corpus, on en génère un avec un partial instrument de toutes les paires
+suivi de messages trade et quote.
+python -m Bench.bench_json [-c corpus.txt]
+"""
+from time import perf_counter_ns
+import argparse
+import gzip
+import json
+import random
+
+import numpy as np
+
+from kolaBitMEXBot.kola.connexion.jsondecode import available_decoders, get_decoder
+
+
+def fake_instrument(i):
+    """Return an instrument like row with many fields."""
+    row = {f"field{k}": random.random() * 1e4 for k in range(60)}
+    row.update(
+        {
+            "symbol": f"SYM{i:03d}",
+            "state": "Open",
+            "tickSize": 0.5,
+            "timestamp": "2020-05-01T12:00:00.000Z",
+            "lastPrice": 9000.5,
+            "bidPrice": 9000,
+            "askPrice": 9000.5,
+            "markPrice": 9000.27,
+        }
+    )
+    return row
+
+
+def make_corpus(nMsg=20000, nInstruments=200, seed=0):
+    """Génère un corpus de messages bruts."""
+    random.seed(seed)
+    corpus = [
+        json.dumps(
+            {
+                "table": "instrument",
+                "action": "partial",
+                "keys": ["symbol"],
+                "data": [fake_instrument(i) for i in range(nInstruments)],
+            }
+        )
+    ]
+    for i in range(nMsg):
+        ts = f"2020-05-01T12:{i // 6000 % 60:02d}:{i // 100 % 60:02d}.{i % 1000:03d}Z"
+        price = 9000 + random.randrange(-100, 100) / 2
+        if i % 2:
+            data = {
+                "timestamp": ts,
+                "symbol": "XBTUSD",
+                "side": random.choice(["Buy", "Sell"]),
+                "size": random.randrange(1, 1000),
+                "price": price,
+                "tickDirection": "ZeroPlusTick",
+                "trdMatchID": f"{random.getrandbits(128):032x}",
+                "grossValue": 1e6,
+                "homeNotional": 0.1,
+                "foreignNotional": 900,
+            }
+            msg = {"table": "trade", "action": "insert", "data": [data]}
+        else:
+            data = {
+                "timestamp": ts,
+                "symbol": "XBTUSD",
+                "bidSize": random.randrange(1, 100000),
+                "bidPrice": price,
+                "askPrice": price + 0.5,
+                "askSize": random.randrange(1, 100000),
+            }
+            msg = {"table": "quote", "action": "insert", "data": [data]}
+        corpus.append(json.dumps(msg))
+    return corpus
+
+
+def load_corpus(path):
+    """Load one raw message per line from path (gzip if .gz)."""
+    _open = gzip.open if path.endswith(".gz") else open
+    with _open(path, "rt", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def bench(name, corpus):
+    """Decode the corpus with decoder name and return its stats."""
+    _, loads = get_decoder(name)
+    timings = np.empty(len(corpus), dtype="int64")
+    start = perf_counter_ns()
+    for i, msg in enumerate(corpus):
+        t0 = perf_counter_ns()
+        loads(msg)
+        timings[i] = perf_counter_ns() - t0
+    total = (perf_counter_ns() - start) / 1e9
+
+    return {
+        "decoder": name,
+        "msg/s": len(corpus) / total,
+        "p50 (µs)": np.percentile(timings, 50) / 1e3,
+        "p99 (µs)": np.percentile(timings, 99) / 1e3,
+        "max (µs)": timings.max() / 1e3,
+    }
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-c", "--corpus", default=None, help="fichier de messages (def. généré)"
+    )
+    parser.add_argument(
+        "-n", "--nMsg", type=int, default=20000, help="taille du corpus généré"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    corpus = load_corpus(args.corpus) if args.corpus else make_corpus(args.nMsg)
+    print(f"{len(corpus)} messages, {sum(map(len, corpus)) / 1e6:.1f} MB")
+    for name in available_decoders():
+        stats = bench(name, corpus)
+        name = stats.pop("decoder")
+        print(f"{name}: " + ", ".join(f"{k}={v:,.1f}" for k, v in stats.items()))
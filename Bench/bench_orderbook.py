@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark du carnet orderBookL2 (wstables.OrderBook).
+
+Un partial de n niveaux de chaque côté puis des updates de taille, des
+ajouts/retraits de niveaux, et les lectures best_bid/best_ask et
+impact_price d'une quantité qui traverse d niveaux.
+python -m Bench.bench_orderbook -l 2000 -n 100000
+"""
+from random import Random
+from time import perf_counter
+import argparse
+
+from kolaBitMEXBot.kola.connexion.wstables import OrderBookL2
+
+SYMBOL = "XBTUSD"
+TICK = 0.5
+
+
+def level(i, side, size, price):
+    """Return an orderBookL2 row."""
+    return {"symbol": SYMBOL, "id": i, "side": side, "size": size, "price": price}
+
+
+def new_book(nLevels, mid=10000.0):
+    """Return the store with nLevels bids and asks around mid."""
+    rows = [level(i, "Sell", 100, mid + i * TICK) for i in range(1, nLevels + 1)]
+    rows += [level(-i, "Buy", 100, mid - i * TICK) for i in range(1, nLevels + 1)]
+    return OrderBookL2(rows)
+
+
+def timeit(name, fn, n):
+    """Run fn n times and print the rate."""
+    start = perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = perf_counter() - start
+    print(f"{name:28s}: {elapsed:.4f}s ({n / elapsed:,.0f} /s)")
+
+
+def run(nLevels, n, depth):
+    """Time the book operations and print the results."""
+    books = new_book(nLevels)
+    book = books.book(SYMBOL)
+    rnd = Random(0)
+    ids = [rnd.randint(1, nLevels) * rnd.choice([-1, 1]) for _ in range(n)]
+
+    def update_size(i):
+        books.update([{"symbol": SYMBOL, "id": ids[i], "size": i % 500 + 1}])
+
+    def move_level(i):
+        # retire un niveau puis le remet, comme un delete + insert du ws
+        row = book.rows[ids[i]]
+        books.delete([row])
+        books.insert([row])
+
+    qty = depth * 100
+    print(f"{nLevels} niveaux par côté, {n} opérations, impact sur {depth} niveaux")
+    timeit("update (taille)", update_size, n)
+    timeit("delete + insert (niveau)", move_level, n)
+    timeit("best_bid + best_ask", lambda i: (book.best_bid(), book.best_ask()), n)
+    timeit("impact_price", lambda i: book.impact_price("buy", qty), n)
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-l", "--nLevels", type=int, default=2000, help="niveaux par côté (def. 2000)"
+    )
+    parser.add_argument(
+        "-n", type=int, default=100000, help="nb d'opérations (def. 100000)"
+    )
+    parser.add_argument(
+        "-d", "--depth", type=int, default=10, help="niveaux traversés (def. 10)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    run(args.nLevels, args.n, args.depth)
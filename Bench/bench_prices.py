@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de Bargain.prices("lastPrice").
+
+Remplit la table instrument d'un BitMEXWebsocket (non connecté) avec un
+partial de n instruments puis mesure le nombre d'appels par seconde à
+Bargain.prices sur un BitMEX lisant ce websocket:
+- before: l'ancienne lecture, parcours de la table, tickLog en Decimal,
+trim_output puis copie des clefs contenant "rice" à chaque appel,
+- after: BitMEX.instrument_record, le record du websocket sans copie.
+python -m Bench.bench_prices -i 200 -n 20000
+"""
+from decimal import Decimal
+from time import perf_counter
+import argparse
+import json
+
+from kolaBitMEXBot.kola.bargain import Bargain
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+from kolaBitMEXBot.kola.custom_bitmex import BitMEX
+from kolaBitMEXBot.kola.utils.constantes import INSTRUMENT_PRICES
+from kolaBitMEXBot.kola.utils.general import trim_dic
+
+SYMBOL = "XBTUSD"
+
+
+def new_instrument(symbol, i=0):
+    """Return a fake instrument row with about as many fields as bitmex's."""
+    row = {"symbol": symbol, "state": "Open", "tickSize": 0.5, "multiplier": -1}
+    row.update({p: 9000.0 + i for p in INSTRUMENT_PRICES})
+    row.update({f"field{j}": j for j in range(80)})
+    return row
+
+
+class LegacyBitMEX(BitMEX):
+    """Un BitMEX qui lit l'instrument comme avant les records par symbol."""
+
+    def instrument_record(self, symbol):
+        instruments = self.ws.data["instrument"]
+        matchingInstruments = [i for i in instruments if i["symbol"] == symbol]
+        instrument = matchingInstruments[0]
+        instrument["tickLog"] = (
+            Decimal(str(instrument["tickSize"])).as_tuple().exponent * -1
+        )
+        # BitMEX.instrument était décoré par trim_output
+        instrument = trim_dic(instrument)
+        # et Bargain.prices en copiait les prix
+        return {k: v for (k, v) in instrument.items() if "rice" in k}
+
+
+class NoSocket:
+    """Le websocket n'est jamais connecté."""
+
+    def close(self):
+        pass
+
+
+def new_ws(nInstruments):
+    """Return a websocket whose instrument table got a partial."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol=SYMBOL)
+    ws.ws = NoSocket()  # __del__ ferme ws.ws
+    rows = [new_instrument(f"SYM{i}", i) for i in range(nInstruments - 1)]
+    rows.append(new_instrument(SYMBOL))
+    partial = {
+        "table": "instrument",
+        "action": "partial",
+        "keys": ["symbol"],
+        "data": rows,
+    }
+    ws._BitMEXWebsocket__on_message(json.dumps(partial))
+    return ws
+
+
+def time_prices(brg, nCalls):
+    """Return the seconds taken by nCalls calls to brg.prices."""
+    start = perf_counter()
+    for _ in range(nCalls):
+        brg.prices("lastPrice")
+    return perf_counter() - start
+
+
+def run(nInstruments, nCalls):
+    """Time the calls to Bargain.prices and print the results."""
+    ws = new_ws(nInstruments)
+    url = "https://testnet.bitmex.com/api/v1/"
+    opts = {"symbol": SYMBOL, "apiKey": "k", "apiSecret": "s", "ws": ws}
+
+    print(f"{nInstruments} instruments, {nCalls} appels")
+    for name, cls in [("before", LegacyBitMEX), ("after", BitMEX)]:
+        bto = cls(url, **opts)
+        elapsed = time_prices(Bargain(symbol=SYMBOL, dbo=bto), nCalls)
+        rate = nCalls / elapsed
+        print(f"{name}: Bargain.prices('lastPrice') {elapsed:.4f}s ({rate:,.0f} /s)")
+        bto.exit()
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-i",
+        "--nInstruments",
+        type=int,
+        default=200,
+        help="taille de la table instrument (def. 200)",
+    )
+    parser.add_argument(
+        "-n", "--nCalls", type=int, default=20000, help="nb d'appels (def. 20000)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    run(args.nInstruments, args.nCalls)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Rejeu d'une capture du websocket dans un BitMEXWebsocket non connecté.
+
+Sans capture (-f), en enregistre une synthétique de n trades et quotes puis
+la rejoue au plus vite, ou speed fois plus vite que la réception (-s), et
+affiche le nombre de messages traités par seconde.
+python -m Bench.bench_replay -n 20000
+python -m Bench.bench_replay -f ws-20200801.gz -s 10
+"""
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import argparse
+import json
+import os
+
+from kolaBitMEXBot.kola.connexion.capture import FrameRecorder, replay
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+
+SYMBOL = "XBTUSD"
+
+
+class NoSocket:
+    """Le websocket n'est jamais connecté."""
+
+    def close(self):
+        pass
+
+
+def messages(n):
+    """Yield the partials then n trade and quote inserts."""
+    flt = {"filter": {"symbol": SYMBOL}}
+    instrument = {"symbol": SYMBOL, "tickSize": 0.5, "lastPrice": 11000.0}
+    yield {
+        "table": "instrument",
+        "action": "partial",
+        "keys": ["symbol"],
+        "data": [instrument],
+    }
+    yield {"table": "trade", "action": "partial", "keys": [], "data": [], **flt}
+    yield {"table": "quote", "action": "partial", "keys": [], "data": [], **flt}
+    for i in range(n):
+        stamp = "2020-08-01T00:00:00.000Z"
+        price = 11000.0 + i % 10
+        if i % 2:
+            row = {"side": "Buy", "size": 100, "price": price}
+            table = "trade"
+        else:
+            row = {"bidPrice": price, "askPrice": price + 0.5}
+            table = "quote"
+        row.update(timestamp=stamp, symbol=SYMBOL)
+        yield {"table": table, "action": "insert", "data": [row]}
+
+
+def record(path, n):
+    """Write a synthetic capture of n inserts to path."""
+    recorder = FrameRecorder(path)
+    for message in messages(n):
+        recorder.write(json.dumps(message))
+    recorder.close()
+
+
+def run(path, speed):
+    """Replay path into a fresh websocket and print the results."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol=SYMBOL)
+    ws.ws = NoSocket()  # __del__ ferme ws.ws
+
+    start = perf_counter()
+    count = replay(path, ws.handle_message, speed)
+    elapsed = perf_counter() - start
+
+    print(f"{os.path.basename(path)}: {count} messages, speed={speed}")
+    print(f"rejeu: {elapsed:.4f}s ({count / elapsed:,.0f} msg/s)")
+    if ws.metrics is not None:
+        # au rejeu le délai bourse est l'âge de la capture, seul proc_* compte
+        print(ws.metrics.frame().round(4).to_string())
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-f", "--file", help="capture à rejouer (def. synthétique)")
+    parser.add_argument(
+        "-n", type=int, default=20000, help="nb d'inserts synthétiques (def. 20000)"
+    )
+    parser.add_argument(
+        "-s", "--speed", type=float, default=None, help="vitesse (def. au plus vite)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    if args.file:
+        run(args.file, args.speed)
+    else:
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "capture.gz")
+            record(path, args.n)
+            run(path, args.speed)
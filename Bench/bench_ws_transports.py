@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Latence des transports websocket: thread (websocket-client) contre asyncio.
+
+Un serveur local joue BitMEX: il envoie les partials puis, à la demande du
+client, n inserts trade horodatés.  On mesure en µs le délai entre l'envoi
+et le traitement du message (handler) puis entre l'envoi et le réveil d'un
+consommateur qui attend la table trade (un thread pour le transport thread,
+une coroutine de la même boucle pour le transport asyncio).
+python -m Bench.bench_ws_transports -n 2000 -p 0.0005
+"""
+from collections import deque
+from threading import Thread
+from time import perf_counter_ns
+import argparse
+import asyncio
+import json
+
+import numpy as np
+from websockets.asyncio.server import serve
+
+from kolaBitMEXBot.kola.connexion.async_ws import AsyncBitMEXWebsocket
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+
+SYMBOL = "XBTUSD"
+
+
+def partials():
+    """Return the partials a client waits for on connect."""
+    flt = {"filter": {"symbol": SYMBOL}}
+    instrument = {"symbol": SYMBOL, "tickSize": 0.5, "lastPrice": 11000.0}
+    return [
+        {
+            "table": "instrument",
+            "action": "partial",
+            "keys": ["symbol"],
+            "data": [instrument],
+        },
+        {"table": "trade", "action": "partial", "keys": [], "data": [], **flt},
+        {"table": "quote", "action": "partial", "keys": [], "data": [], **flt},
+        {
+            "table": "orderBookL2",
+            "action": "partial",
+            "keys": ["symbol", "id", "side"],
+            "data": [],
+            **flt,
+        },
+    ]
+
+
+def trade(i):
+    """Return a trade insert stamped with its sending time."""
+    row = {
+        "timestamp": "2020-08-01T00:00:00.000Z",
+        "symbol": SYMBOL,
+        "side": "Buy",
+        "size": 100,
+        "price": 11000.0 + i % 10,
+        "sent": perf_counter_ns(),
+    }
+    return json.dumps({"table": "trade", "action": "insert", "data": [row]})
+
+
+class StandInServer:
+    """Le serveur BitMEX local, dans sa boucle et son thread."""
+
+    def __init__(self, pause):
+        self.pause = pause
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, daemon=True).start()
+        self.port = asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    async def start(self):
+        self.server = await serve(self.handler, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handler(self, ws):
+        for message in partials():
+            await ws.send(json.dumps(message))
+        # {"op": "bench", "args": [n]} lance l'envoi des n trades
+        async for message in ws:
+            n = json.loads(message)["args"][0]
+            for i in range(n):
+                await ws.send(trade(i))
+                await asyncio.sleep(self.pause)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+
+
+def record(ws):
+    """Record the handler latencies, return them and the stamps to consume."""
+    handled, pending = [], deque()
+
+    def on_trade(table, rows):
+        now = perf_counter_ns()
+        for row in rows:
+            handled.append(now - row["sent"])
+            pending.append(row["sent"])
+
+    ws.events.subscribe("trade", on_trade)
+    return handled, pending
+
+
+def consume(pending, consumed, now=perf_counter_ns):
+    """Consume the stamps of the trades seen by the consumer."""
+    t = now()
+    while pending:
+        consumed.append(t - pending.popleft())
+
+
+def run_thread(port, n):
+    """Latencies of the websocket-client thread transport."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol=SYMBOL)
+    ws.connect(f"http://127.0.0.1:{port}", SYMBOL, shouldAuth=False)
+    handled, pending = record(ws)
+    consumed = []
+
+    def consumer():
+        since = ws.events.version("trade")
+        while len(consumed) < n:
+            ws.events.wait("trade", timeout=1, since=since)
+            since = ws.events.version("trade")
+            consume(pending, consumed)
+
+    thread = Thread(target=consumer)
+    thread.start()
+    ws.send_command("bench", [n])
+    thread.join()
+    ws.exit()
+    return handled, consumed
+
+
+def run_asyncio(port, n):
+    """Latencies of the asyncio transport, consumer in the same loop."""
+
+    async def main():
+        ws = AsyncBitMEXWebsocket("apiKey", "apiSecret", symbol=SYMBOL)
+        await ws.connect_async(f"http://127.0.0.1:{port}", SYMBOL, shouldAuth=False)
+        handled, pending = record(ws)
+        consumed = []
+        ws.send_command("bench", [n])
+        since = ws.events.version("trade")
+        while len(consumed) < n:
+            await ws.events.wait_async("trade", timeout=1, since=since)
+            since = ws.events.version("trade")
+            consume(pending, consumed)
+        ws.exit()
+        return handled, consumed
+
+    return asyncio.run(main())
+
+
+def stats(latencies):
+    """Return p50, p99 and max of latencies in µs."""
+    lat = np.array(latencies) / 1e3
+    return {
+        "p50": np.percentile(lat, 50),
+        "p99": np.percentile(lat, 99),
+        "max": lat.max(),
+    }
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2000, help="nb de trades (def. 2000)")
+    parser.add_argument(
+        "-p",
+        "--pause",
+        type=float,
+        default=0.0005,
+        help="pause entre deux trades en s (def. 0.0005)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    server = StandInServer(args.pause)
+    print(f"{args.n} trades, un toutes les {args.pause * 1e3:.2f}ms, latences en µs")
+    for name, run in [("thread", run_thread), ("asyncio", run_asyncio)]:
+        handled, consumed = run(server.port, args.n)
+        for step, lat in [("handler", handled), ("consumer", consumed)]:
+            line = ", ".join(f"{k}={v:,.1f}" for k, v in stats(lat).items())
+            print(f"{name:8s}{step:9s}: {line}")
+    server.stop()
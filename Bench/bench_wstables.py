@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark des mises à jour de la table order du websocket.
+
+Rejoue les mêmes messages update/insert sur une liste parcourue avec
+findItemByKeys (ancienne implémentation) et sur une IndexedTable.
+python -m Bench.bench_wstables -n 500 -m 5000
+"""
+from time import perf_counter
+import argparse
+import random
+
+from kolaBitMEXBot.kola.connexion.wstables import (
+    IndexedTable,
+    find_item,
+    findItemByKeys,
+)
+
+KEYS = ["orderID"]
+
+
+def new_order(i):
+    """Return a fake order row."""
+    return {
+        "orderID": f"oid-{i:08d}",
+        "clOrdID": f"mlk_bench{i}",
+        "symbol": "XBTUSD",
+        "side": "Buy",
+        "price": 9000.0,
+        "orderQty": 100,
+        "leavesQty": 100,
+        "cumQty": 0,
+        "ordStatus": "New",
+    }
+
+
+def make_messages(nOrders, nUpdates, fillRatio=0.05, seed=0):
+    """Crée un partial de nOrders ordres et nUpdates messages qui le modifient."""
+    rnd = random.Random(seed)
+    partial = [new_order(i) for i in range(nOrders)]
+    alive = [o["orderID"] for o in partial]
+    nextID = nOrders
+    messages = []
+    for _ in range(nUpdates):
+        j = rnd.randrange(len(alive))
+        oid = alive[j]
+        if rnd.random() < fillRatio:
+            # l'ordre est rempli et sera retiré, on en insère un autre
+            messages.append(("update", [{"orderID": oid, "leavesQty": 0}]))
+            order = new_order(nextID)
+            nextID += 1
+            messages.append(("insert", [order]))
+            alive[j] = order["orderID"]
+        else:
+            price = 9000.0 + rnd.randrange(-200, 200) / 2
+            messages.append(("update", [{"orderID": oid, "price": price}]))
+    return partial, messages
+
+
+def replay(table, messages):
+    """Apply the messages to table like BitMEXWebsocket.__on_message."""
+    for action, data in messages:
+        if action == "insert":
+            if isinstance(table, IndexedTable):
+                table.insert([dict(d) for d in data])
+            else:
+                table += [dict(d) for d in data]
+        else:
+            for updateData in data:
+                item = find_item(table, KEYS, updateData)
+                if not item:
+                    continue
+                item.update(updateData)
+                if item["leavesQty"] <= 0:
+                    table.remove(item)
+    return table
+
+
+def replay_legacy(table, messages):
+    """Same as replay but always with the linear findItemByKeys."""
+    for action, data in messages:
+        if action == "insert":
+            table += [dict(d) for d in data]
+        else:
+            for updateData in data:
+                item = findItemByKeys(KEYS, table, updateData)
+                if not item:
+                    continue
+                item.update(updateData)
+                if item["leavesQty"] <= 0:
+                    table.remove(item)
+    return table
+
+
+def run(nOrders, nUpdates):
+    """Time both implementations and print the results."""
+    partial, messages = make_messages(nOrders, nUpdates)
+
+    legacy = [dict(o) for o in partial]
+    start = perf_counter()
+    replay_legacy(legacy, messages)
+    tLegacy = perf_counter() - start
+
+    indexed = IndexedTable(KEYS, [dict(o) for o in partial])
+    start = perf_counter()
+    replay(indexed, messages)
+    tIndexed = perf_counter() - start
+
+    assert sorted(o["orderID"] for o in legacy) == sorted(
+        o["orderID"] for o in indexed
+    ), "Les deux tables doivent être identiques."
+
+    nMsg = len(messages)
+    print(f"{nOrders} orders, {nMsg} messages")
+    print(f"list + findItemByKeys: {tLegacy:.4f}s ({nMsg / tLegacy:,.0f} msg/s)")
+    print(f"IndexedTable:          {tIndexed:.4f}s ({nMsg / tIndexed:,.0f} msg/s)")
+    print(f"speedup: x{tLegacy / tIndexed:.1f}")
+
+
+def get_args():
+    """Parse the function's arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n", "--nOrders", type=int, default=500, help="taille de la table (def. 500)"
+    )
+    parser.add_argument(
+        "-m", "--nUpdates", type=int, default=5000, help="nb de messages (def. 5000)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    run(args.nOrders, args.nUpdates)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Les fakes partagés par les tests de kola, en fixtures."""
+import json
+
+import pytest
+
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+from kolaBitMEXBot.kola.custom_bitmex import BitMEX
+import kolaBitMEXBot.kola.utils.exceptions as ke
+
+
+class NoSocket:
+    """Le websocket n'est jamais connecté."""
+
+    def __init__(self):
+        self.sent = []
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def get_partials(symbol, price):
+    """Return the partial messages of the trade, quote and instrument tables."""
+    flt = {"filter": {"symbol": symbol}}
+    trade = {"symbol": symbol, "price": price, "timestamp": "2020-08-01T00:00:00Z"}
+    return [
+        {"table": "trade", "action": "partial", "keys": [], "data": [trade], **flt},
+        {"table": "quote", "action": "partial", "keys": [], "data": [], **flt},
+        {
+            "table": "instrument",
+            "action": "partial",
+            "keys": ["symbol"],
+            "data": [{"symbol": symbol, "tickSize": 0.5}],
+            **flt,
+        },
+    ]
+
+
+def get_bitmex(margin=None, position=None):
+    """Return a BitMEX on a fed websocket, its REST calls are recorded."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+    ws.ws = NoSocket()
+    on_message = ws._BitMEXWebsocket__on_message
+    account = [
+        ("margin", ["account", "currency"], margin),
+        ("position", ["account", "symbol", "currency"], position),
+    ]
+    for table, keys, row in account:
+        data = [] if row is None else [row]
+        message = {"table": table, "action": "partial", "keys": keys, "data": data}
+        on_message(json.dumps(message))
+    for message in get_partials("XBTUSD", 11000):
+        on_message(json.dumps(message))
+
+    url = "https://testnet.bitmex.com/api/v1/"
+    bto = BitMEX(url, symbol="XBTUSD", apiKey="k", apiSecret="s", ws=ws)
+    bto.calls = []
+
+    def curl_bitmex(path, query=None, **kwargs):
+        bto.calls.append(path)
+        if path == "position":
+            return [{"symbol": "XBTUSD", "leverage": 3, "currentQty": 1}]
+        return {"currency": "XBt", "availableMargin": 7}
+
+    bto._curl_bitmex = curl_bitmex
+    return bto, on_message
+
+
+class FakeBTO:
+    """
+    Un bto qui enregistre les requêtes des ordres.
+
+    Refuse les ordres de plus de maxQty contrats et les amends des orderID
+    de refused (ordre déjà déclenché...).
+    """
+
+    def __init__(self, maxQty=1000, refused=()):
+        self.maxQty = maxQty
+        self.refused = set(refused)
+        # placements: bulks, clOrdID des place et (requête, ids) en ordre
+        self.bulks, self.singles, self.calls = [], [], []
+        # amends: bulks et orderID des amend
+        self.amendBulks, self.amends = [], []
+
+    def check(self, order):
+        if order["orderQty"] > self.maxQty:
+            raise ke.InsufficientBalance("insufficient available balance")
+        return dict(order, orderID=f"o{order['clOrdID']}")
+
+    def create_bulk_orders(self, orders):
+        self.bulks.append(orders)
+        self.calls.append(("bulk", [o["clOrdID"] for o in orders]))
+        return [self.check(o) for o in orders]
+
+    def place(self, orderQty, asBulk=False, **opts):
+        self.singles.append(opts["clOrdID"])
+        return [self.check(dict(opts, orderQty=orderQty))]
+
+    def cancel(self, ID):
+        self.calls.append(("cancel", ID))
+        return {"clOrdID": ID}
+
+    def amend_bulk_orders(self, orders):
+        self.amendBulks.append(orders)
+        if self.refused & {o["orderID"] for o in orders}:
+            raise ke.InvalidOrdStatus("Invalid ordStatus")
+        return [dict(o, clOrdID=f"cl{o['orderID']}") for o in orders]
+
+    def amend(self, order, **kwargs):
+        self.amends.append(order["orderID"])
+        if order["orderID"] in self.refused:
+            raise ke.InvalidOrdStatus("Invalid ordStatus")
+        return dict(order, **kwargs)
+
+
+class FakeBargain:
+    symbol = "XBTUSD"
+
+    def __init__(self, bto):
+        self.bto = bto
+
+
+@pytest.fixture
+def no_socket():
+    """Return the NoSocket class, ws.ws = no_socket()."""
+    return NoSocket
+
+
+@pytest.fixture
+def partials():
+    """Return partials(symbol, price), the partials of a symbol's tables."""
+    return get_partials
+
+
+@pytest.fixture
+def bitmex():
+    """Return bitmex(margin, position) -> (BitMEX, on_message), see get_bitmex."""
+    return get_bitmex
+
+
+@pytest.fixture
+def fake_bto():
+    """Return the FakeBTO class, sub-classable in a test."""
+    return FakeBTO
+
+
+@pytest.fixture
+def fake_bargain():
+    """Return the FakeBargain class, fake_bargain(bto)."""
+    return FakeBargain
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.async_rest"""
+import asyncio
+import json
+from time import monotonic
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import web  # noqa: E402
+
+from kolaBitMEXBot.kola.connexion.async_rest import AsyncBitMEXRest  # noqa: E402
+from kolaBitMEXBot.kola.connexion.auth import generate_signature  # noqa: E402
+from kolaBitMEXBot.kola.connexion.retrypolicy import (  # noqa: E402
+    RetryPolicy,
+    get_breaker,
+)
+from kolaBitMEXBot.kola.settings import HTTP_BREAKER  # noqa: E402
+import kolaBitMEXBot.kola.utils.exceptions as ke  # noqa: E402
+
+
+def error(status, message):
+    return web.json_response({"error": {"message": message}}, status=status)
+
+
+class StandInBitMEX:
+    """Un BitMEX local: vérifie les signatures et rejoue des erreurs."""
+
+    def __init__(self):
+        self.calls = {}
+        self.inFlight = self.maxInFlight = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_route("*", "/api/v1/{path:.*}", self.handle)
+        return app
+
+    async def handle(self, request):
+        body = await request.text()
+        signature = generate_signature(
+            "apiSecret",
+            request.method,
+            str(request.rel_url),
+            request.headers["api-expires"],
+            body,
+        )
+        if signature != request.headers["api-signature"]:
+            return error(401, "Signature not valid.")
+
+        path = request.match_info["path"]
+        self.calls[path] = self.calls.get(path, 0) + 1
+        headers = {"X-Ratelimit-Remaining": "100", "X-Ratelimit-Limit": "120"}
+
+        if path == "slow":
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+            await asyncio.sleep(0.2)
+            self.inFlight -= 1
+        elif path == "flaky" and self.calls[path] == 1:
+            # les gateways répondent en html
+            return web.Response(status=503, text="<html>503</html>")
+        elif path == "broken":
+            return web.Response(status=500, text="<html>500</html>")
+        elif path == "order" and request.method == "PUT":
+            return error(400, "Invalid ordStatus")
+        elif path == "order/bulk":
+            return error(400, "Account has insufficient Available Balance")
+        elif path == "order" and request.method == "DELETE":
+            return error(404, "Not Found")
+        elif path == "order" and request.method == "POST":
+            return error(400, "Duplicate clOrdID")
+        elif path == "order" and request.method == "GET":
+            clOrdIDs = json.loads(request.query["filter"])["clOrdID"]
+            return web.json_response([{"clOrdID": i, "orderID": "o"} for i in clOrdIDs])
+        elif path == "missing":
+            return error(404, "Not Found")
+
+        reply = {"path": path, "query": dict(request.query)}
+        if body:
+            reply["body"] = json.loads(body)
+        return web.json_response(reply, headers=headers)
+
+
+def run_client(test):
+    """Run test(client, server) against a stand-in BitMEX."""
+
+    async def main():
+        server = StandInBitMEX()
+        runner = web.AppRunner(server.app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client = AsyncBitMEXRest(
+            f"http://127.0.0.1:{port}/api/v1/",
+            "apiKey",
+            "apiSecret",
+            timeout=5,
+            retryPolicy=RetryPolicy(base=0.01, cap=0.01),
+        )
+        try:
+            await test(client, server)
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_signed_requests():
+    """Requêtes signées, query et body transmis, 503 en html relancé."""
+
+    async def test(client, server):
+        reply = await client.instruments({"symbol": "XBTUSD"})
+        assert json.loads(reply["query"]["filter"]) == {"symbol": "XBTUSD"}
+        reply = await client.curl_bitmex("order/x", postdict={"clOrdID": "a b"})
+        assert reply["body"] == {"clOrdID": "a b"}
+        assert (await client.curl_bitmex("flaky"))["path"] == "flaky"
+        assert server.calls["flaky"] == 2
+
+    run_client(test)
+
+
+def test_errors():
+    """Les erreurs 400 et 404 donnent les mêmes exceptions que BitMEX."""
+
+    async def test(client, server):
+        with pytest.raises(ke.InvalidOrdStatus):
+            await client.curl_bitmex("order", postdict={"orderID": "x"}, verb="PUT")
+        with pytest.raises(ke.InsufficientBalance):
+            await client.create_bulk_orders([{"orderQty": 10}])
+        assert await client.cancel({"orderID": ["x"]}) is None
+        with pytest.raises(ke.InvalidOrder) as e:
+            await client.curl_bitmex("broken")
+        assert e.value.extra == {} and server.calls["broken"] == 1
+
+    run_client(test)
+
+
+def test_answered_retries_keep_the_circuit_closed():
+    """Un clOrdID dupliqué renvoie l'ordre placé, un 404 ne coupe pas."""
+
+    async def test(client, server):
+        reply = await client.curl_bitmex("order", postdict={"clOrdID": "mlk_a"})
+        assert reply == {"clOrdID": "mlk_a", "orderID": "o"}
+        assert server.calls["order"] == 2
+
+        client.retryPolicy = RetryPolicy(maxRetries=HTTP_BREAKER[0] + 1, base=0.01)
+        with pytest.raises(ke.MaxRetries) as e:
+            await client.curl_bitmex("missing")
+        assert not isinstance(e.value, ke.CircuitOpen)
+        assert get_breaker(client.base_url, "GET", "missing").state == "closed"
+
+    run_client(test)
+
+
+def test_requests_in_flight():
+    """Les requêtes partent ensemble sur le pool de connexions."""
+
+    async def test(client, server):
+        start = monotonic()
+        replies = await asyncio.gather(*[client.curl_bitmex("slow") for _ in range(8)])
+        assert len(replies) == 8 and monotonic() - start < 1
+        assert server.maxInFlight > 1
+
+    run_client(test)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.async_ws"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("websockets")
+
+from websockets.asyncio.server import serve  # noqa: E402
+
+from kolaBitMEXBot.kola.connexion.async_ws import AsyncBitMEXWebsocket  # noqa: E402
+
+PARTIALS = [
+    {
+        "table": "instrument",
+        "action": "partial",
+        "keys": ["symbol"],
+        "data": [{"symbol": "XBTUSD", "tickSize": 0.5, "lastPrice": 11000.0}],
+    },
+    {
+        "table": "trade",
+        "action": "partial",
+        "keys": [],
+        "filter": {"symbol": "XBTUSD"},
+        "data": [{"symbol": "XBTUSD", "price": 11000.0}],
+    },
+    {"table": "quote", "action": "partial", "keys": [], "data": []},
+    {
+        "table": "orderBookL2",
+        "action": "partial",
+        "keys": ["symbol", "id", "side"],
+        "filter": {"symbol": "XBTUSD"},
+        "data": [
+            {"symbol": "XBTUSD", "id": 1, "side": "Sell", "size": 10, "price": 11000.5},
+            {"symbol": "XBTUSD", "id": 2, "side": "Buy", "size": 10, "price": 11000.0},
+        ],
+    },
+]
+
+
+async def handler(ws):
+    """Un BitMEX qui n'envoie que les partials."""
+    for message in PARTIALS:
+        await ws.send(json.dumps(message))
+    await ws.wait_closed()
+
+
+def test_connect_async():
+    """Dans une coroutine, le client lit dans la boucle courante."""
+
+    async def main():
+        async with serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            ws = AsyncBitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+            await ws.connect_async(f"http://127.0.0.1:{port}", shouldAuth=False)
+            assert ws.get_instrument("XBTUSD")["tickLog"] == 1
+            assert list(ws.table_view("trade")["price"]) == [11000.0]
+            assert ws.market_depth().best_ask() == 11000.5
+            with pytest.raises(RuntimeError):
+                ws.connect(f"http://127.0.0.1:{port}", shouldAuth=False)
+            ws.exit()
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
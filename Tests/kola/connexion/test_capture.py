@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.capture"""
+import json
+from time import monotonic
+
+from kolaBitMEXBot.kola.connexion.capture import FrameRecorder, read_frames, replay
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+
+
+def test_record_and_replay(tmp_path, no_socket, partials):
+    """Les messages enregistrés reconstruisent les mêmes tables au rejeu."""
+    path = str(tmp_path / "ws-{date}.gz")
+    ws = BitMEXWebsocket("apiKey", "apiSecret")
+    ws.ws = no_socket()
+    ws.start_capture(path)
+    for message in partials("XBTUSD", 11000.0):
+        ws.handle_message(json.dumps(message))
+    capture = ws.recorder.path
+    ws.exit()
+    assert "{date}" not in capture
+
+    frames = list(read_frames(capture))
+    assert len(frames) == 3
+    assert [s for s, _ in frames] == sorted(s for s, _ in frames)
+
+    replayed = BitMEXWebsocket("apiKey", "apiSecret")
+    replayed.ws = no_socket()
+    assert replay(capture, replayed.handle_message, speed=None) == 3
+    assert replayed.symbol_ready("XBTUSD")
+    assert replayed.recent_trades("XBTUSD")[0]["price"] == 11000.0
+
+
+def test_append_and_speed(tmp_path):
+    """Chaque ouverture ajoute un membre gzip, speed divise les délais."""
+    path = str(tmp_path / "ws.gz")
+    for frames in [["a", b"b"], ["c"]]:
+        recorder = FrameRecorder(path)
+        for frame in frames:
+            recorder.write(frame)
+        recorder.close()
+    assert [f for _, f in read_frames(path)] == ["a", "b", "c"]
+
+    # deux messages à 0.2s d'intervalle
+    with open(path, "wb"):
+        pass
+    recorder = FrameRecorder(path)
+    recorder._file.write("0\ta\n200000000\tb\n")
+    recorder.close()
+
+    start = monotonic()
+    received = []
+    assert replay(path, received.append, speed=10) == 2
+    assert 0.015 < monotonic() - start < 0.2
+    assert received == ["a", "b"]
+
+    stopped = replay(path, received.append, speed=None, stop=lambda: True)
+    assert stopped == 0
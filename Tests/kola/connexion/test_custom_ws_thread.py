@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.custom_ws_thread"""
+import asyncio
+import json
+from threading import Thread, Timer
+from time import monotonic, sleep
+
+import pytest
+
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import (
+    BitMEXWebsocket,
+    get_backoff,
+    get_instrument_symbols,
+    new_tables,
+)
+
+
+def test_get_instrument_symbols():
+    """Le symbol, son index puis l'allowlist, sans doublon."""
+    assert get_instrument_symbols("XBTUSD") == ["XBTUSD", ".BXBT"]
+    assert get_instrument_symbols("XBTUSD", ["XBTUSD", "ETHUSD"]) == [
+        "XBTUSD",
+        ".BXBT",
+        "ETHUSD",
+    ]
+    # pas d'index connu
+    assert get_instrument_symbols("ETHUSD", ["ETHUSD"]) == ["ETHUSD"]
+
+
+def test_get_instrument(no_socket):
+    """L'instrument est retrouvé par son symbol et son tickLog suit tickSize."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret")
+    ws.ws = no_socket()
+    on_message = ws._BitMEXWebsocket__on_message
+    data = [{"symbol": s, "tickSize": 0.5, "lastPrice": 1.0} for s in ["XBTUSD", "E"]]
+    partial = {"table": "instrument", "action": "partial", "keys": ["symbol"]}
+    on_message(json.dumps({**partial, "data": data}))
+    instrument = ws.get_instrument("XBTUSD")
+    assert instrument["tickLog"] == 1
+    # chaque message publie un changement de la table
+    assert ws.events.version("instrument") == (1,)
+
+    update = [{"symbol": "XBTUSD", "tickSize": 0.01, "lastPrice": 2.0}]
+    on_message(json.dumps({"table": "instrument", "action": "update", "data": update}))
+    # mis à jour sur place
+    assert ws.get_instrument("XBTUSD") is instrument
+    assert instrument["lastPrice"] == 2.0 and instrument["tickLog"] == 2
+
+    with pytest.raises(Exception):
+        ws.get_instrument("ETHUSD")
+
+
+def test_add_symbols(no_socket, partials):
+    """Les symbols partagent la connexion, chacun lit ses lignes."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+    ws.ws = no_socket()
+    ws.shouldAuth, ws.endpoint = True, "https://testnet.bitmex.com/api/v1"
+    on_message = ws._BitMEXWebsocket__on_message
+    for message in partials("XBTUSD", 11000):
+        on_message(json.dumps(message))
+
+    def send_partials():
+        for message in partials("ADAU20", 0.1):
+            on_message(json.dumps(message))
+
+    Timer(0.05, send_partials).start()
+    assert ws.add_symbols(["XBTUSD", "ADAU20"]) == ["ADAU20"]
+
+    assert ws.symbols == ["XBTUSD", "ADAU20"]
+    topics = ws.ws.sent[0]["args"]
+    assert ws.ws.sent[0]["op"] == "subscribe" and "trade:ADAU20" in topics
+    assert "instrument:.BADAXBT30M" in topics and "execution:ADAU20" in topics
+    assert "ADAU20" in ws.wsURL
+
+    assert list(ws.table_view("trade")["price"]) == [11000]
+    assert list(ws.table_view("trade", copy=True)["price"]) == [11000]
+    assert list(ws.table_view("trade", symbol="ADAU20")["price"]) == [0.1]
+    assert ws.get_instrument("ADAU20")["tickLog"] == 1
+    assert ws.add_symbols(["ADAU20"]) == []
+
+
+def test_market_depth(no_socket):
+    """Les messages orderBookL2 tiennent le carnet trié du symbol."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+    ws.ws = no_socket()
+    ws.orderBook = "orderBookL2"
+    with pytest.raises(Exception):
+        ws.market_depth()
+
+    def send(action, data):
+        message = {"table": "orderBookL2", "action": action, "data": data}
+        if action == "partial":
+            message.update(keys=["symbol", "id", "side"], filter={"symbol": "XBTUSD"})
+        ws.handle_message(json.dumps(message))
+
+    send(
+        "partial",
+        [
+            {"symbol": "XBTUSD", "id": 1, "side": "Sell", "size": 10, "price": 11001},
+            {"symbol": "XBTUSD", "id": 2, "side": "Buy", "size": 10, "price": 11000},
+        ],
+    )
+    send(
+        "insert",
+        [{"symbol": "XBTUSD", "id": 3, "side": "Sell", "size": 5, "price": 11000.5}],
+    )
+    send("update", [{"symbol": "XBTUSD", "id": 2, "side": "Buy", "size": 1}])
+    send("delete", [{"symbol": "XBTUSD", "id": 1, "side": "Sell"}])
+
+    book = ws.market_depth()
+    assert (book.best_bid(), book.best_ask()) == (11000, 11000.5)
+    assert book.levels("Buy") == [(11000, 1)]
+    assert ws.has_partial("orderBookL2", "XBTUSD")
+    assert ws.symbol_tables()[-1] == "orderBookL2"
+
+
+def test_get_backoff():
+    """Le délai double par tentative, jitteré, jusqu'au plafond."""
+    for attempt, low, high in [(0, 0.5, 1), (3, 4, 8), (10, 15, 30), (10**6, 15, 30)]:
+        assert all(low <= get_backoff(attempt, 1, 30) <= high for _ in range(20))
+
+
+def test_resync(no_socket, partials):
+    """Les tables d'une reconnexion ne remplacent les courantes qu'une fois prêtes."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+    ws.ws = no_socket()
+    ws.shouldAuth = False
+    for message in partials("XBTUSD", 11000):
+        ws.handle_message(json.dumps(message))
+
+    ws.stale = True
+    fresh = new_tables()
+    since = ws.events.version("trade")
+    messages = partials("XBTUSD", 12000)
+    for message in messages[:-1]:
+        ws.handle_message(json.dumps(message), fresh)
+    # encore les anciennes tables, personne n'est réveillé
+    assert ws.stale and ws.recent_trades()[0]["price"] == 11000
+    assert ws.events.version("trade") == since
+
+    ws.handle_message(json.dumps(messages[-1]), fresh)
+    assert not ws.stale and ws.data is fresh[0]
+    assert ws.recent_trades()[0]["price"] == 12000
+    assert ws.events.version("trade") != since
+    # la connexion continue d'écrire dans les tables devenues courantes
+    row = {"symbol": "XBTUSD", "price": 1}
+    insert = {"table": "trade", "action": "insert", "data": [row]}
+    ws.handle_message(json.dumps(insert), fresh)
+    assert ws.recent_trades()[-1]["price"] == 1
+
+
+def test_reconnect(partials):
+    """Une coupure se rattrape en quelques secondes, hors du thread du ws."""
+    serve = pytest.importorskip("websockets.asyncio.server").serve
+    connexions = []
+
+    async def handler(sock):
+        connexions.append(sock)
+        for message in partials("XBTUSD", 11000 + len(connexions)):
+            await sock.send(json.dumps(message))
+        if len(connexions) == 1:
+            await sock.close()
+        else:
+            await sock.wait_closed()
+
+    loop = asyncio.new_event_loop()
+    Thread(target=loop.run_forever, daemon=True).start()
+
+    async def start():
+        server = await serve(handler, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    server, port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+    start = monotonic()
+    ws.connect(f"http://127.0.0.1:{port}", "XBTUSD", shouldAuth=False, orderBook=None)
+
+    while len(connexions) < 2 or ws.stale:
+        assert monotonic() - start < 5
+        sleep(0.05)
+    assert ws.recent_trades()[0]["price"] == 11002
+    assert ws.retries == 0
+
+    ws.exit()
+    loop.call_soon_threadsafe(server.close)
+
+
+def test_table_snapshot(no_socket, partials):
+    """La copie d'une table n'est refaite que si sa version change."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret", symbol="XBTUSD")
+    ws.ws = no_socket()
+    for message in partials("XBTUSD", 11000):
+        ws.handle_message(json.dumps(message))
+
+    snapshot = ws.table_snapshot("trade")
+    assert list(snapshot.frame["price"]) == [11000]
+    assert ws.table_snapshot("trade") is snapshot
+    assert ws.table_snapshot("instrument").frame.loc[0, "tickLog"] == 1
+
+    row = {"symbol": "XBTUSD", "price": 11001, "timestamp": "2020-08-01T00:00:01Z"}
+    ws.handle_message(json.dumps({"table": "trade", "action": "insert", "data": [row]}))
+    new = ws.table_snapshot("trade")
+    assert new.version > snapshot.version
+    assert list(new.frame["price"]) == [11000, 11001]
+    assert list(snapshot.frame["price"]) == [11000]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.httpmetrics"""
+from kolaBitMEXBot.kola.connexion.httpmetrics import HTTPMetrics
+
+
+def test_record():
+    """Les requêtes sont comptées par endpoint, les en vol par client."""
+    metrics = HTTPMetrics()
+    starts = [metrics.start() for _ in range(3)]
+    assert metrics.inflight == 3
+
+    metrics.record("GET", "instrument", starts[0], 200, received=100)
+    metrics.record("PUT", "order", starts[1], 400, sent=10, rateWait=0.5)
+    metrics.retry("PUT", "order")
+    metrics.record("PUT", "order", starts[2], None, sent=10)
+    assert metrics.inflight == 0 and metrics.peak == 3
+
+    stats = metrics.stats()
+    assert list(stats) == [("GET", "instrument"), ("PUT", "order")]
+    order = stats[("PUT", "order")]
+    assert (order["count"], order["errors"], order["retries"]) == (2, 2, 1)
+    assert order["sent"] == 20 and order["wait_max"] == 500
+    assert stats[("GET", "instrument")]["received"] == 100
+    assert metrics.endpoints[("PUT", "order")].statuses == {400: 1, None: 1}
+
+    df = metrics.frame()
+    assert list(df.index.names) == ["verb", "path"]
+    assert df.loc[("GET", "instrument"), "errors"] == 0
+
+    metrics.reset()
+    assert metrics.stats() == {} and metrics.peak == 0
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.jsondecode"""
+import json
+
+from kolaBitMEXBot.kola.connexion.jsondecode import available_decoders, get_decoder
+
+
+def test_get_decoder():
+    """Tous les décodeurs installés décodent un message comme json."""
+    message = '{"table": "trade", "action": "insert", "data": [{"price": 9000.5}]}'
+    assert "json" in available_decoders()
+    assert get_decoder()[0] == available_decoders()[0]
+    for name in available_decoders():
+        _name, loads = get_decoder(name)
+        assert _name == name
+        assert loads(message) == json.loads(message)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.ratelimit"""
+from threading import Thread
+from time import monotonic, time
+
+import pytest
+
+from kolaBitMEXBot.kola.connexion.ratelimit import TokenBucket, get_bucket
+
+
+def test_acquire_without_waiting():
+    """Tant qu'il reste des jetons les requêtes partent sans attendre."""
+    bucket = TokenBucket(10, 1)
+    assert all(bucket.acquire() == 0 for _ in range(10))
+    assert bucket.wait_time() == pytest.approx(0.1, abs=0.02)
+
+
+def test_acquire_waits_for_refill():
+    """Le seau vide, chaque requête attend un jeton, même entre threads."""
+    bucket = TokenBucket(20, 1)  # un jeton toutes les 50ms
+    for _ in range(20):
+        bucket.acquire()
+
+    start = monotonic()
+    threads = [Thread(target=bucket.acquire) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert 0.15 < monotonic() - start < 0.5
+
+
+def test_update_and_block():
+    """Les en-têtes recalent le seau, un 429 le bloque jusqu'au reset."""
+    bucket = TokenBucket(120, 60)
+    bucket.update({"X-Ratelimit-Remaining": "3", "X-Ratelimit-Limit": "120"})
+    assert bucket.tokens == pytest.approx(3, abs=0.1)
+    bucket.update({"X-Ratelimit-Remaining": "100"})  # nos requêtes en vol
+    assert bucket.tokens < 4
+    bucket.update({})
+    assert bucket.tokens < 4
+
+    bucket.update({"X-Ratelimit-Remaining": "0", "X-Ratelimit-Limit": "60"})
+    assert bucket.capacity == 60 and bucket.rate == pytest.approx(1)
+
+    bucket.block(time() + 0.3)
+    assert bucket.wait_time() == pytest.approx(1, abs=0.05)
+    bucket.rate = 100
+    assert bucket.wait_time() == pytest.approx(0.3, abs=0.05)
+
+
+def test_get_bucket():
+    """Un seau par clé d'API."""
+    assert get_bucket("key") is get_bucket("key")
+    assert get_bucket("key") is not get_bucket("otherKey")
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.retrypolicy"""
+from time import monotonic, sleep
+
+from kolaBitMEXBot.kola.connexion.retrypolicy import (
+    CircuitBreaker,
+    RetryPolicy,
+    get_breaker,
+)
+
+
+def test_pause():
+    """Pauses doublées à chaque relance, tirées au hasard, plafonnées."""
+    policy = RetryPolicy(maxRetries=5, base=1, cap=4, deadline=10)
+    for retries, delay in [(1, 1), (2, 2), (3, 4), (8, 4)]:
+        pauses = [policy.pause(retries) for _ in range(50)]
+        assert all(delay / 2 <= p <= delay for p in pauses)
+
+    start = monotonic()
+    assert not policy.give_up(1, start, 1)
+    assert policy.give_up(5, start, 1)
+    assert policy.give_up(2, start, 1, maxRetries=2)
+    # la pause dépasserait la deadline
+    assert policy.give_up(1, start - 9.5, 1)
+
+
+def test_circuit_breaker():
+    """Ouvert après threshold échecs, une requête d'essai après cooldown."""
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.failure()
+    assert breaker.allow() and breaker.state == "closed"
+    breaker.failure()
+    assert not breaker.allow() and breaker.retry_in() > 0
+
+    sleep(0.06)
+    assert breaker.allow() and breaker.state == "half-open"
+    # une seule requête d'essai à la fois
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_get_breaker():
+    """Un disjoncteur par endpoint, partagé."""
+    breaker = get_breaker("http://b/", "GET", "instrument")
+    assert get_breaker("http://b/", "GET", "instrument") is breaker
+    assert get_breaker("http://b/", "POST", "instrument") is not breaker
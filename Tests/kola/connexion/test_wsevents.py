@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.wsevents"""
+from threading import Timer
+from time import monotonic
+
+from kolaBitMEXBot.kola.connexion.wsevents import TableEvents, poll_for
+
+
+def test_wait_for():
+    """Le consommateur est réveillé par le changement, pas par un timeout."""
+    events = TableEvents()
+    table = []
+    Timer(0.05, lambda: table.append(1) or events.notify("execution")).start()
+
+    start = monotonic()
+    assert events.wait_for(lambda: len(table), "execution", timeout=5) == 1
+    assert monotonic() - start < 1
+    assert events.version("execution") == (1,)
+
+    # timeout, renvois la dernière valeur du prédicat
+    assert events.wait_for(lambda: len(table) > 1, "execution", timeout=0.05) is False
+
+
+def test_wait_ID():
+    """Attendre un ID ne réveille que pour les lignes de cet ID."""
+    events = TableEvents()
+    Timer(0.05, events.notify, ["execution", [{"clOrdID": "other"}]]).start()
+    assert not events.wait("execution", timeout=0.2, ID="mlk_1")
+
+    Timer(0.05, events.notify, ["execution", [{"clOrdID": "mlk_1"}]]).start()
+    assert events.wait(["execution", "order"], timeout=5, ID="mlk_1")
+
+    # déjà changé depuis since
+    since = events.version("execution")
+    events.notify("execution")
+    assert events.wait("execution", timeout=0, since=since)
+
+
+def test_subscribe():
+    """Les callbacks sont appelés pour leur table et leur ID."""
+    events = TableEvents()
+    calls = []
+
+    def callback(table, rows):
+        calls.append((table, rows))
+
+    events.subscribe("order", callback, ID="mlk_1")
+    events.notify("order", [{"clOrdID": "mlk_2"}])
+    events.notify("order", [{"clOrdID": "mlk_1"}])
+    assert calls == [("order", [{"clOrdID": "mlk_1"}])]
+
+    events.unsubscribe("order", callback, ID="mlk_1")
+    events.notify("order", [{"clOrdID": "mlk_1"}])
+    assert len(calls) == 1
+
+
+def test_poll_for():
+    """poll_for remplace wait_for sans websocket."""
+    assert poll_for(lambda: 1, timeout=0) == 1
+    assert poll_for(lambda: 0, timeout=0.05, waitstep=0.01) == 0
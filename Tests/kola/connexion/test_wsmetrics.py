@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.wsmetrics"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
+from kolaBitMEXBot.kola.connexion.wsmetrics import (
+    StreamHistogram,
+    WSMetrics,
+    get_exchange_time,
+)
+
+
+def test_stream_histogram():
+    """Quantiles à precision près, mémoire fixe, bornes."""
+    hist = StreamHistogram(precision=0.05)
+    assert hist.quantile(0.5) is None and hist.maximum() is None
+    size = len(hist.buckets)
+    for value in range(1, 1001):
+        hist.record(float(value))
+    assert len(hist.buckets) == size
+    assert hist.quantile(0.5) == pytest.approx(500, rel=0.05)
+    assert hist.quantile(0.99) == pytest.approx(990, rel=0.05)
+    assert hist.quantile(1) == hist.maximum() == 1000
+    assert hist.mean() == pytest.approx(500.5)
+
+    hist.record(-3.0)  # horloge en avance
+    hist.record(1e9)
+    assert hist.buckets[0] == 1 and hist.buckets[-1] == 1
+    assert hist.quantile(1) == 1e9
+
+
+def test_exchange_time():
+    """La lecture rapide donne la même date que fromisoformat."""
+    metrics = WSMetrics()
+    stamp = "2020-08-01T12:34:56.789Z"
+    expected = datetime(2020, 8, 1, 12, 34, 56, 789000, tzinfo=timezone.utc)
+    for row in [{"timestamp": stamp}, {"transactTime": stamp}]:
+        assert metrics.exchange_time(row) == pytest.approx(expected.timestamp() * 1e3)
+        assert get_exchange_time(row) == pytest.approx(expected.timestamp() * 1e3)
+    # minute en cache, autre seconde
+    later = metrics.exchange_time({"timestamp": "2020-08-01T12:34:59.000Z"})
+    assert later - expected.timestamp() * 1e3 == pytest.approx(2211)
+    assert metrics.exchange_time({"symbol": "XBTUSD"}) is None
+    assert metrics.exchange_time({"timestamp": "garbage"}) is None
+
+
+def test_record_and_stats():
+    """Débit, délai bourse et durée de traitement par (table, action)."""
+    metrics = WSMetrics()
+    sent = datetime(2020, 8, 1, tzinfo=timezone.utc).timestamp()
+    row = {"timestamp": "2020-08-01T00:00:00.000Z"}
+    for i in range(11):
+        received = int((sent + 0.010 + i) * 1e9)  # 10ms après, un par seconde
+        metrics.record("trade", "insert", [row], received, received + 200_000)
+        row = {"timestamp": f"2020-08-01T00:00:{i + 1:02d}.000Z"}
+    metrics.record("trade", "partial", [row], received, received)
+
+    stats = metrics.stats()
+    insert = stats[("trade", "insert")]
+    assert insert["count"] == 11 and insert["rows"] == 11
+    assert insert["rate"] == pytest.approx(1)
+    assert insert["lat_p50"] == pytest.approx(10, rel=0.05)
+    assert insert["lat_max"] == pytest.approx(10, abs=0.01)
+    assert insert["proc_p99"] == pytest.approx(0.2, rel=0.05)
+    # pas de délai bourse pour les partials
+    assert stats[("trade", "partial")]["lat_p50"] is None
+
+    df = metrics.frame()
+    assert list(df.index.names) == ["table", "action"]
+    assert df.loc[("trade", "insert"), "count"] == 11
+
+    metrics.reset()
+    assert not metrics.stats() and not len(metrics.frame())
+
+
+def test_websocket_metrics(no_socket, partials):
+    """Le websocket mesure chaque message traité."""
+    ws = BitMEXWebsocket("apiKey", "apiSecret")
+    ws.ws = no_socket()
+    for message in partials("XBTUSD", 11000.0):
+        ws.handle_message(json.dumps(message))
+    ws.handle_message(json.dumps({"info": "Welcome"}))
+    stats = ws.metrics.stats()
+    assert ("instrument", "partial") in stats
+    assert all(s["count"] == 1 for s in stats.values())
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.connexion.wstables"""
+from math import isnan
+
+import pytest
+
+from kolaBitMEXBot.kola.connexion.wstables import (
+    IndexedTable,
+    OrderBookL2,
+    RingTable,
+    SymbolRings,
+    new_table,
+)
+
+
+def test_indexed_table():
+    """Insert, update, delete et trim gardent l'index cohérent."""
+    rows = [{"orderID": f"o{i}", "price": i} for i in range(10)]
+    table = IndexedTable(["orderID"], rows)
+
+    assert len(table) == 10
+    assert table[0]["orderID"] == "o0" and table[-1]["orderID"] == "o9"
+    assert table[3]["price"] == 3 and table[7]["price"] == table[-3]["price"] == 7
+    assert [r["price"] for r in table[1:3]] == [1, 2]
+    with pytest.raises(IndexError):
+        table[10]
+    assert table.find({"orderID": "o3"})["price"] == 3
+
+    table.find({"orderID": "o3"}).update({"price": 33})
+    assert [r["price"] for r in table if r["orderID"] == "o3"] == [33]
+
+    table.remove(table.find({"orderID": "o3"}))
+    assert table.find({"orderID": "o3"}) is None
+    assert table.delete({"orderID": "o4"})["price"] == 4
+    assert len(table) == 8
+
+    table.insert([{"orderID": f"n{i}", "price": i} for i in range(4)])
+    table.trim(10)
+    assert len(table) == 5
+    assert [r["orderID"] for r in table] == ["o9", "n0", "n1", "n2", "n3"]
+
+
+def test_new_table():
+    """Les tables sans clefs restent des listes."""
+    assert new_table([], [{"price": 1}]) == [{"price": 1}]
+    assert isinstance(new_table(["symbol"]), IndexedTable)
+    rings = new_table([], schema={"price": "float64"}, capacity=2)
+    assert isinstance(rings, SymbolRings)
+    assert isinstance(new_table(["symbol", "id", "side"], book=True), OrderBookL2)
+
+
+def test_ring_table():
+    """Le ring buffer garde les capacity dernières lignes, sans copie."""
+    schema = {"timestamp": "datetime64[ms]", "price": "float64", "side": "O"}
+    ring = RingTable(schema, capacity=4)
+    assert len(ring) == 0 and ring.rows() == []
+
+    rows = [
+        {"timestamp": f"2020-05-01T12:00:0{i}.000Z", "price": 100.0 + i, "side": "Buy"}
+        for i in range(6)
+    ]
+    ring.insert(rows[:3])
+    assert list(ring.column("price")) == [100.0, 101.0, 102.0]
+
+    ring.insert(rows[3:] + [{"price": None, "side": "Sell"}])
+    assert len(ring) == 4 and ring.count == 7
+    prices = ring.column("price")
+    assert list(prices[:3]) == [103.0, 104.0, 105.0] and isnan(prices[-1])
+    assert prices.base is not None and not prices.flags.writeable
+    assert list(ring.column("side", 2)) == ["Buy", "Sell"]
+
+    assert ring[0]["price"] == 103.0 and ring[-1]["side"] == "Sell"
+    assert ring.rows(1)[0]["timestamp"] is None
+    assert ring.frame().shape == (4, 3)
+
+    # un insert en cours a pu réécrire la plus ancienne ligne de la copie
+    ring.head = ring.count + 1
+    assert list(ring.frame()["price"][:2]) == [104.0, 105.0]
+    assert ring.frame(2).shape == (2, 3)
+
+
+def test_symbol_rings():
+    """Chaque symbol a son ring, un partial ne remplace que le sien."""
+    rings = SymbolRings({"symbol": "O", "price": "float64"}, capacity=2)
+    rings.insert([{"symbol": s, "price": p} for s, p in [("A", 1), ("B", 2), ("A", 3)]])
+    assert len(rings) == 3
+    assert list(rings.view(symbol="A")["price"]) == [1.0, 3.0]
+    assert rings.view(symbol="C") is None and rings.rows(symbol="C") == []
+
+    rings.insert([{"symbol": "A", "price": 4}])
+    assert list(rings.view(symbol="A")["price"]) == [3.0, 4.0]
+    # la vue suit les inserts, pas la copie
+    view, snapshot = rings.view(symbol="A"), rings.snapshot(symbol="A")
+    rings.insert([{"symbol": "A", "price": 6}])
+    assert list(view["price"]) == [6.0, 4.0] and list(snapshot["price"]) == [3.0, 4.0]
+    assert rings.snapshot(symbol="C") is None
+
+    rings.replace([{"symbol": "B", "price": 5}])
+    assert rings.rows(symbol="B") == [{"symbol": "B", "price": 5.0}]
+    assert len(rings.rows(symbol="A")) == 2
+    # partial vide pour un symbol
+    rings.replace([], "A")
+    assert rings.ring("A") is None and rings.frame().shape == (1, 2)
+    assert rings.frame(symbol="A").shape == (0, 2)
+
+
+def level(i, side, size, price, symbol="XBTUSD"):
+    """Return an orderBookL2 row."""
+    return {"symbol": symbol, "id": i, "side": side, "size": size, "price": price}
+
+
+def test_order_book():
+    """Le carnet reste trié après insert, update et delete."""
+    books = OrderBookL2(
+        [level(i, "Sell", 10, 100.0 + i) for i in range(1, 4)]
+        + [level(i, "Buy", 10, 100.0 - i) for i in range(4, 7)]
+        + [level(9, "Sell", 1, 7.0, "ADAU20")]
+    )
+    book = books.book("XBTUSD")
+    assert len(books) == 7 and len(book) == 6
+    assert (book.best_bid(), book.best_ask()) == (96.0, 101.0)
+    assert book.levels("buy", 2) == [(96.0, 10), (95.0, 10)]
+
+    # taille seule, prix modifié, nouveau niveau et retrait
+    books.update([{"symbol": "XBTUSD", "id": 1, "side": "Sell", "size": 5}])
+    books.update([level(4, "Buy", 3, 99.5)])
+    books.insert([level(7, "Buy", 2, 97.0)])
+    books.delete([{"symbol": "XBTUSD", "id": 2, "side": "Sell"}])
+    assert book.levels("Buy") == [(99.5, 3), (97.0, 2), (95.0, 10), (94.0, 10)]
+    assert book.levels("Sell") == [(101.0, 5), (103.0, 10)]
+    assert books.book("ADAU20").best_ask() == 7.0
+
+    # acheter 10 consomme 5 à 101 et 5 à 103
+    assert book.impact_price("buy", 10) == 102.0
+    assert book.impact_price("buy", 10, average=False) == 103.0
+    assert book.impact_price("sell", 4) == (3 * 99.5 + 97.0) / 4
+    assert book.impact_price("buy", 16) is None
+
+    books.replace([], "XBTUSD")
+    assert books.book("XBTUSD") is None and len(books) == 1
+
+
+def test_order_book_empty_levels():
+    """Un update à taille 0 retire le niveau, comme un delete."""
+    books = OrderBookL2([level(i, "Sell", 10, 100.0 + i) for i in range(1, 4)])
+    book = books.book("XBTUSD")
+    book.update([{"symbol": "XBTUSD", "id": 1, "side": "Sell", "size": 0}])
+    assert book.best_ask() == 102.0 and len(book) == 2
+    assert book.levels("Sell") == [(102.0, 10), (103.0, 10)]
+    assert book.impact_price("buy", 20, average=False) == 103.0
+    # puis réinséré par bitmex
+    book.insert([level(1, "Sell", 4, 101.0)])
+    assert book.best_ask() == 101.0
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.orders.coalescer"""
+from threading import Event
+
+from kolaBitMEXBot.kola.orders.coalescer import AmendCoalescer
+from kolaBitMEXBot.kola.orders.orders import get_bulk_amend
+
+
+def coalescer(brg, window=0.05):
+    """Return the coalescer and the (load, reply) it routes."""
+    replies, done = [], Event()
+
+    def on_reply(load, reply):
+        replies.append((load["id"], reply))
+        done.set()
+
+    return AmendCoalescer(brg, on_reply, window), replies, done
+
+
+def test_latest_amend_per_orderID(fake_bto, fake_bargain):
+    """Un seul bulk, le dernier prix par orderID, une réponse par load."""
+    bto = fake_bto()
+    amends, replies, done = coalescer(fake_bargain(bto))
+    amends.add({"id": 1}, {"orderID": "a", "stopPx": 100})
+    amends.add({"id": 2}, {"orderID": "b", "stopPx": 200})
+    amends.add({"id": 3}, {"orderID": "a", "stopPx": 101})
+    assert done.wait(1)
+
+    assert bto.amendBulks == [
+        [{"orderID": "a", "stopPx": 101}, {"orderID": "b", "stopPx": 200}]
+    ]
+    routed = {i: r["stopPx"] for i, r in replies}
+    assert routed == {1: 101, 2: 200, 3: 101}
+    assert not amends.pending and amends._timer is None
+
+
+def test_failed_bulk_falls_back_to_single_amends(fake_bto, fake_bargain):
+    """Un ordre déjà déclenché n'empêche pas d'amender les autres."""
+    bto = fake_bto(refused={"a"})
+    amends, replies, _ = coalescer(fake_bargain(bto))
+    amends.add({"id": 1}, {"orderID": "a", "stopPx": 100})
+    amends.add({"id": 2}, {"orderID": "b", "stopPx": 200})
+    amends.flush()
+
+    assert bto.amends == ["a", "b"]
+    assert dict(replies)[1] is None
+    assert dict(replies)[2]["stopPx"] == 200
+
+
+def test_get_bulk_amend():
+    """Prix et stopPx d'un StopLimit dans le même amend."""
+    assert get_bulk_amend("a", 100, "amendStop") == {"orderID": "a", "stopPx": 100}
+    amend = get_bulk_amend("a", 100, "amendStopLimit", side="sell", absdelta=2)
+    assert amend["price"] == 100 and amend["stopPx"] == 98
+    assert "text" in amend
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.orders.loadqueue"""
+from time import sleep
+
+from kolaBitMEXBot.kola.orders.loadqueue import LoadQueue, get_priority
+
+
+def load(name, ordType="Limit", execInst=""):
+    order = {"clOrdID": name, "ordType": ordType, "execInst": execInst}
+    return {"order": order}
+
+
+def drain(queue):
+    """Return the clOrdIDs of the queue in the order they are served."""
+    names = []
+    while not queue.empty():
+        names.append(queue.get_nowait()["order"]["clOrdID"])
+    return names
+
+
+def test_get_priority():
+    """cancel > amend > stop (ou ordre de clôture) > entrée."""
+    assert get_priority(load("c", "cancel")) == 0
+    assert get_priority(load("a", "amendStopLimit")) == 1
+    assert get_priority(load("s", "StopLimit")) == 2
+    assert get_priority(load("t", "Limit", "Close,lastPrice")) == 2
+    assert get_priority(load("e", "Limit", "ParticipateDoNotInitiate")) == 3
+
+
+def test_triggered_orders_are_stops():
+    """Tous les ordres déclenchés (MIT, LIT... avec un stopPx) sont des stops."""
+    for ordType in ["Stop", "StopLimit", "MarketIfTouched", "LimitIfTouched"]:
+        assert get_priority(load("t", ordType)) == 2
+    triggered = load("t", "Market")
+    triggered["order"]["stopPx"] = 11000
+    assert get_priority(triggered) == 2
+
+    queue = LoadQueue(aging=None)
+    queue.put(load("e1"))
+    queue.put(load("lit", "LimitIfTouched"))
+    assert drain(queue) == ["lit", "e1"]
+
+
+def test_served_by_priority_then_fifo():
+    """Les plus urgents d'abord, dans leur ordre d'arrivée."""
+    queue = LoadQueue(aging=None)
+    for args in [("e1",), ("s1", "Stop"), ("e2",), ("a1", "amendStop")]:
+        queue.put(load(*args))
+    queue.put(load("c1", "cancel"))
+    queue.put(load("a2", "amendLimit"))
+    assert queue.qsize() == 6
+    assert drain(queue) == ["c1", "a1", "a2", "s1", "e1", "e2"]
+
+
+def test_aging():
+    """Une entrée qui attend depuis longtemps passe devant un cancel récent."""
+    queue = LoadQueue(aging=0.01)
+    queue.put(load("e1"))
+    sleep(0.05)
+    queue.put(load("c1", "cancel"))
+    assert drain(queue) == ["e1", "c1"]
+
+    queue = LoadQueue(aging=10)
+    queue.put(load("e1"))
+    sleep(0.05)
+    queue.put(load("c1", "cancel"))
+    assert drain(queue) == ["c1", "e1"]
+
+
+def test_stats():
+    """Profondeur, pic, nombre servi et attentes par classe."""
+    queue = LoadQueue()
+    queue.put(load("e1"))
+    queue.put(load("e2"))
+    queue.put(load("c1", "cancel"))
+    queue.get_nowait()
+    queue.get_nowait()
+
+    stats = queue.stats()
+    assert list(stats) == ["cancel", "amend", "stop", "entry"]
+    assert stats["entry"]["depth"] == 1 and stats["entry"]["peak"] == 2
+    assert stats["entry"]["count"] == 1 and stats["cancel"]["count"] == 1
+    assert stats["amend"]["wait_max"] is None
+    assert stats["cancel"]["wait_p99"] >= 0
+    assert queue.frame().loc["entry", "depth"] == 1
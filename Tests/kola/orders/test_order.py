@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.orders.order"""
+import pickle
+
+import pytest
+
+from kolaBitMEXBot.kola.orders.order import Load, Order
+from kolaBitMEXBot.kola.utils.orderfunc import (
+    create_order,
+    get_order_from,
+    toggle_order,
+)
+
+
+def get_order():
+    """Return a StopLimit buy order with its clOrdID."""
+    order = create_order(
+        "buy", 100, "lastPrice", "StopLimit", "", prices=(11000, 11010), absdelta=2
+    )
+    order["clOrdID"] = "mlk_test"
+    return order
+
+
+def test_order_reads_like_a_dict():
+    """Les lectures du dict qu'il remplace, None valant absent."""
+    order = get_order()
+    assert isinstance(order, Order)
+    assert order["price"] == order.price and order.get("stopPx") == order.stopPx
+    assert "text" not in order and order.get("text", "") == ""
+    with pytest.raises(KeyError):
+        order["newPrice"]
+
+    order["pegOffsetValue"] = 5
+    assert order.extra == {"pegOffsetValue": 5} and "pegOffsetValue" in order
+    assert dict(**order)["pegOffsetValue"] == 5
+    assert order.pop("pegOffsetValue") == 5 and order.pop("oDelta", 2) == 2
+    assert list(order) == [
+        "clOrdID",
+        "side",
+        "orderQty",
+        "ordType",
+        "price",
+        "stopPx",
+        "execInst",
+    ]
+    assert order == dict(order.items(), text=None)
+    assert toggle_order(order)["side"] == "sell" and order.side == "buy"
+
+
+def test_order_copies():
+    """Les copies et amends laissent l'ordre d'origine intact."""
+    order = get_order()
+    order["pegPriceType"] = "TrailingStopPeg"
+    copy = order.copy()
+    copy.price, copy["pegPriceType"] = 1, "MarketPeg"
+    assert order.price != 1 and order["pegPriceType"] == "TrailingStopPeg"
+
+    amended = order.amend(ordType="amendStopLimit", newPrice=11020)
+    assert amended.newPrice == 11020 and order.newPrice is None
+    assert amended.ordType == "amendStopLimit" and order.ordType == "StopLimit"
+    assert order.place_opts() == {
+        "clOrdID": "mlk_test",
+        "execInst": order.execInst,
+        "pegPriceType": "TrailingStopPeg",
+    }
+    assert pickle.loads(pickle.dumps(order)) == order
+    assert Order.from_dict(dict(order.items())) == order
+
+
+def test_order_postdict(bitmex):
+    """Le postdict est celui de BitMEX.create_order, sans les champs du bot."""
+    bto, _ = bitmex()
+    order = get_order().amend(side="sell", oDelta=2)
+    postdict = order.postdict("XBTUSD")
+    expected = bto.create_order(**{k: v for k, v in order.items() if k != "oDelta"})
+    assert postdict == expected
+    assert postdict["orderQty"] == -100 and "oDelta" not in postdict
+
+
+def test_load():
+    """Un load se lit comme l'ancien dict."""
+    order = get_order()
+    load = Load(order, timeOut=60, symbol="XBTUSD")
+    assert load["order"] is order and get_order_from(load) is order
+    assert load.get("future") is None and "sender" not in load
+    with pytest.raises(KeyError):
+        load["orders"]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.orders.orders"""
+from kolaBitMEXBot.kola.orders.orders import BulkPlacer, place
+import kolaBitMEXBot.kola.utils.exceptions as ke
+
+
+def test_bulk_placer(fake_bto, fake_bargain):
+    """Les place_* enregistrés partent en un seul bulk, dans l'ordre."""
+    bto = fake_bto()
+    placer = BulkPlacer(fake_bargain(bto))
+    assert placer.symbol == "XBTUSD"
+    for i, side in enumerate(["buy", "sell"]):
+        assert place(placer, side, 10 + i, 11000.0, clOrdID=f"c{i}") is None
+    assert len(placer) == 2 and not bto.bulks
+
+    replies = placer.send()
+    assert len(bto.bulks) == 1 and not bto.singles
+    assert [r["orderID"] for r in replies] == ["oc0", "oc1"]
+    assert replies[1]["side"] == "sell" and replies[1]["price"] == 11000.0
+    assert not len(placer) and placer.send() == []
+
+
+def test_bulk_placer_fans_out_errors(fake_bto, fake_bargain):
+    """Un bulk refusé est replacé un par un, chaque ordre a sa réponse."""
+    bto = fake_bto(maxQty=100)
+    placer = BulkPlacer(fake_bargain(bto))
+    place(placer, "buy", 10, 11000.0, clOrdID="small")
+    place(placer, "buy", 1000, 11000.0, clOrdID="big")
+
+    small, big = placer.send()
+    assert bto.singles == ["small", "big"]
+    assert small[0]["orderID"] == "osmall"
+    assert isinstance(big, ke.InsufficientBalance)
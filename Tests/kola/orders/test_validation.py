@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.orders.validation"""
+from queue import Queue
+
+import pandas as pd
+
+from kolaBitMEXBot.kola.orders.validation import ValidationDispatcher
+
+FILLED = [{"exectype": "Trade", "orderstatus": "Filled"}]
+REPLACED = [{"exectype": "Replaced", "orderstatus": "New"}]
+
+
+class Bargain:
+    """Un bargain dont le websocket est appelé à la main."""
+
+    def __init__(self, ws=True):
+        self.bto = type("BTO", (), {"dummy": False})()
+        self.ws = ws
+        self.callbacks = []
+
+    def subscribe(self, table, callback, ID=None):
+        self.callbacks.append(callback)
+        return self.ws
+
+    def unsubscribe(self, table, callback, ID=None):
+        self.callbacks.remove(callback)
+
+
+def load(clOrdID):
+    return {"order": {"clOrdID": clOrdID}}
+
+
+def row(clOrdID, execType, ordStatus):
+    return {"clOrdID": clOrdID, "execType": execType, "ordStatus": ordStatus}
+
+
+def dispatcher(ws=True, executed=()):
+    """Return a started dispatcher, check finds the clOrdIDs of executed."""
+    brg, valids = Bargain(ws), Queue()
+
+    def on_validation(rcvLoad, brokerReply, execValidation):
+        valids.put(
+            {
+                "brokerReply": brokerReply,
+                "exgLoad": rcvLoad,
+                "execValidation": execValidation,
+            }
+        )
+
+    vd = ValidationDispatcher(
+        brg, on_validation, lambda ID, conds: ID in executed, waitstep=0.01
+    )
+    vd.start()
+    return vd, brg, valids
+
+
+def test_validations_from_executions():
+    """Chaque exécution ne résout que les validations de son clOrdID."""
+    vd, brg, valids = dispatcher()
+    minute = pd.Timedelta(1, unit="m")
+    for clOrdID, conds in [("a", FILLED), ("b", REPLACED), ("c", FILLED)]:
+        reply = {"clOrdID": clOrdID, "orderID": f"o{clOrdID}"}
+        vd.add(load(clOrdID), conds, minute, reply)
+    assert len(vd) == 3
+
+    on_execution = brg.callbacks[0]
+    on_execution("execution", [row("a", "New", "New"), row("b", "Replaced", "New")])
+    valid = valids.get(timeout=1)
+    assert valid["exgLoad"] == load("b")
+    assert valid["execValidation"] == {"clOrdID": "b", "orderID": "ob"}
+    assert len(vd) == 2
+
+    rows = [row("x", "Trade", "Filled"), row("a", "Trade", "Filled")]
+    on_execution("execution", rows)
+    assert valids.get(timeout=1)["exgLoad"] == load("a")
+    assert len(vd) == 1 and list(vd.pending) == ["c"]
+    vd.stop = True
+
+
+def test_validation_timeout_and_early_execution():
+    """Sans exécution à temps la validation échoue, déjà exécuté elle passe."""
+    vd, brg, valids = dispatcher(executed=["early"])
+    reply = [{"clOrdID": "late", "orderID": "ol"}]
+    vd.add(load("late"), FILLED, pd.Timedelta(0.05, unit="s"), reply)
+    vd.add(load("early"), FILLED, pd.Timedelta(1, unit="m"))
+
+    early = valids.get(timeout=1)
+    # exécuté mais sans réponse du broker
+    assert early["exgLoad"] == load("early") and early["execValidation"] is False
+    late = valids.get(timeout=1)
+    assert late["exgLoad"] == load("late") and late["execValidation"] is False
+    assert late["brokerReply"] == {"clOrdID": "late", "orderID": "ol"}
+    assert len(vd) == 0
+    vd.stop = True
+    vd.join(timeout=2)
+    assert brg.callbacks == []
+
+
+def test_validation_polling():
+    """Sans websocket les validations sont vérifiées toutes les waitstep s."""
+    executed = []
+    vd, brg, valids = dispatcher(ws=False, executed=executed)
+    vd.add(load("a"), FILLED, pd.Timedelta(1, unit="m"), {"clOrdID": "a"})
+    executed.append("a")
+    assert valids.get(timeout=1)["execValidation"] == {"clOrdID": "a"}
+    vd.stop = True
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.chronos"""
+from concurrent.futures import Future
+from queue import Queue
+
+import pandas as pd
+import pytest
+
+from kolaBitMEXBot.kola.chronos import WAKE_UP, Chronos
+from kolaBitMEXBot.kola.orders.loadqueue import LoadQueue
+from kolaBitMEXBot.kola.orders.order import Load, Order
+import kolaBitMEXBot.kola.utils.exceptions as ke
+
+
+class Sender:
+    def __init__(self, order):
+        self.order = order
+
+
+def load(clOrdID, ordType="Limit", orderQty=10):
+    order = {
+        "clOrdID": clOrdID,
+        "ordType": ordType,
+        "side": "buy",
+        "orderQty": orderQty,
+        "price": 11000.0,
+        "execInst": "",
+    }
+    timeOut = pd.Timedelta(1, unit="m")
+    sender = Sender(dict(order))
+    return {"order": order, "sender": sender, "timeOut": timeOut, "symbol": "XBTUSD"}
+
+
+@pytest.fixture
+def chronos(fake_bargain, monkeypatch):
+    """Return chronos(bto) -> a Chronos and the (clOrdID, ordType) it validates."""
+
+    def new_chronos(bto):
+        chrs = Chronos(fake_bargain(bto), Queue(), Queue())
+        validated = []
+        chrs.replies = []
+
+        def start_validation(rcvLoad, ordType, timeOut, reply=None):
+            validated.append((rcvLoad["order"]["clOrdID"], ordType))
+            chrs.replies.append(reply)
+
+        monkeypatch.setattr(chrs, "start_validation", start_validation)
+        return chrs, validated
+
+    return new_chronos
+
+
+def test_process_all_in_bulk(chronos, fake_bto):
+    """Placements en bulk, un cancel entre deux garde l'ordre de la file."""
+    bto = fake_bto()
+    chrs, validated = chronos(bto)
+    for clOrdID in ["a", "b"]:
+        chrs.recpt_queue.put(load(clOrdID))
+    chrs.recpt_queue.put(load("c", "cancel"))
+    chrs.recpt_queue.put(load("d"))
+
+    rcvLoads = chrs.get_loads()
+    assert len(rcvLoads) == 4 and chrs.recpt_queue.empty()
+    chrs.process_all(rcvLoads)
+
+    assert bto.calls == [("bulk", ["a", "b"]), ("cancel", "c"), ("bulk", ["d"])]
+    assert [v[0] for v in validated] == ["a", "b", "c", "d"]
+    assert validated[2] == ("c", "cancel")
+    assert [r["clOrdID"] for r in chrs.replies] == ["a", "b", "c", "d"]
+
+
+def test_process_all_by_priority(chronos, fake_bto):
+    """Avec une LoadQueue, le cancel passe devant les placements."""
+    bto = fake_bto()
+    chrs, validated = chronos(bto)
+    chrs.recpt_queue = LoadQueue(aging=None)
+    for rcvLoad in [load("a"), load("b"), load("c", "cancel"), load("d")]:
+        chrs.recpt_queue.put(rcvLoad)
+
+    chrs.process_all(chrs.get_loads())
+    assert bto.calls == [("cancel", "c"), ("bulk", ["a", "b", "d"])]
+    assert chrs.queue_stats().loc["cancel", "count"] == 1
+
+
+def test_process_all_fans_out_errors(chronos, fake_bto):
+    """Un ordre refusé n'est pas validé, les autres le sont."""
+    bto = fake_bto(maxQty=100)
+    chrs, validated = chronos(bto)
+    chrs.process_all([load("a"), load("big", "Limit", 20), load("b")])
+    assert validated == [("a", "Limit"), ("big", "Limit"), ("b", "Limit")]
+
+    bto = fake_bto(maxQty=15)
+    chrs, validated = chronos(bto)
+    chrs.process_all([load("a"), load("big", "Limit", 20), load("b")])
+    assert bto.singles == ["a", "big", "b"]
+    assert validated == [("a", "Limit"), ("b", "Limit")]
+    # solde insuffisant même à 80%: le sender est prévenu de l'échec
+    refused = chrs.valid_queue.get_nowait()
+    assert refused["exgLoad"]["order"]["clOrdID"] == "big"
+    assert refused["execValidation"] is False
+
+
+def test_insufficient_balance_requeues_a_copy(chronos, fake_bto):
+    """
+    Solde insuffisant: une copie à 80% repart sous un nouveau clOrdID, le
+    load et son future restent ceux du sender, l'ordre envoyé est intact.
+    """
+    bto = fake_bto(maxQty=100)
+    chrs, validated = chronos(bto)
+    order = Order(**load("mlk_Bl1-PO" + "x" * 22, orderQty=150)["order"])
+    rcvLoad = Load(order, symbol="XBTUSD", future=Future())
+    sent = rcvLoad.order
+    chrs.process_all([rcvLoad])
+
+    assert validated == []
+    assert chrs.recpt_queue.get_nowait() is rcvLoad
+    assert sent.orderQty == 150 and rcvLoad.order.orderQty == 120
+    assert rcvLoad.order.clOrdID.startswith("mlk_Bl1-PO")
+    assert rcvLoad.order.clOrdID != sent.clOrdID
+    assert not rcvLoad.future.done()
+
+
+def test_process_all_circuit_open(chronos, fake_bto):
+    """Endpoint en panne: le placement est lâché, le cancel passe quand même."""
+
+    class BrokenBTO(fake_bto):
+        def create_bulk_orders(self, orders):
+            raise ke.CircuitOpen("POST order/bulk: circuit open")
+
+    bto = BrokenBTO()
+    chrs, validated = chronos(bto)
+    chrs.process_all([load("a"), load("c", "cancel")])
+
+    assert validated == [("c", "cancel")]
+    refused = chrs.valid_queue.get_nowait()
+    assert refused["exgLoad"]["order"]["clOrdID"] == "a"
+    assert refused["execValidation"] is False
+
+
+def test_process_all_unknown_errors(chronos, fake_bto):
+    """Une erreur inconnue du bulk répond à chaque load, Chronos continue."""
+
+    class BrokenBTO(fake_bto):
+        def create_bulk_orders(self, orders):
+            raise ConnectionResetError("reset by peer")
+
+    bto = BrokenBTO()
+    chrs, validated = chronos(bto)
+    chrs.process_all([load("a"), load("b"), load("c", "cancel")])
+
+    assert validated == [("c", "cancel")]
+    for clOrdID in ["a", "b"]:
+        refused = chrs.valid_queue.get_nowait()
+        assert refused["exgLoad"]["order"]["clOrdID"] == clOrdID
+        assert isinstance(refused["brokerReply"], ConnectionResetError)
+        assert refused["execValidation"] is False
+
+
+def test_validate_sets_the_future_of_the_load(chronos, fake_bto):
+    """La validation va au future du load, sans passer par valid_queue."""
+    bto = fake_bto(maxQty=15)
+    chrs, validated = chronos(bto)
+    big, other = load("big", "Limit", 20), load("other")
+    big["future"], other["future"] = Future(), Future()
+    chrs.process_all([other, big])
+
+    refused = big["future"].result(timeout=1)
+    assert refused["exgLoad"] is big and refused["execValidation"] is False
+    assert not other["future"].done() and chrs.valid_queue.empty()
+
+    reply = {"clOrdID": "other"}
+    chrs.validate(other, reply, reply)
+    assert other["future"].result(timeout=1)["execValidation"] == reply
+
+
+def test_amend_replies_in_the_chronos_thread(chronos, fake_bto):
+    """Les réponses des amends regroupés sont traitées par process_all."""
+
+    chrs, validated = chronos(fake_bto())
+    chrs.amends.window = 0.01
+    amend = load("a", "amendLimit")
+    amend["order"].update(orderID="oa", newPrice=11010.0)
+    chrs.process_all([amend])
+
+    # le Timer rend la réponse par la file, sans valider lui-même
+    assert chrs.recpt_queue.get(timeout=1) is WAKE_UP and validated == []
+    chrs.process_all([WAKE_UP])
+    assert validated == [("a", "amendLimit")]
+    assert chrs.replies[0]["orderID"] == "oa"
+
+
+def test_process_keeps_the_load(chronos, fake_bto):
+    """Chronos dépile une copie de l'ordre, le load peut être relancé tel quel."""
+    bto = fake_bto()
+    chrs, validated = chronos(bto)
+    order = Order.from_dict(load("a")["order"])
+    rcvLoad = Load(order.copy(), timeOut=pd.Timedelta(1, unit="m"), symbol="XBTUSD")
+    chrs.process(rcvLoad)
+    chrs.process(rcvLoad)
+    assert rcvLoad.order == order and bto.singles == ["a", "a"]
+    assert validated == [("a", "Limit")] * 2
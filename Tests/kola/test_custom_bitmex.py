@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.custom_bitmex"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, current_thread
+import json
+
+import pytest
+
+from kolaBitMEXBot.kola.connexion.retrypolicy import RetryPolicy, get_breaker
+from kolaBitMEXBot.kola.settings import HTTP_BREAKER, HTTP_POOL_SIZE
+import kolaBitMEXBot.kola.utils.exceptions as ke
+
+
+def test_margin_from_ws(bitmex):
+    """La marge et le levier suivent le ws, sans requête REST."""
+    margin = {"account": 1, "currency": "XBt", "availableMargin": 5}
+    position = {"account": 1, "symbol": "XBTUSD", "currency": "XBt", "leverage": 2}
+    bto, on_message = bitmex(margin, position)
+
+    assert bto.margin()["availableMargin"] == 5
+    assert bto.position("XBTUSD")["leverage"] == 2
+    update = {**margin, "availableMargin": 6}
+    on_message(json.dumps({"table": "margin", "action": "update", "data": [update]}))
+    assert bto.margin()["availableMargin"] == 6
+    assert bto.calls == []
+
+
+def test_margin_fallback(bitmex):
+    """Par REST si le ws est en reconnexion ou sans ligne pour la devise."""
+    bto, _ = bitmex()
+    assert bto.margin()["availableMargin"] == 7
+    assert bto.calls == ["user/margin"]
+
+    margin = {"account": 1, "currency": "XBt", "availableMargin": 5}
+    bto, _ = bitmex(margin)
+    bto.ws.stale = True
+    assert bto.margin()["availableMargin"] == 7
+    assert bto.position("XBTUSD")["leverage"] == 3
+    assert bto.calls == ["user/margin", "position"]
+    bto.ws.stale = False
+    assert bto.margin()["availableMargin"] == 5
+    # pas de position ouverte
+    assert bto.position("XBTUSD")["currentQty"] == 0
+
+
+def test_instrument_record(bitmex):
+    """Le record du ws sans copie, instrument en rend une copie réduite."""
+    bto, _ = bitmex()
+    record = bto.instrument_record("XBTUSD")
+    assert record is bto.ws.get_instrument("XBTUSD")
+    assert record["tickLog"] == 1
+    instrument = bto.instrument("XBTUSD")
+    assert instrument is not record
+    assert instrument["tickSize"] == 0.5
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Répond [] à tout GET, en keep-alive, 503 sur /api/v1/down, 404 sur
+    /api/v1/missing.  Un POST order est refusé en clOrdID dupliqué, le GET
+    order renvoie l'ordre déjà placé.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, body = 200, []
+        if self.path.startswith("/api/v1/down"):
+            status = 503
+        elif self.path.startswith("/api/v1/missing"):
+            status = 404
+        elif self.path.startswith("/api/v1/order?"):
+            body = [{"clOrdID": "mlk_dup", "orderID": "oid", "orderQty": 10}]
+        self.reply(status, body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.reply(400, {"error": {"message": "Duplicate clOrdID", "name": "x"}})
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_http_stats(bitmex):
+    """Les requêtes sont mesurées par endpoint et réutilisent leur connexion."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        bto, _ = bitmex()
+        del bto._curl_bitmex
+        bto.base_url = f"http://127.0.0.1:{server.server_port}/api/v1/"
+        for _ in range(3):
+            assert bto.instruments() == []
+    finally:
+        server.shutdown()
+
+    stats = bto.http_stats()
+    assert stats.loc[("GET", "instrument"), "count"] == 3
+    assert stats.loc[("GET", "instrument"), "received"] == 6
+    assert bto.pool_stats() == {
+        "size": HTTP_POOL_SIZE,
+        "opened": 1,
+        "idle": 1,
+        "requests": 3,
+        "inflight": 0,
+        "peak": 1,
+    }
+
+
+def test_retry_and_circuit_breaker(bitmex):
+    """Relances bornées, puis le disjoncteur ouvert fait échouer tout de suite."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    bto, _ = bitmex()
+    try:
+        del bto._curl_bitmex
+        bto.base_url = f"http://127.0.0.1:{server.server_port}/api/v1/"
+        bto.retryPolicy = RetryPolicy(maxRetries=3, base=0.01, cap=0.01)
+
+        with pytest.raises(ke.MaxRetries) as e:
+            bto._curl_bitmex("down")
+        assert not isinstance(e.value, ke.CircuitOpen)
+        assert bto.http_stats().loc[("GET", "down"), "retries"] == 2
+
+        # 3 échecs de plus ouvrent le disjoncteur (HTTP_BREAKER)
+        with pytest.raises(ke.CircuitOpen):
+            bto.fetch("down").result(timeout=5)
+        assert bto.http_stats().loc[("GET", "down"), "count"] == HTTP_BREAKER[0]
+        # les autres endpoints répondent
+        assert bto.fetch("instrument").result(timeout=5) == []
+    finally:
+        server.shutdown()
+        bto.exit()
+
+
+def test_answered_retries_keep_the_circuit_closed(bitmex):
+    """Un 404 relancé ou un clOrdID dupliqué n'ouvrent pas le disjoncteur."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    bto, _ = bitmex()
+    try:
+        del bto._curl_bitmex
+        bto.base_url = f"http://127.0.0.1:{server.server_port}/api/v1/"
+        bto.retryPolicy = RetryPolicy(maxRetries=HTTP_BREAKER[0] + 1, base=0.01)
+
+        with pytest.raises(ke.MaxRetries) as e:
+            bto._curl_bitmex("missing")
+        assert not isinstance(e.value, ke.CircuitOpen)
+        assert get_breaker(bto.base_url, "GET", "missing").state == "closed"
+
+        # déjà placé: on relit l'ordre au lieu de le renvoyer
+        reply = bto.place(10, "buy", "mlk_dup", ordType="Limit", price=11000)
+        assert reply["orderID"] == "oid"
+        stats = bto.http_stats()
+        assert stats.loc[("POST", "order"), "count"] == 1
+        assert stats.loc[("GET", "order"), "count"] == 1
+        # un bulk dont un ordre n'est pas trouvé
+        with pytest.raises(ke.InvalidOrder):
+            bto.create_bulk_orders([("buy", 10)])
+        assert get_breaker(bto.base_url, "POST", "order").state == "closed"
+    finally:
+        server.shutdown()
+        bto.exit()
+
+
+def test_rest_gets_in_the_caller_thread(bitmex):
+    """
+    Les GET de secours et les pages sont lus dans le thread appelant, sans
+    attendre ceux des autres threads sur le pool de fetch.
+    """
+    bto, _ = bitmex()
+    calls = []
+
+    def curl_bitmex(path, query=None, **kwargs):
+        calls.append((current_thread(), query.get("start")))
+        if path == "user/margin":
+            return {"currency": "XBt", "availableMargin": 7}
+        # 1800 bins disponibles
+        return list(range(query["start"], min(1800, query["start"] + query["count"])))
+
+    bto._curl_bitmex = curl_bitmex
+    # fetch lèverait RuntimeError: aucun GET ne passe par son pool
+    bto.background.shutdown()
+    try:
+        assert bto.http_margin()["availableMargin"] == 7
+        assert bto.get_bucketed_trades(count=2500) == list(range(1800))
+        assert calls == [(current_thread(), s) for s in [None, 0, 1000]]
+    finally:
+        bto.exit()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Test du module kola.history"""
+import asyncio
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("pyarrow")
+
+from aiohttp import web  # noqa: E402
+
+from kolaBitMEXBot.kola.connexion.async_rest import AsyncBitMEXRest  # noqa: E402
+from kolaBitMEXBot.kola.history import (  # noqa: E402
+    BIN_SIZES,
+    PAGE_SIZE,
+    BucketCache,
+    get_pages,
+)
+
+
+class StandInBuckets:
+    """Un trade/bucketed local, un bin par minute depuis start."""
+
+    def __init__(self, start):
+        self.start = start
+        self.queries = []
+
+    async def handle(self, request):
+        query = request.query
+        self.queries.append(dict(query))
+        binDelta = BIN_SIZES[query["binSize"]]
+        t0 = max(pd.Timestamp(query["startTime"]), self.start)
+        t1 = min(pd.Timestamp(query["endTime"]), pd.Timestamp.now(tz="UTC"))
+        rows = []
+        t = t0.ceil(binDelta)
+        while t <= t1 and len(rows) < int(query["count"]):
+            close = (t - self.start) // binDelta
+            row = {"timestamp": t.isoformat(), "symbol": "XBTUSD", "close": close}
+            rows.append(row)
+            t += binDelta
+        return web.json_response(rows)
+
+
+def download(cache, server, *args):
+    """Run cache.get_async(*args) against the stand-in server."""
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/api/v1/trade/bucketed", server.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        cache.rest = AsyncBitMEXRest(
+            f"http://127.0.0.1:{port}/api/v1/", "bucketKey", "apiSecret"
+        )
+        try:
+            return await cache.get_async(*args)
+        finally:
+            await cache.rest.close()
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_get_pages():
+    """Pages de PAGE_SIZE bins alignées sur epoch."""
+    start = pd.Timestamp("2020-01-01", tz="UTC")
+    pages = get_pages("1m", start, start + pd.Timedelta(minutes=2 * PAGE_SIZE))
+    assert len(pages) in (2, 3)
+    assert pages[0] <= start < pages[0] + PAGE_SIZE * BIN_SIZES["1m"]
+    assert get_pages("1m", start, start) == pages[:1]
+    with pytest.raises(ValueError):
+        get_pages("2m", start, start)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather"])
+def test_download_then_cache(tmp_path, fmt):
+    """Les pages terminées sont lues sur le disque la fois suivante."""
+    start = pd.Timestamp("2020-01-01", tz="UTC")
+    end = start + pd.Timedelta(minutes=2500)
+    server = StandInBuckets(start)
+    cache = BucketCache(None, cacheDir=str(tmp_path), fmt=fmt)
+
+    df = download(cache, server, "XBTUSD", "1m", "2020-01-01", end)
+    assert len(df) == 2501 and df.index.is_monotonic_increasing
+    assert df["close"].iloc[-1] == 2500
+    assert len(server.queries) == len(get_pages("1m", start, end))
+    files = os.listdir(tmp_path / "XBTUSD" / "1m")
+    assert len(files) == len(server.queries) and files[0].endswith(fmt)
+
+    calls = len(server.queries)
+    df2 = download(cache, server, "XBTUSD", "1m", start, end, ["close"])
+    assert len(server.queries) == calls
+    assert list(df2.columns) == ["close"]
+    assert (df2["close"].values == df["close"].values).all()
+
+
+def test_current_page_not_cached(tmp_path):
+    """La page en cours change encore, elle n'est pas gardée."""
+    end = pd.Timestamp.now(tz="UTC")
+    start = end - pd.Timedelta(hours=2)
+    server = StandInBuckets(start)
+    cache = BucketCache(None, cacheDir=str(tmp_path))
+    df = download(cache, server, "XBTUSD", "1m", start, end)
+    assert 100 < len(df) <= 121
+    pages = get_pages("1m", start, end)
+    assert not os.path.exists(cache.page_path("XBTUSD", "1m", pages[-1]))
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 """Tools to bargain."""
 from pandas import Timedelta, DataFrame
+from numpy import ndarray
 from numpy.random import randint
-from typing import Optional, Set, Dict, List
-from copy import deepcopy
+from typing import Callable, Hashable, Optional, Set, Dict, List, Tuple
+from time import sleep
 
 from kolaBitMEXBot.kola.kolatypes import ordStatusT
 from kolaBitMEXBot.kola.custom_bitmex import BitMEX
+from kolaBitMEXBot.kola.connexion.wstables import TableSnapshot
+from kolaBitMEXBot.kola.connexion.wsevents import Tables, poll_for
 from kolaBitMEXBot.kola.secrets import LIVE_KEY, LIVE_SECRET, TEST_KEY, TEST_SECRET
 from kolaBitMEXBot.kola.settings import (
     LIVE_URL,
@@ -17,6 +20,7 @@ from kolaBitMEXBot.kola.settings import (
     POST_ONLY,
     XBTSATOSHI,
     CONTRACTS,
+    WS_TRANSPORT,
 )
 from kolaBitMEXBot.kola.utils.datefunc import now
 from kolaBitMEXBot.kola.utils.general import round_sprice, is_number, trim_dic, cdr, car
@@ -51,8 +55,16 @@ class Bargain:
         timeout=TIMEOUT,
         logger=None,
         dbo=None,
+        ws=None,
+        transport=WS_TRANSPORT,
     ):
-        """Initialisation dbo is a dummy bitMEX object used for testing."""
+        """
+        Initialisation dbo is a dummy bitMEX object used for testing.
+
+        - ws: a BitMEXWebsocket shared with other bargains (eg. brg.bto.ws),
+        so several symbols use the same connexion.
+        - transport: "thread" or "asyncio" websocket client if ws is None
+        """
         self.logger = get_logger(logger, name=__name__, sLL="INFO")
 
         self.symbol = symbol
@@ -61,6 +73,9 @@ class Bargain:
             2, unit="D"
         )  # on s'assure d'être dans le passé.
         self.cached_refPrices = None
+        # copie triée de la table execution et calculs faits dessus, par version
+        self.execSnapshot: Optional[TableSnapshot] = None
+        self.execClIDs: Dict[Tuple[int, str], List[str]] = {}
 
         self.live = live
         if self.live and dbo is None:
@@ -83,6 +98,8 @@ class Bargain:
                 postOnly=postOnly,
                 timeout=timeout,
                 logger=self.logger,
+                ws=ws,
+                transport=transport,
             )
             self.dbo = None
 
@@ -135,7 +152,8 @@ class Bargain:
         Calcule la balance en satoshi (def), usd ou xbt atPrice.
 
         Si atPrice is None, use market buy sell or mid price
-        Voir aussi abonnement "wallet"
+        La marge et le levier sont lus dans les tables margin et position du
+        websocket, par REST seulement s'il est en reconnexion (cf. BitMEX.margin).
         """
         satoshi_balance = self.bto.margin()["availableMargin"] * self.get_leverage()
         xbt_balance = satoshi_balance * XBTSATOSHI
@@ -301,18 +319,15 @@ class Bargain:
         """
         try:
             if self.dbo is None:
-                # doi y avoir quelque chose avec un état mutalbe, une mise à au moment de
-                # de la création de la df.  (deep copy.)
-
-                _execution = deepcopy(self.bto.ws.data["execution"])
-                df = DataFrame(_execution)
+                # copie cohérente et triée, refaite seulement si la table change
+                df = self.execution_snapshot().frame
             else:
                 df = DataFrame(index=range(10), columns=EXECOLS, data="dummy")
         except ValueError as ve:
             # pb: la table execution qui ne renvois pas des objects tous de même taille
             # sol: filtrer / trier
             # should be a list of dictionnaries, some of different length
-            _execution = self.bto.ws.data["execution"]
+            _execution = list(self.bto.ws.data["execution"])
 
             self.logger.exception(
                 f"Exception '{ve}': We Probably have different execution shape. "
@@ -337,8 +352,8 @@ class Bargain:
 
             self.logger.warning(f"Returning {df}.\n Ignoring {_other_dics}")
 
-        if len(df):
-            df = df.sort_values("transactTime")
+            if len(df):
+                df = df.sort_values("transactTime")
 
         if clOrdID_ is not None:
             assert "clOrdID" in df, f"'clOrdID' should be in {df.columns}."
@@ -347,6 +362,24 @@ class Bargain:
 
         return df
 
+    def execution_snapshot(self) -> TableSnapshot:
+        """
+        Return the (version, frame) of my executions, sorted by transactTime.
+
+        La frame n'est recalculée que si la table execution a changé: un
+        appelant peut comparer version à celle de son dernier calcul pour
+        ne pas le refaire.  Ne pas modifier la frame, elle est partagée.
+        """
+        snapshot = self.bto.ws.table_snapshot("execution", self.symbol)
+        cached = self.execSnapshot
+        if cached is None or cached.version != snapshot.version:
+            df = snapshot.frame
+            if len(df):
+                df = df.sort_values("transactTime")
+            cached = self.execSnapshot = TableSnapshot(snapshot.version, df)
+            self.execClIDs = {}
+        return cached
+
     def get_srcKey(self, clOrdID_):
         """
         Reconstruit à partir de clOrdID, la srcKey qui l'identifierai.
@@ -377,12 +410,19 @@ class Bargain:
         des transactTimes.
         """
         # Ordres exécutés et ordonnés dans l'ordre ascendant
-        exec_clOrdID = (
-            self.execution().loc[:, "clOrdID"] if len(self.execution()) else []
-        )
+        if self.dbo is None:
+            snapshot = self.execution_snapshot()
+            _execution, key = snapshot.frame, (snapshot.version, srcKey_)
+        else:
+            _execution, key = self.execution(), None
         if debug_:
-            return self.execution().loc[:, EXECOLS] if len(self.execution()) else []
+            return _execution.loc[:, EXECOLS] if len(_execution) else []
+
+        # calculés une fois par version de la table execution
+        if key in self.execClIDs:
+            return list(self.execClIDs[key])
 
+        exec_clOrdID = _execution.loc[:, "clOrdID"] if len(_execution) else []
         seenIDs: Set[str] = set()
         clOrdIDs = []
 
@@ -391,6 +431,8 @@ class Bargain:
                 clOrdIDs.append(clID)
                 seenIDs |= set([clID])
 
+        if key is not None:
+            self.execClIDs[key] = list(clOrdIDs)
         return clOrdIDs
 
     def get_exec_with_(self, srcKey_, minTransacTime, debug_=False):
@@ -447,6 +489,129 @@ class Bargain:
         """Les trades récents?."""
         return self.bto.recent_trades()
 
+    def trades(
+        self, n: Optional[int] = None, copy: bool = False
+    ) -> Optional[Dict[str, ndarray]]:
+        """
+        Return the n last trades as read only numpy columns (no copy).
+
+        timestamp, price, size, side...  None if there is no websocket (dummy).
+        Les vues sont réécrites par le ws pendant qu'on les lit, pour les
+        lectures qui tolèrent une ligne déchirée (le dernier prix...).  Avec
+        copy, une copie cohérente et triée, cf. BitMEXWebsocket.table_view.
+        """
+        if self.dbo is not None:
+            return None
+        return self.bto.ws.table_view("trade", n, self.symbol, copy)
+
+    def quotes(
+        self, n: Optional[int] = None, copy: bool = False
+    ) -> Optional[Dict[str, ndarray]]:
+        """Return the n last quotes as read only numpy columns, see trades."""
+        if self.dbo is not None:
+            return None
+        return self.bto.ws.table_view("quote", n, self.symbol, copy)
+
+    def is_stale(self) -> bool:
+        """
+        Tell if the market data are stale, the websocket being reconnecting.
+
+        Les prix lus (prices, trades...) sont alors ceux d'avant la coupure,
+        ne pas agir dessus.  Toujours False avec le dummy.
+        """
+        return self.dbo is None and self.bto.ws.stale
+
+    def ws_metrics(self) -> Optional[DataFrame]:
+        """
+        Return the rate and latencies of the websocket messages per table.
+
+        Cf. WSMetrics.frame, None avec le dummy ou si WS_METRICS est faux.
+        """
+        if self.dbo is not None or self.bto.ws.metrics is None:
+            return None
+        return self.bto.ws.metrics.frame()
+
+    def http_stats(self) -> Optional[DataFrame]:
+        """
+        Return the duration, retries and bytes of the REST requests per endpoint.
+
+        Cf. BitMEX.http_stats, None avec le dummy ou si HTTP_METRICS est faux.
+        """
+        if self.dbo is not None:
+            return None
+        return self.bto.http_stats()
+
+    def impact_price(
+        self,
+        side: str,
+        orderQty: int,
+        symbol_: Optional[str] = None,
+        average: bool = True,
+    ) -> float:
+        """
+        Return the price to fill orderQty at market, read in the order book.
+
+        - average: prix moyen pondéré, sinon le prix du dernier niveau atteint,
+        cf. OrderBook.impact_price.
+        Sans carnet (dummy, non souscrit) ou s'il n'est pas assez profond,
+        renvoie prices("lastPrice", side).
+        """
+        _symbol = self.symbol if symbol_ is None else symbol_
+        book = None if self.dbo is not None else self.bto.market_depth(_symbol)
+        price = None if book is None else book.impact_price(side, orderQty, average)
+        if price is None:
+            return self.prices("lastPrice", side, _symbol)
+        return round_sprice(price, _symbol)
+
+    def wait_for(
+        self,
+        predicate: Callable,
+        tables: Tables,
+        timeout: Optional[float] = None,
+        ID: Hashable = None,
+        waitstep: float = 0.1,
+    ):
+        """
+        Block until predicate() is true or timeout (s), return its last value.
+
+        predicate is checked each time the websocket changes one of tables
+        (the rows of ID, a clOrdID or orderID, if given).  Without websocket
+        (dummy) it is polled every waitstep seconds.
+        """
+        if self.dbo is not None:
+            return poll_for(predicate, timeout, waitstep)
+        return self.bto.ws.events.wait_for(predicate, tables, timeout, ID)
+
+    def wait_for_change(
+        self, tables: Tables, timeout: Optional[float] = None, ID: Hashable = None
+    ) -> bool:
+        """
+        Block until the websocket changes one of tables or timeout (s).
+
+        Return True if there was a change, always False without websocket.
+        """
+        if self.dbo is not None:
+            sleep(timeout)
+            return False
+        return self.bto.ws.events.wait(tables, timeout, ID)
+
+    def subscribe(self, table: str, callback: Callable, ID: Hashable = None) -> bool:
+        """
+        Call callback(table, rows) on each websocket message of table.
+
+        Appelé dans le thread du websocket, cf. TableEvents.subscribe.
+        Return False without websocket (dummy), the caller has to poll.
+        """
+        if self.dbo is not None:
+            return False
+        self.bto.ws.events.subscribe(table, callback, ID)
+        return True
+
+    def unsubscribe(self, table: str, callback: Callable, ID: Hashable = None):
+        """Remove a callback registered with subscribe."""
+        if self.dbo is None:
+            self.bto.ws.events.unsubscribe(table, callback, ID)
+
     def get_most_recent_settlement_price(self):
         """Query the market for the last settlement price of symbol."""
         path = "trade"
@@ -478,9 +643,8 @@ class Bargain:
         """
         _symbol = self.symbol if symbol_ is None else symbol_
 
-        prices = {
-            k: v for (k, v) in self.bto.instrument(_symbol).items() if "rice" in k
-        }
+        # the live instrument record, we only read its keys containing "rice"
+        prices = self.bto.instrument_record(_symbol)
         # prices.keys = 'maxPrice', 'prevClosePrice', 'prevPrice24h', 'highPrice',
         # 'lastPrice', 'lastPriceProtected', 'bidPrice', 'midPrice', 'askPrice',
         # 'impactBidPrice', 'impactMidPrice', 'impactAskPrice', 'markPrice',
@@ -538,10 +702,10 @@ class Bargain:
             elif typeprice:
                 ret = prices[self.camelCase_price(typeprice)]
         except Exception as e:
-            self.logger.error(f"prices={prices}, e={e}")
+            self.logger.error(f"prices={get_prices(prices)}, e={e}")
             raise (e)
 
-        return prices if not ret else round_sprice(ret, self.symbol)
+        return get_prices(prices) if not ret else round_sprice(ret, self.symbol)
 
     def camelCase_price(self, priceName):
         """
@@ -615,3 +779,8 @@ class Bargain:
             self.bto.cancel(ids)
             return True
         return False
+
+
+def get_prices(instrument):
+    """Return the prices (keys containing "rice") of the instrument record."""
+    return {k: v for (k, v) in instrument.items() if "rice" in k}
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from functools import partial
 import threading
-from typing import Dict, Any
 from kolaBitMEXBot.kola.utils.logfunc import get_logger
-from kolaBitMEXBot.kola.utils.datefunc import now, setdef_timedelta
+from kolaBitMEXBot.kola.utils.datefunc import setdef_timedelta
 from kolaBitMEXBot.kola.utils.general import (
     contains,
     trim_dic,
@@ -10,8 +11,11 @@ from kolaBitMEXBot.kola.utils.general import (
     opt_pop_if_in_,
 )
 from kolaBitMEXBot.kola.utils.pricefunc import setdef_stopPrice
-from kolaBitMEXBot.kola.utils.orderfunc import get_order_from
+from kolaBitMEXBot.kola.utils.orderfunc import get_order_from, renewClID
 from kolaBitMEXBot.kola.orders.trailstop import TrailStop
+from kolaBitMEXBot.kola.orders.coalescer import AmendCoalescer
+from kolaBitMEXBot.kola.orders.order import Load, Order
+from kolaBitMEXBot.kola.orders.validation import ValidationDispatcher
 from kolaBitMEXBot.kola.orders.orders import (
     place,
     place_stop,
@@ -19,36 +23,78 @@ from kolaBitMEXBot.kola.orders.orders import (
     place_SL,
     place_MIT,
     place_LIT,
+    BulkPlacer,
     amend_prices,
+    get_bulk_amend,
     get_execPrice,
     cancel_order,
 )
+from kolaBitMEXBot.kola.settings import AMEND_WINDOW, BULK_MAX_ORDERS
 from kolaBitMEXBot.kola.utils.constantes import PRICE_PRECISION
 
-from time import sleep
-import pickle
 import kolaBitMEXBot.kola.utils.exceptions as ke
 
 # from kolaBitMEXBot.kola.orders import orders
 import pandas as pd
-from queue import Queue, Empty
+from queue import Empty, Queue
+
+# ordres placés ensemble par un BulkPlacer quand la file en contient plusieurs
+BULK_TYPES = {
+    "Market",
+    "Limit",
+    "Stop",
+    "StopLimit",
+    "MarketIfTouched",
+    "LimitIfTouched",
+}
+# mis dans la file de réception pour réveiller Chronos quand des réponses
+# d'amends regroupés l'attendent, cf. Chronos.on_amended
+WAKE_UP = Load(Order(ordType="amendReplies"))
 
 
 class Chronos(threading.Thread):
     # Cet objet s'assure que les orders reçus sont bien exécutés.
     # et il sert d'interface à plusieur thread vers la même connexion
 
-    def __init__(self, brg, recpt_queue, valid_queue=None, logger=None, nameT="chrsT"):
+    def __init__(
+        self,
+        brg,
+        recpt_queue,
+        valid_queue=None,
+        logger=None,
+        nameT="chrsT",
+        amendWindow=AMEND_WINDOW,
+        bulkMax=BULK_MAX_ORDERS,
+    ):
         """Un thread qui tourne jsuqu'à ce que stop soit vrai.
         utilise brg pour passer les orders reçu dans la queue.
-        vérifie la queue chaque freq secondes"""
+        vérifie la queue chaque freq secondes
+        - amendWindow: s pendant lesquelles les amends sont regroupés,
+        0 ou None pour les envoyer un par un
+        - bulkMax: nb max d'ordres lus dans la file et placés en un bulk"""
         threading.Thread.__init__(self, name=nameT)
         self.brg = brg
         self.recpt_queue = recpt_queue
         self.valid_queue = valid_queue
-        self.reply_queue: Queue = Queue()
+        # dernière réponse du broker, pour les logs d'erreur
+        self.lastReply = None
         self.stop = False
+        self.bulkMax = bulkMax
         self.logger = get_logger(logger, name=__name__, sLL="INFO")
+        # (rcvLoad, reply) des amends regroupés, traités par le thread Chronos
+        self.amendReplies: Queue = Queue()
+        self.amends = (
+            AmendCoalescer(brg, self.on_amended, amendWindow, logger=self.logger)
+            if amendWindow
+            else None
+        )
+        # un seul thread attend les exécutions de tous les ordres
+        self.validations = ValidationDispatcher(
+            brg,
+            self.validate,
+            partial(self.is_changed_, validateCancel=False),
+            logger=self.logger,
+        )
 
         self.logger.info(f"Fini init {self}")
 
@@ -56,366 +102,363 @@ class Chronos(threading.Thread):
         queues = {
             "reception": self.recpt_queue,
             "validation": self.valid_queue,
-            "reply": self.reply_queue,
         }
         rep = f"Chronos thread, using queues {queues}"
         return rep
 
+    def queue_stats(self):
+        """
+        Return the depth and waits of the reception queue per priority class.
+
+        Cf. LoadQueue.frame, None si la file n'est pas une LoadQueue.
+        """
+        frame = getattr(self.recpt_queue, "frame", None)
+        return frame() if frame is not None else None
+
     def run(self):
         """Tourne jusqu'à ce que stop soit mis en faute."""
         self.logger.info("Chronos started...")
+        self.validations.start()
 
         while not self.stop:
             self.logger.info("Chronos en écoute...")
 
             # on bloque le thread
             # attend ordre et oid associés qui arrive dans cette queue
-            rcvLoad = self.recpt_queue.get(block=True)
-            self.logger.debug(f"Chronos received load: {rcvLoad}")
+            self.process_all(self.get_loads())
 
-            sender = rcvLoad["sender"]
-            timeOut = rcvLoad["timeOut"]
-            symbol = rcvLoad["symbol"]
+        self.validations.stop = True
 
-            # make a deep copy of the order to avoid changing rcvLoad
-            rcvOrder = pickle.loads(pickle.dumps(rcvLoad["order"]))
-            ordType = rcvOrder.pop("ordType", None)
-            assert ordType, f"Should have an ordType in rcvOrder but {rcvOrder}"
-
-            execInst = rcvOrder.get("execInst", "")  # TriggeredOrActivatedBySystem
+    def get_loads(self):
+        """
+        Block for a load then drain the queue, up to bulkMax loads.
 
+        Avec une LoadQueue les loads viennent par priorité (cancels et amends
+        d'abord), sinon dans leur ordre d'arrivée.
+        """
+        rcvLoads = [self.recpt_queue.get(block=True)]
+        while len(rcvLoads) < (self.bulkMax or 1):
             try:
-                # 'Limit', 'Market', 'Stop', 'MarketIfTouched',
-                # 'StopLimit', 'LimitIfTouched'
-                side = rcvOrder.pop("side")
-                orderQty = rcvOrder.pop("orderQty")
-
-                # pop price from rcvOrder else get market price using side
-                price = self.pop_price_from_(rcvOrder, side, execInst, symbol)
-
-                # renvois un stopPx par défaut si ordType le nécessite
-                stopPx = self.pop_stopPx_from_(rcvOrder, price, side, ordType, symbol)
-
-                if ordType == "Market":
-                    rcvOrder["execInst"] = opt_pop_if_in_("price", rcvOrder["execInst"])
-                    timeOut = pd.Timedelta(5, unit="m")  # pourquoi ?
-                    self.reply_queue.put(
-                        place_at_market(self.brg, orderQty, side, **rcvOrder)
-                    )
-
-                elif ordType == "Limit":
-                    rcvOrder["execInst"] = opt_pop_if_in_("price", rcvOrder["execInst"])
-                    self.reply_queue.put(
-                        place(self.brg, side, orderQty, price, **rcvOrder)
-                    )
-
-                elif ordType == "Stop":
-                    self.reply_queue.put(
-                        place_stop(self.brg, side, orderQty, stopPx, **rcvOrder)
-                    )
-
-                elif ordType == "StopLimit":
-                    self.reply_queue.put(
-                        place_SL(self.brg, side, orderQty, stopPx, price, **rcvOrder)
-                    )
-
-                elif ordType == "MarketIfTouched":
-                    self.reply_queue.put(
-                        place_MIT(self.brg, side, orderQty, stopPx, **rcvOrder)
-                    )
-
-                elif ordType == "LimitIfTouched":
-                    self.reply_queue.put(
-                        place_LIT(self.brg, side, orderQty, stopPx, price, **rcvOrder)
-                    )
-
-                elif ordType.startswith("amend"):
-                    # One of the previous type (except Market) prefixed with 'amend'
-                    orderID = rcvOrder.pop("orderID")
-                    newPrice = rcvOrder.pop("newPrice")
-                    text = rcvOrder.pop("text", "")
-                    self.reply_queue.put(
-                        amend_prices(
-                            self.brg,
-                            orderID,
-                            newPrice,
-                            ordType,
-                            side,
-                            absdelta=PRICE_PRECISION.get(symbol, 1),
-                            text=text,
-                        )
-                    )
-                elif ordType == "cancel":
-                    
-                    timeOut = pd.Timedelta(1, unit="m")  # pourquoi ?
-                    clOrdID = rcvOrder.pop("clOrdID")
-                    self.reply_queue.put(cancel_order(self.brg, {"clOrdID": clOrdID}))
-                else:
-                    expmsg = f"Action type '{ordType}' pas prise en compte"
-                    raise Exception(expmsg)
-
-                # gestion des conditions de validation de l'ordre
-                valconditions = [{"exectype": "Trade", "orderstatus": "Filled"}]
-
-                if ordType in [
-                    "Stop",
-                    "MarketIfTouched",
-                    "StopLimit",
-                    "LimitIfTouched",
-                ] and isinstance(sender, TrailStop):
-                    valconditions = [{"exectype": "New", "orderstatus": "New"}]
-
-                elif ordType.startswith("amend"):
-                    valconditions = [{"exectype": "Replaced", "orderstatus": "New"}]
-
-                elif ordType == "cancel":
-                    # devrait toujours valider
-                    valconditions = [
-                        {"exectype": "Canceled", "orderstatus": "Canceled"}
-                    ]
-
-                # si pas d'exception c'est que l'ordre est bien transmit au broker
-                # Reste à vérifier l'execution
-                kwargs = {
-                    "timeout": timeOut,
-                    "rcvload": rcvLoad,
-                    "waitstep": 0.1,  # temps entre les vérification (intern)
-                    "valconditions": valconditions,
-                }
-
-                # on lance un thread qui tourne jusqu'à validation
-                threadName = (
-                    f'VT-{rcvLoad["order"]["clOrdID"].replace("mlk_", "")[:10]}'
-                )
-                self.logger.info(f"{threadName} check validation avec {kwargs}")
-                threading.Thread(
-                    target=self.wait_for_change, name=threadName, kwargs=kwargs
-                ).start()
-
-            except KeyError as k:
-                self.logger.exception(f"rcvOrder={rcvOrder} et rcvLoad={rcvLoad}")
-                raise k
-
-            except (ke.InvalidOrdStatus, ke.InvalidOrderID) as e:
-                if ordType.startswith("amend"):
-                    self.logger.error("Amending failed.  No validation!")
-                    self.valid_queue.put(
-                        {
-                            "brokerReply": False,
-                            "exgLoad": rcvLoad,
-                            "execValidation": False,
-                        }
-                    )
-                else:
-                    raise (e)
-
-            except ke.InvalidOrderQty:
-                self.logger.error("Canceling order and closing the essai.")
-                self.valid_queue.put(
-                    {"brokerReply": False, "exgLoad": rcvLoad, "execValidation": False}
-                )
+                rcvLoads.append(self.recpt_queue.get_nowait())
+            except Empty:
+                break
+        return rcvLoads
+
+    def process_all(self, rcvLoads):
+        """
+        Process the loads in order, the placements together in bulk.
 
-            except ke.InsufficientBalance:
-                self.logger.error("Insufficient Balance, Closing the essai.")
-                # we do so because to keep consistency with attached stop tail
-                self.logger.warning(f"Replacing 80% of the rcvLoad {rcvLoad}")
-                # attention chronos pourrait traiter un autre ordre
-                # que celui générant l'erreur, non ?
-                sender = rcvLoad["sender"]
-                overQty = sender.order.get("orderQty", 0)
-                reducedQty = round(overQty * 0.8)
-                if reducedQty < 31:
-                    self.logger.exception("Canceling order.  Closing the essai?")
-                    self.valid_queue.put(
-                        {
-                            "brokerReply": False,
-                            "exgLoad": rcvLoad,
-                            "execValidation": False,
-                        }
-                    )
-                else:
-                    sender.order["orderQty"] = reducedQty
-                    sender.send_order()
-
-            except ke.InvalidOrder as io:
-                self.logger.error(f"Invalid order? {rcvOrder}")
-                self.log_reply()
-                raise io
+        Les placements sont différés dans un BulkPlacer et envoyés en un seul
+        POST order/bulk, avant tout autre load (amend, cancel) pour garder
+        l'ordre de la file (celui des priorités avec une LoadQueue).
+        Les réponses des amends regroupés sont traitées d'abord.
+        """
+        self.route_amended()
+        rcvLoads = [rcvLoad for rcvLoad in rcvLoads if rcvLoad is not WAKE_UP]
+        if not rcvLoads:
+            return
+        if len(rcvLoads) == 1:
+            self.process(rcvLoads[0])
+            return
+
+        placer, deferred = BulkPlacer(self.brg), []
+        for rcvLoad in rcvLoads:
+            if rcvLoad["order"].get("ordType") not in BULK_TYPES:
+                self.place_deferred(placer, deferred)
+                deferred = []
+                self.process(rcvLoad)
+                continue
+
+            placed = len(placer)
+            timeOut = self.process(rcvLoad, placer)
+            if len(placer) > placed:
+                deferred.append((rcvLoad, timeOut))
+
+        self.place_deferred(placer, deferred)
+
+    def place_deferred(self, placer, deferred):
+        """
+        Send the placements of placer and route each reply to its load.
 
+        Une erreur que handle_errors relève (ordre invalide, erreur inconnue)
+        est la réponse de son load, validé à False: les autres loads ont
+        quand même leur réponse et Chronos continue de servir la file.
+        """
+        if not deferred:
+            return
+        self.logger.info(f"Placing {len(deferred)} orders in bulk.")
+        for (rcvLoad, timeOut), reply in zip(deferred, placer.send()):
+            try:
+                with self.handle_errors(rcvLoad):
+                    if isinstance(reply, Exception):
+                        raise reply
+                    ordType = rcvLoad["order"]["ordType"]
+                    self.start_validation(rcvLoad, ordType, timeOut, reply)
             except Exception as e:
-                # Si on arrive ici il y a probablement un gros pb de connexion
-                # que faire ?
-                # vraisemblablement d'un pique au niveau de bitmex avec affluence
-                # if no money handle
-                self.logger.exception(f"Unknown exception. RdvOrder={rcvOrder}")
-                self.log_reply()
-                raise e
+                self.validate(rcvLoad, e, False)
 
-    def log_reply(self, absMsg="No reply available"):
-        """Log the reply if available"""
-        reply = self.wait_for_reply(block=False)
-        if reply is None:
-            self.logger.error(absMsg)
-        else:
-            self.logger.error(f"Reply={trim_dic(reply, trimid=12)}")
-            self.reply_queue.put(reply)
+    def process(self, rcvLoad, brg=None):
+        """
+        Send the order of rcvLoad to the broker and start its validation.
 
-    # @log_args(level='DEBUG')
-    def wait_for_reply(self, block=True, timeout=None):
-        """Get the reply from the queue, return None if timeout reached."""
-        try:
-            # if block is false and nothing in queue raise queue.Empty
-            reply = self.reply_queue.get(block, timeout)
-            if block and timeout <= 0:
-                self.logger.debug(
-                    f"timeout={bool(timeout)} and block={block} while "
-                    f"reply={reply, type(reply)}"
+        - brg: un BulkPlacer pour différer un placement, renvoie alors le
+        timeOut de la validation à lancer après l'envoi (cf. place_deferred).
+        """
+        self.logger.debug(f"Chronos received load: {rcvLoad}")
+        brg = self.brg if brg is None else brg
+
+        timeOut = rcvLoad["timeOut"]
+        symbol = rcvLoad["symbol"]
+
+        # lu sans être modifié, rcvLoad peut être relancé tel quel
+        rcvOrder = rcvLoad["order"]
+        if not isinstance(rcvOrder, Order):
+            rcvOrder = Order.from_dict(rcvOrder)
+        ordType = rcvOrder.ordType
+        assert ordType, f"Should have an ordType in rcvOrder but {rcvOrder}"
+
+        execInst = rcvOrder.execInst or ""  # TriggeredOrActivatedBySystem
+
+        with self.handle_errors(rcvLoad):
+            # 'Limit', 'Market', 'Stop', 'MarketIfTouched',
+            # 'StopLimit', 'LimitIfTouched'
+            side, orderQty = rcvOrder.side, rcvOrder.orderQty
+            # clOrdID, execInst, text... des place_*
+            opts = rcvOrder.place_opts()
+
+            # price from rcvOrder else get market price using side
+            price = self.get_price_from_(rcvOrder, side, execInst, symbol, orderQty)
+
+            # renvois un stopPx par défaut si ordType le nécessite
+            stopPx = self.get_stopPx_from_(
+                rcvOrder, price, side, ordType, symbol=symbol
+            )
+
+            if ordType == "Market":
+                opts["execInst"] = opt_pop_if_in_("price", execInst)
+                timeOut = pd.Timedelta(5, unit="m")  # pourquoi ?
+                reply = place_at_market(brg, orderQty, side, **opts)
+
+            elif ordType == "Limit":
+                opts["execInst"] = opt_pop_if_in_("price", execInst)
+                reply = place(brg, side, orderQty, price, **opts)
+
+            elif ordType == "Stop":
+                reply = place_stop(brg, side, orderQty, stopPx, **opts)
+
+            elif ordType == "StopLimit":
+                reply = place_SL(brg, side, orderQty, stopPx, price, **opts)
+
+            elif ordType == "MarketIfTouched":
+                reply = place_MIT(brg, side, orderQty, stopPx, **opts)
+
+            elif ordType == "LimitIfTouched":
+                reply = place_LIT(brg, side, orderQty, stopPx, price, **opts)
+
+            elif ordType.startswith("amend") and self.amends is not None:
+                # regroupé avec les autres amends, cf. amended pour la suite
+                self.amends.add(
+                    rcvLoad,
+                    get_bulk_amend(
+                        rcvOrder["orderID"],
+                        rcvOrder["newPrice"],
+                        ordType,
+                        side,
+                        absdelta=PRICE_PRECISION.get(symbol, 1),
+                        text=rcvOrder.text or "",
+                    ),
                 )
+                return None
+
+            elif ordType.startswith("amend"):
+                # One of the previous type (except Market) prefixed with 'amend'
+                reply = amend_prices(
+                    self.brg,
+                    rcvOrder["orderID"],
+                    rcvOrder["newPrice"],
+                    ordType,
+                    side,
+                    absdelta=PRICE_PRECISION.get(symbol, 1),
+                    text=rcvOrder.text or "",
+                )
+            elif ordType == "cancel":
+                timeOut = pd.Timedelta(1, unit="m")  # pourquoi ?
+                reply = cancel_order(self.brg, {"clOrdID": rcvOrder["clOrdID"]})
+            else:
+                expmsg = f"Action type '{ordType}' pas prise en compte"
+                raise Exception(expmsg)
+
+            if brg is not self.brg:
+                # placement différé, envoyé et validé par place_deferred
+                return timeOut
+
+            # si pas d'exception c'est que l'ordre est bien transmit au broker
+            # Reste à vérifier l'execution
+            self.start_validation(rcvLoad, ordType, timeOut, reply)
+
+    @contextmanager
+    def handle_errors(self, rcvLoad):
+        """Handle the broker exceptions raised for the order of rcvLoad."""
+        ordType = rcvLoad["order"].get("ordType", "")
+        try:
+            yield
 
-            if isinstance(reply, list):
-                assert len(reply) <= 1, (
-                    f"Reply is too long. Que choisir ?"
-                    f"Reply={trim_dic(reply, trimid=12)}"
+        except KeyError as k:
+            self.logger.exception(f"rcvLoad={rcvLoad}")
+            raise k
+
+        except (ke.InvalidOrdStatus, ke.InvalidOrderID) as e:
+            if ordType.startswith("amend"):
+                self.logger.error("Amending failed.  No validation!")
+                self.validate(rcvLoad, False, False)
+            else:
+                raise (e)
+
+        except ke.InvalidOrderQty:
+            self.logger.error("Canceling order and closing the essai.")
+            self.validate(rcvLoad, False, False)
+
+        except ke.InsufficientBalance:
+            self.logger.error("Insufficient Balance, Closing the essai.")
+            # we do so because to keep consistency with attached stop tail
+            self.logger.warning(f"Replacing 80% of the rcvLoad {rcvLoad}")
+            # attention chronos pourrait traiter un autre ordre
+            # que celui générant l'erreur, non ?
+            rcvOrder = Order.from_dict(rcvLoad["order"])
+            reducedQty = round((rcvOrder.orderQty or 0) * 0.8)
+            if reducedQty < 31:
+                self.logger.exception("Canceling order.  Closing the essai?")
+                self.validate(rcvLoad, False, False)
+            else:
+                # le load repasse dans la file avec une copie amendée de
+                # l'ordre envoyé, sous un clOrdID que bitmex n'a pas vu; son
+                # sender attend toujours sa validation (cf. validate)
+                rcvLoad["order"] = rcvOrder.amend(
+                    orderQty=reducedQty, clOrdID=renewClID(rcvOrder.clOrdID)
                 )
-                reply = reply[0]
+                self.recpt_queue.put(rcvLoad)
 
-            return reply
-        except Empty:
-            self.logger.error(
-                f"reply={trim_dic(reply, trimid=12) if reply is not None else 'reply is None'},"
-                f" timeout={timeout}, block={block}"
-            )
+        except ke.MaxRetries as e:
+            # endpoint en panne (disjoncteur ouvert, relances épuisées): on
+            # lâche cet ordre et Chronos continue de servir les autres
+            self.logger.error(f"{e} {e.extra}, dropping {rcvLoad['order']}")
+            self.validate(rcvLoad, False, False)
 
-    def get_ID_from(self, rcvOrder, idType="clOrdID"):
-        """Return the ID from the rcvOrder (a dict containing an order)."""
-        assert rcvOrder is not None, f"rcvOrder={rcvOrder} should not be None."
-        try:
-            return get_order_from(rcvOrder).get(idType)
-        except Exception as e:
-            self.logger.error(f"rcvOrder, idType={rcvOrder, idType}")
-            raise (e)
+        except ke.InvalidOrder as io:
+            self.logger.error(f"Invalid order? {rcvLoad['order']}")
+            self.log_reply()
+            raise io
 
-    def wait_for_change(
-        self,
-        valconditions=None,
-        rcvload=None,
-        timeout: pd.Timedelta = None,
-        waitstep: float = 1,
-    ):
+        except Exception as e:
+            # Si on arrive ici il y a probablement un gros pb de connexion
+            # que faire ?
+            # vraisemblablement d'un pique au niveau de bitmex avec affluence
+            # if no money handle
+            self.logger.exception(f"Unknown exception. RdvOrder={rcvLoad['order']}")
+            self.log_reply()
+            raise e
+
+    def start_validation(self, rcvLoad, ordType, timeOut, reply=None):
         """
-        Boucle qui attend de recevoir dans order execution from ws.
+        Wait for the execution of the order in rcvLoad, see validate.
 
-        ordertype: orderstatus.
-        - timeout doit être un pd.Timedelta,
-        - waitStep en second
-        ordertype is 'ordStatus our triggered et ordstatus ??
+        - reply: la réponse du broker à l'envoi de l'ordre
         """
-        self.logger.debug("Thread started.")
-
-        # defaults
-        timeOut = setdef_timedelta(timeout, default=pd.Timedelta(60, unit="m"))
-
-        clOrdID = (
-            self.brg.bto.dummyID
-            if self.brg.bto.dummy
-            else self.get_ID_from(rcvload, "clOrdID")
+        self.lastReply = reply
+        # gestion des conditions de validation de l'ordre
+        valconditions = [{"exectype": "Trade", "orderstatus": "Filled"}]
+
+        if ordType in [
+            "Stop",
+            "MarketIfTouched",
+            "StopLimit",
+            "LimitIfTouched",
+        ] and isinstance(rcvLoad["sender"], TrailStop):
+            valconditions = [{"exectype": "New", "orderstatus": "New"}]
+
+        elif ordType.startswith("amend"):
+            valconditions = [{"exectype": "Replaced", "orderstatus": "New"}]
+
+        elif ordType == "cancel":
+            # devrait toujours valider
+            valconditions = [{"exectype": "Canceled", "orderstatus": "Canceled"}]
+
+        # résolue par le dispatcher à l'arrivée de l'exécution
+        timeOut = setdef_timedelta(timeOut, default=pd.Timedelta(60, unit="m"))
+        self.logger.info(
+            f"check validation of {rcvLoad['order']['clOrdID']} with {valconditions}"
         )
+        self.validations.add(rcvLoad, valconditions, timeOut, reply)
 
-        startTime = now()
-
-        def update_timeleft(timeout=timeOut, starttime=startTime, now_=None):
-            """
-            Update time left
-
-            -now_: is sometime set by default.
-            """
-            _now = now_ if now_ else now()
-            # convert to seconds +/-
-            _timeleft = (timeout + starttime - _now).delta / 10e8
-
-            return _timeleft if _timeleft > 0 else 0
-
-        timeLeft = update_timeleft()
-        
-        while timeLeft > 0 and not self.is_changed_(
-            clOrdID, valconditions, validateCancel=False
-        ):
-            # #### is_changed_ important !
-            # validating cancel enable resubminting orders ?
-
-            sleep(waitstep)
-            timeLeft = update_timeleft()
-            if timeLeft % 298 == 0:
-                # logging every 4:58
-                self.logger.info(f"timeLeft={timeLeft}s. Still waiting...")
-                sleep(1)  # avoid too much logging and throwtlle the system
-
-        # block until next reply
-        reply = self.wait_for_reply(block=True, timeout=timeLeft)
-
-        # problème avec les reply None
-
-        if rcvload["order"]["ordType"].lower() == "cancel":
-            self.logger.info(f"*ordType is canceled* rcvload={rcvload}")
-            replyID = rcvload["order"]["clOrdID"]
-        elif reply is None:
-            # mais si ce n'est pas la bonne reply ? on va tester après
-            replyID = rcvload["order"]["clOrdID"]
-        else:
-            replyID = self.get_ID_from(reply, "clOrdID")
+    def on_amended(self, rcvLoad, reply):
+        """
+        Hand the reply of a coalesced amend over to the Chronos thread.
 
-        seenReplyIDs: Dict[Any, Any] = {}
+        Appelé par AmendCoalescer.flush dans son Timer: la réponse attend dans
+        amendReplies et WAKE_UP réveille Chronos, cf. route_amended.
+        """
+        self.amendReplies.put((rcvLoad, reply))
+        self.recpt_queue.put(WAKE_UP)
 
-        while replyID != clOrdID and timeLeft:
-            # in case it's not the reply ID we are waiting for
-            # saving ID already seen to avoid clutering logs
-            if replyID is not None:
-                seenReplyIDs[replyID] = seenReplyIDs.get(replyID, 0) + 1
+    def route_amended(self):
+        """Route the waiting replies of the coalesced amends, see amended."""
+        while True:
+            try:
+                rcvLoad, reply = self.amendReplies.get_nowait()
+            except Empty:
+                return
+            self.amended(rcvLoad, reply)
 
-            if seenReplyIDs.get(replyID, 0) < 2:
-                self.logger.debug(
-                    f"*No match ID* for clOrdID={clOrdID}"
-                    f" in {trim_dic(reply, trimid=12)}!"
-                )
-            if reply:
-                # to be sure not to put Nones back in the loop
-                self.reply_queue.put(reply)
+    def amended(self, rcvLoad, reply):
+        """
+        Route the reply of a coalesced amend to the sender of rcvLoad.
 
-            try:
-                # can get None here, not good... if timeout..
-                reply = self.wait_for_reply(timeout=timeLeft)
-                replyID = (
-                    clOrdID if reply is None else self.get_ID_from(reply, "clOrdID")
-                )
-            except Exception as e:
-                self.logger.error(
-                    f"reply={reply}, timeLeft={timeLeft}, replyID={replyID}"
-                    f"clOrdID={clOrdID}"
-                )
-                raise (e)
+        Dans le thread Chronos, reply est None si l'amend a échoué.
+        """
+        if reply is None:
+            self.logger.error("Amending failed.  No validation!")
+            self.validate(rcvLoad, False, False)
+            return
 
-            timeLeft = update_timeleft()
+        ordType = rcvLoad["order"]["ordType"]
+        self.start_validation(rcvLoad, ordType, rcvLoad["timeOut"], reply)
 
-            self.logger.debug(
-                f"Getting out of the loop. seenReplyIds={seenReplyIDs},"
-                f" timeLeft={timeLeft}, reply={reply}."
-            )
+    def validate(self, rcvLoad, brokerReply, execValidation):
+        """
+        Send the validation of the order of rcvLoad to its sender.
 
-        # ici il y a en fait le cas des reply error d'ammending
-        if timeLeft and reply is not None and not reply.get("error", False):
-            validation = reply
+        {"brokerReply", "exgLoad", "execValidation"} est le résultat du future
+        du load (cf. OrderConditionned.get_load), seul son sender l'attend.
+        Les loads sans future sont validés dans valid_queue.
+        """
+        validation = {
+            "brokerReply": brokerReply,
+            "exgLoad": rcvLoad,
+            "execValidation": execValidation,
+        }
+        future = rcvLoad.get("future")
+        if future is None:
+            self.valid_queue.put(validation)
+        elif future.done():
+            self.logger.warning(f"{rcvLoad['order']} already validated.")
         else:
-            validation = False
+            future.set_result(validation)
 
-        self.logger.info(
-            f"_Attendu {timeOut - pd.Timedelta(timeLeft, unit='s')}_  "
-            f"Validation for {replyID} is {bool(validation)}."
-        )
-        #self.logger.debug(f"Détail validation {validation} et reply")
+    def log_reply(self, absMsg="No reply available"):
+        """Log the last reply of the broker if available."""
+        if self.lastReply is None:
+            self.logger.error(absMsg)
+        else:
+            self.logger.error(f"Reply={trim_dic(self.lastReply, trimid=12)}")
 
-        self.valid_queue.put(
-            {"brokerReply": reply, "exgLoad": rcvload, "execValidation": validation}
-        )
+    def get_ID_from(self, rcvOrder, idType="clOrdID"):
+        """Return the ID from the rcvOrder (a dict containing an order)."""
+        assert rcvOrder is not None, f"rcvOrder={rcvOrder} should not be None."
+        try:
+            return get_order_from(rcvOrder).get(idType)
+        except Exception as e:
+            self.logger.error(f"rcvOrder, idType={rcvOrder, idType}")
+            raise (e)
 
     def is_changed_(
         self,
@@ -492,29 +535,33 @@ class Chronos(threading.Thread):
                 self.logger.exception(f"Returning -1 of oidWstatus={oidWstatus},")
                 return oidWstatus[-1]
 
-    def pop_price_from_(self, rcvOrder, side, execInst, symbol=None):
+    def get_price_from_(self, rcvOrder, side, execInst, symbol=None, orderQty=None):
         """
-        Get price from rcvOrder.
+        Get price from rcvOrder (an Order).
 
         else get the market price using execInst and side.  
-        By default get lastMidprice
+        By default get lastMidprice.  With ImpactPrice in execInst (Limit or
+        Market orders, their price execInst are not sent), the price to fill
+        orderQty in the order book.
         """
-        return rcvOrder.pop(
-            "price", get_execPrice(self.brg, side, {"execInst": execInst}, symbol)
+        if rcvOrder.price is not None:
+            return rcvOrder.price
+        return get_execPrice(
+            self.brg, side, {"execInst": execInst}, symbol=symbol, orderQty=orderQty
         )
 
-    def pop_stopPx_from_(
+    def get_stopPx_from_(
         self, rcvOrder, price, side, ordtype, absdelta=None, symbol=None
     ):
         """
-        Pop the stopPx from the rcvOrder.
+        Get the stopPx from the rcvOrder (an Order).
 
         Use class method to facilitate eventual logging.
         if stopPx not in rcvOrder,
         set de default stopPx based on price side, ordType and absdelta
         """
         # absdelta = PRICE_PRECISION.get(symbol,1) if absdelta is None else absdelta
-        stopPx = rcvOrder.pop("stopPx", None)
+        stopPx = rcvOrder.stopPx
         if stopPx is None and contains(["Stop", "Touched"], ordtype):
             # probably not necessary as stop should be set
             # defaut to 2 for XBTUSD
@@ -522,7 +569,7 @@ class Chronos(threading.Thread):
                 entryPrice=price,
                 side=side,
                 ordtype=ordtype,
-                absdelta=rcvOrder.pop("oDelta", PRICE_PRECISION[symbol]),
+                absdelta=rcvOrder.get("oDelta", PRICE_PRECISION[symbol]),
             )
 
         return stopPx
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Client REST BitMEX sur asyncio.
+
+Même correspondance erreurs -> exceptions que BitMEX._curl_bitmex
+(ke.InvalidOrdStatus, ke.InsufficientBalance...), mêmes retries sur les
+429, 502, 503 et timeouts et mêmes disjoncteurs (cf. retrypolicy), mais les
+pauses sont des await: une requête lente
+ou en retry ne bloque que sa coroutine.  Les requêtes partagent un pool de
+connexions keep-alive et le seau de jetons de la clé (cf. ratelimit), on peut
+en avoir plusieurs en vol avec asyncio.gather.
+Nécessite le paquet aiohttp (pip install kolaBitMEXBot[async]).
+"""
+from json import dumps
+from time import monotonic, time
+from urllib.parse import urlencode
+import asyncio
+
+import aiohttp
+from yarl import URL
+
+from kolaBitMEXBot.kola.connexion.auth import generate_signature
+from kolaBitMEXBot.kola.connexion.ratelimit import get_bucket
+from kolaBitMEXBot.kola.connexion.retrypolicy import (
+    RetryPolicy,
+    RetryRequest,
+    get_breaker,
+)
+from kolaBitMEXBot.kola.custom_bitmex import (
+    get_bad_request_error,
+    get_placed_query,
+    get_placed_reply,
+    is_duplicate,
+)
+from kolaBitMEXBot.kola.settings import HTTP_ASYNC_CONNECTIONS, TIMEOUT
+from kolaBitMEXBot.kola.utils.logfunc import get_logger
+import kolaBitMEXBot.kola.utils.exceptions as ke
+
+
+class AsyncBitMEXRest:
+    """
+    Les requêtes REST de BitMEX en coroutines.
+
+    La session aiohttp est ouverte à la première requête, dans la boucle
+    courante, et fermée par close.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        apiKey,
+        apiSecret,
+        timeout=TIMEOUT,
+        connections=HTTP_ASYNC_CONNECTIONS,
+        logger=None,
+        retryPolicy=None,
+    ):
+        """
+        Init the client.
+
+        - base_url: eg. https://testnet.bitmex.com/api/v1/
+        - connections: nb max de connexions ouvertes en même temps
+        - retryPolicy: relances des requêtes, def. RetryPolicy()
+        """
+        self.base_url = base_url
+        self.apiKey = apiKey
+        self.apiSecret = apiSecret
+        self.timeout = timeout
+        self.connections = connections
+        self.logger = get_logger(logger, name=__name__, sLL="INFO")
+        self.rateLimit = get_bucket(apiKey)
+        self.retryPolicy = retryPolicy or RetryPolicy()
+        self.session = None
+
+    def __repr__(self):
+        return f"AsyncBitMEXRest(url={self.base_url})"
+
+    def get_session(self):
+        """Return the session, opened on first use."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                headers={
+                    "user-agent": "idev-",
+                    "content-type": "application/json",
+                    "accept": "application/json",
+                },
+            )
+        return self.session
+
+    async def close(self):
+        """Close the session and its connexions."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def get_auth_headers(self, verb, url, body):
+        """Return the api-key headers for the request, see APIKeyAuthWithExpires."""
+        expires = int(round(time()) + 5)
+        return {
+            "api-expires": str(expires),
+            "api-key": self.apiKey,
+            "api-signature": generate_signature(
+                self.apiSecret, verb, url, expires, body
+            ),
+        }
+
+    async def curl_bitmex(
+        self,
+        path,
+        query=None,
+        postdict=None,
+        timeout=None,
+        verb=None,
+        rethrow_errors=True,
+        max_retries=None,
+    ):
+        """
+        Send a request to BitMEX, like BitMEX._curl_bitmex.
+
+        Seuls les timeouts, connexions perdues, 502 et 503 comptent pour le
+        disjoncteur, un clOrdID en double renvoie l'ordre déjà placé.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        verb = verb or ("POST" if postdict else "GET")
+        if max_retries is None or max_retries <= 0:
+            max_retries = self.retryPolicy.maxRetries
+        load = {
+            "path": path,
+            "query": query,
+            "postdict": postdict,
+            "timeout": timeout,
+            "verb": verb,
+            "rethrow_errors": rethrow_errors,
+            "max_retries": max_retries,
+        }
+
+        # l'url signée doit être celle envoyée, sans ré-encodage
+        url = self.base_url + path
+        if query:
+            url += "?" + urlencode(query)
+        body = dumps(postdict) if postdict is not None else ""
+        if verb in ["POST", "PUT"]:  # don't want to log GET
+            self.logger.info(f"sending {verb} to {url}: {body}")
+
+        breaker = get_breaker(self.base_url, verb, path)
+        start, retries = monotonic(), 0
+        while True:
+            if not breaker.allow():
+                raise ke.CircuitOpen(
+                    f"{verb} {path}: circuit open",
+                    load=postdict,
+                    extra=f"retry in {breaker.retry_in():.1f}s",
+                )
+            try:
+                reply = await self._send(verb, url, body, timeout, load)
+            except RetryRequest as retry:
+                exception, failure = retry.exception, retry.failure
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                # Timeout, re-run this request
+                exception, failure = e, True
+            except Exception:
+                # erreur métier, l'endpoint a répondu
+                breaker.success()
+                raise
+            else:
+                breaker.success()
+                return reply
+
+            if failure:
+                breaker.failure()
+            else:
+                breaker.success()  # l'endpoint a répondu
+            retries += 1
+            pause = self.retryPolicy.pause(retries)
+            if self.retryPolicy.give_up(retries, start, pause, max_retries):
+                raise ke.MaxRetries(
+                    exception, load=postdict, extra=f"{path}: Max retries hit"
+                )
+            self.logger.warning(
+                f"retry {verb} {path} {retries}/{max_retries}: "
+                f"Pause de {pause:.2f} sec: postdict={body}"
+            )
+            await asyncio.sleep(pause)
+
+    async def _send(self, verb, url, body, timeout, load):
+        """
+        Send the request once, return its json or raise.
+
+        Le corps des 429, 502 et 503 n'est pas lu (souvent du html d'une
+        gateway), celui des autres erreurs vaut {} s'il n'est pas du json.
+        Contrairement à BitMEX._send_once, un 429 n'annule pas les ordres
+        ouverts: ce client n'a pas de websocket pour les connaître et ne
+        place ses ordres que pour un appelant, à qui il revient de le faire.
+        """
+        headers = self.get_auth_headers(verb, url, body)
+        waited = await self.rateLimit.acquire_async()
+        if waited > 1:
+            self.logger.info(f"Rate limited: waited {waited:.1f}s for {load['path']}")
+
+        async with self.get_session().request(
+            verb,
+            URL(url, encoded=True),
+            data=body or None,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            self.rateLimit.update(response.headers)
+            status = response.status
+            if status < 300:
+                return await response.json(content_type=None)
+            if status in (429, 502, 503):
+                error = {}
+            else:
+                error = await read_error(response)
+
+        e = aiohttp.ClientResponseError(
+            response.request_info, (), status=status, message=str(error)
+        )
+
+        if status == 400:
+            message = error.get("message", "No message").lower()
+            self.logger.warning(f'Error message="{message}", load={load}')
+            if is_duplicate(load["verb"], load["postdict"], message):
+                return await self.get_placed(load["postdict"])
+            exception = get_bad_request_error(e, load, message)
+            if exception is None:
+                raise RetryRequest(e, failure=False)
+            raise exception
+
+        if status == 401:
+            # 401 - Auth error. This is fatal.
+            self.logger.error("API Key or Secret incorrect, please check and restart.")
+            raise ke.InvalidOrder(e, load, error)
+
+        if status == 404:
+            # can be thrown if order canceled or does not exist.
+            if load["verb"] == "DELETE":
+                self.logger.error(f"Order not found. load={load}")
+                return None
+            if load["verb"] == "GET":
+                raise RetryRequest(e, failure=False)
+            raise ke.InvalidOrder(e, load, error)
+
+        if status == 429:
+            # toutes les requêtes de la clé attendent le reset dans acquire
+            reset = response.headers.get("X-Ratelimit-Reset")
+            self.logger.error(f"Ratelimited on current request, reset at {reset}.")
+            self.rateLimit.block(None if reset is None else int(reset))
+            raise RetryRequest(e, failure=False)
+
+        if status in [502, 503]:
+            raise RetryRequest(e)
+
+        self.logger.error(f"msg={error}, load={load}")
+        raise ke.InvalidOrder(e, load, error)
+
+    async def get_placed(self, postdict):
+        """Return the orders of postdict already placed, see BitMEX.get_placed."""
+        placed = await self.curl_bitmex(
+            path="order", query=get_placed_query(postdict), verb="GET"
+        )
+        return get_placed_reply(postdict, placed)
+
+    async def create_bulk_orders(self, orders):
+        """Place orders (postdicts, see BitMEX.create_order) in one request."""
+        return await self.curl_bitmex(
+            path="order/bulk", postdict={"orders": orders}, verb="POST"
+        )
+
+    async def amend_bulk_orders(self, orders):
+        """Amend multiple orders."""
+        return await self.curl_bitmex(
+            path="order/bulk", postdict={"orders": orders}, verb="PUT"
+        )
+
+    async def cancel(self, postdict):
+        """Cancel orders, postdict is {"orderID": [...]} or {"clOrdID": [...]}."""
+        return await self.curl_bitmex(path="order", postdict=postdict, verb="DELETE")
+
+    async def margin(self, currency="XBt"):
+        """Get avalaible margin."""
+        return await self.curl_bitmex(
+            path="user/margin", query={"currency": currency}, verb="GET"
+        )
+
+    async def instruments(self, filtre=None):
+        """Get http instruments."""
+        query = {"filter": dumps(filtre)} if filtre else {}
+        return await self.curl_bitmex(path="instrument", query=query, verb="GET")
+
+
+async def read_error(response) -> dict:
+    """Return the error of a response, {} if its body is not a json error."""
+    try:
+        reply = await response.json(content_type=None)
+    except ValueError:  # JSONDecodeError, une page html...
+        return {}
+    error = reply.get("error") if isinstance(reply, dict) else None
+    return error if isinstance(error, dict) else {}
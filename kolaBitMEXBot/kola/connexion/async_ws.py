@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Client websocket BitMEX sur asyncio.
+
+Même interface publique que BitMEXWebsocket (connect, get_instrument,
+open_orders, exec_orders, position, funds...) mais les messages sont lus par
+une tâche asyncio au lieu d'un thread websocket-client.  Une stratégie qui
+tourne dans la même boucle lit les tables sans concurrence avec un thread
+de callback.  Nécessite le paquet websockets (pip install kolaBitMEXBot[async]).
+"""
+from threading import Thread
+import asyncio
+import json
+
+from websockets.asyncio.client import connect as ws_connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+
+from kolaBitMEXBot.kola.connexion.custom_ws_thread import (
+    BitMEXWebsocket,
+    ACCOUNT_TABLES,
+    get_backoff,
+    new_tables,
+)
+from kolaBitMEXBot.kola.settings import (
+    SYMBOL,
+    JSON_DECODER,
+    INSTRUMENTS_ALLOWLIST,
+    WS_CAPTURE,
+    WS_ORDERBOOK,
+)
+
+
+class AsyncBitMEXWebsocket(BitMEXWebsocket):
+    """
+    BitMEXWebsocket dont le transport est une boucle asyncio.
+
+    - dans une coroutine: await connect_async(...) lit dans la boucle courante,
+    - sinon connect(...) démarre sa propre boucle dans un thread.
+    Les tables, leurs événements et les méthodes de lecture sont ceux de
+    BitMEXWebsocket.
+    """
+
+    def __init__(
+        self, apiKey, apiSecret, logger=None, symbol=None, ringCapacity=None, loop=None
+    ):
+        """
+        Init the websocket.
+
+        - loop: la boucle asyncio où lire les messages, sinon une boucle
+        est créée dans un thread au connect.
+        """
+        BitMEXWebsocket.__init__(
+            self,
+            apiKey,
+            apiSecret,
+            logger=logger,
+            symbol=symbol,
+            ringCapacity=ringCapacity,
+        )
+        self.loop = loop
+        self.ws = None
+        self.reader = None  # la tâche qui lit les messages
+        self.loopThread = None
+
+    def __repr__(self):
+        return f"Async{BitMEXWebsocket.__repr__(self)}"
+
+    def connect(
+        self,
+        endpoint="",
+        symbol=SYMBOL,
+        shouldAuth=True,
+        decoder=JSON_DECODER,
+        instruments=INSTRUMENTS_ALLOWLIST,
+        symbols=None,
+        capture=WS_CAPTURE,
+        orderBook=WS_ORDERBOOK,
+    ):
+        """
+        Connect from synchronous code and wait for the partials.
+
+        La boucle tourne dans un thread, utiliser connect_async depuis une
+        coroutine.
+        """
+        if running_loop() is not None:
+            raise RuntimeError("In an event loop, use `await connect_async(...)`.")
+
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.loopThread = Thread(
+                target=self.loop.run_forever, name="wsLoop", daemon=True
+            )
+            self.loopThread.start()
+
+        self.run(
+            self.connect_async(
+                endpoint,
+                symbol,
+                shouldAuth,
+                decoder,
+                instruments,
+                symbols,
+                capture,
+                orderBook,
+            )
+        )
+
+    async def connect_async(
+        self,
+        endpoint="",
+        symbol=SYMBOL,
+        shouldAuth=True,
+        decoder=JSON_DECODER,
+        instruments=INSTRUMENTS_ALLOWLIST,
+        symbols=None,
+        capture=WS_CAPTURE,
+        orderBook=WS_ORDERBOOK,
+    ):
+        """Connect in the running loop and wait for the partials, see connect."""
+        self.loop = asyncio.get_running_loop()
+        self.wsURL = self.prepare(
+            endpoint,
+            symbol,
+            shouldAuth,
+            decoder,
+            instruments,
+            symbols,
+            capture,
+            orderBook,
+        )
+        self.ws = await self.open_connexion()
+        self.reader = self.loop.create_task(self.read())
+
+        for _symbol in self.symbols:
+            await self.events.wait_for_async(
+                lambda: self.symbol_ready(_symbol), self.symbol_tables()
+            )
+        if self.shouldAuth:
+            await self.events.wait_for_async(self.account_ready, ACCOUNT_TABLES)
+
+    async def open_connexion(self):
+        """Open the websocket on self.wsURL."""
+        headers = [h.split(":", 1) for h in self.get_auth_headers()]
+        self.logger.info(f"Connecting to {self.wsURL}")
+        return await ws_connect(
+            self.wsURL,
+            additional_headers=[(k.strip(), v.strip()) for k, v in headers],
+            max_size=None,
+        )
+
+    async def read(self):
+        """
+        Handle the messages until exit, reconnecting if the connexion drops.
+
+        Comme pour le transport thread, self.stale est vrai jusqu'à ce que les
+        tables neuves de la reconnexion aient leurs partials (cf. resync).
+        """
+        fresh = None
+        while not self.exited:
+            try:
+                async for message in self.ws:
+                    self.handle_message(message, fresh)
+            except ConnectionClosed as e:
+                self.logger.warning(f"ws closed: {e!r}")
+
+            if self.exited:
+                break
+
+            self.stale = True
+            delay = get_backoff(self.retries)
+            self.retries += 1
+            self.logger.warning(
+                f"ws dropped, reconnecting in {delay:.1f}s (attempt {self.retries})"
+            )
+            await asyncio.sleep(delay)
+            try:
+                self.ws = await asyncio.wait_for(self.open_connexion(), 10)
+                fresh = new_tables()
+            except (OSError, WebSocketException, asyncio.TimeoutError) as e:
+                self.logger.error(f"Reconnexion failed: {e!r}")
+
+    def add_symbols(self, symbols):
+        """Subscribe to symbols from synchronous code, see BitMEXWebsocket."""
+        if running_loop() is self.loop:
+            raise RuntimeError("In the ws loop, use `await add_symbols_async(...)`.")
+        return self.run(self.add_symbols_async(symbols))
+
+    async def add_symbols_async(self, symbols):
+        """Subscribe to the tables of symbols and wait for their partials."""
+        newSymbols, subscriptions = self.prepare_symbols(symbols)
+        if newSymbols:
+            await self.ws.send(json.dumps({"op": "subscribe", "args": subscriptions}))
+
+        for symbol in newSymbols:
+            await self.events.wait_for_async(
+                lambda: self.symbol_ready(symbol), self.symbol_tables()
+            )
+        return newSymbols
+
+    def send_command(self, command, args):
+        """Send a raw command, from any thread."""
+        message = json.dumps({"op": command, "args": args or []})
+        if running_loop() is self.loop:
+            self.loop.create_task(self.ws.send(message))
+        else:
+            self.run(self.ws.send(message))
+
+    def run(self, coro):
+        """Run coro in the ws loop from another thread and return its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def exit(self):
+        """Close the connexion and stop the loop if it is ours."""
+        self.exited = True
+        self.stop_capture()
+        if self.ws is None or self.loop is None or self.loop.is_closed():
+            return
+
+        if running_loop() is self.loop:
+            self.loop.create_task(self.ws.close())
+            return
+
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.ws.close(), self.loop)
+            future.result(timeout=5)
+        except Exception as e:
+            self.logger.warning(f"Closing the ws: {e!r}")
+
+        if self.loopThread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loopThread.join(timeout=5)
+            self.loopThread = None
+
+
+def running_loop():
+    """Return the running event loop of this thread or None."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Capture et rejeu des messages bruts du websocket.
+
+Une capture est un fichier gzip en ajout seul, une ligne par message:
+`<temps de réception en ns depuis epoch>\\t<message brut>`.  Chaque ouverture
+ajoute un membre gzip, le fichier se relit d'un seul tenant.  Le rejeu
+renvoie les messages au handler du websocket à la vitesse d'origine
+(speed=1), N fois plus vite (speed=N) ou au plus vite (speed=None).
+"""
+from threading import Lock
+from time import monotonic, sleep, time_ns
+from typing import Callable, Iterator, Optional, Tuple
+import gzip
+
+from kolaBitMEXBot.kola.utils.datefunc import now
+
+
+class FrameRecorder:
+    """Écrit les messages reçus dans un fichier de capture."""
+
+    def __init__(self, path: str, flushEvery: int = 1000):
+        """
+        Open path in append mode.
+
+        - path: peut contenir {date}, remplacé par la date d'ouverture,
+        - flushEvery: nb de messages entre deux flush du fichier.
+        """
+        self.path = path.format(date=now().strftime("%Y%m%d-%H%M%S"))
+        self.flushEvery = flushEvery
+        self.count = 0
+        self._lock = Lock()
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+
+    def __repr__(self):
+        return f"FrameRecorder(path={self.path}, count={self.count})"
+
+    def write(self, frame):
+        """Append the raw frame, str or bytes, with its reception time."""
+        if isinstance(frame, (bytes, bytearray)):
+            frame = frame.decode("utf-8")
+        line = f"{time_ns()}\t{frame}\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self.count += 1
+            if not self.count % self.flushEvery:
+                self._file.flush()
+
+    def close(self):
+        """Flush and close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_frames(path: str) -> Iterator[Tuple[int, str]]:
+    """Yield the (reception time in ns, raw frame) of the capture file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            stamp, _, frame = line.rstrip("\n").partition("\t")
+            yield int(stamp), frame
+
+
+def replay(
+    path: str,
+    handler: Callable,
+    speed: Optional[float] = 1,
+    stop: Optional[Callable[[], bool]] = None,
+) -> int:
+    """
+    Feed the frames of the capture file to handler, return their number.
+
+    - handler: eg. BitMEXWebsocket.handle_message,
+    - speed: 1 vitesse d'origine, N N fois plus vite, None au plus vite,
+    - stop: fonction appelée avant chaque message, le rejeu s'arrête si elle
+    renvoie True.
+    """
+    count = 0
+    start = t0 = None
+    for stamp, frame in read_frames(path):
+        if stop is not None and stop():
+            break
+        if speed:
+            if t0 is None:
+                start, t0 = monotonic(), stamp
+            delay = (stamp - t0) / 1e9 / speed - (monotonic() - start)
+            if delay > 0:
+                sleep(delay)
+        handler(frame)
+        count += 1
+    return count
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
-from time import sleep
+from random import uniform
+from time import sleep, time_ns
 from urllib.parse import urlparse
 import decimal
 import json
@@ -11,10 +12,37 @@ from websocket import create_connection
 from pandas import DataFrame
 
 from kolaBitMEXBot.kola.connexion.auth import generate_nonce, generate_signature
+from kolaBitMEXBot.kola.connexion.wstables import (
+    IndexedTable,
+    OrderBookL2,
+    SymbolRings,
+    TableSnapshot,
+    new_table,
+    find_item,
+)
+from kolaBitMEXBot.kola.connexion.jsondecode import get_decoder
+from kolaBitMEXBot.kola.connexion.wsevents import TableEvents
+from kolaBitMEXBot.kola.connexion.capture import FrameRecorder
+from kolaBitMEXBot.kola.connexion.wsmetrics import WSMetrics
 from kolaBitMEXBot.kola.utils.logfunc import get_logger
 from kolaBitMEXBot.kola.utils.general import round_half_up, trim_dic
-from kolaBitMEXBot.kola.settings import SYMBOL, ORDERID_PREFIX, TEST_URL
-import kolaBitMEXBot.kola.utils.exceptions as ke
+from kolaBitMEXBot.kola.utils.constantes import (
+    RING_SCHEMAS,
+    SETTLEMENTPRICES,
+    BOOK_TABLES,
+)
+from kolaBitMEXBot.kola.settings import (
+    SYMBOL,
+    ORDERID_PREFIX,
+    TEST_URL,
+    RING_CAPACITY,
+    JSON_DECODER,
+    INSTRUMENTS_ALLOWLIST,
+    WS_CAPTURE,
+    WS_ORDERBOOK,
+    WS_BACKOFF,
+    WS_METRICS,
+)
 
 # Connects to BitMEX websocket for streaming realtime data or dummy data
 # The Marketmaker still interacts with this as if it were a REST Endpoint, but now it can get
@@ -25,25 +53,56 @@ import kolaBitMEXBot.kola.utils.exceptions as ke
 # Right after, the MM can start using its data. It will be updated in realtime, so the MM can
 # poll as often as it wants.
 
+# tables dont on attend les partials
+SYMBOL_TABLES = ("instrument", "trade", "quote")
+ACCOUNT_TABLES = ("margin", "position", "order")
+
 
 class BitMEXWebsocket:
 
     # Don't grow a table larger than this amount. Helps cap memory usage.
     MAX_TABLE_LEN = 1000
 
-    def __init__(self, apiKey, apiSecret, logger=None, symbol=None):
+    def __init__(
+        self, apiKey, apiSecret, logger=None, symbol=None, ringCapacity=None
+    ):
+        """
+        Init the websocket.
+
+        - ringCapacity: {table: nb de lignes} pour les tables en ring buffer
+        (trade, quote, execution), complète settings.RING_CAPACITY
+        """
+        self.ringCapacity = {**RING_CAPACITY, **(ringCapacity or {})}
+        # le décodeur json est choisi à la connexion
+        self.decoderName, self.decode = "json", json.loads
+        # publie les changements des tables, gardé entre les reconnexions
+        self.events = TableEvents()
+        self.recorder = None  # FrameRecorder des messages bruts, cf. start_capture
+        self.ws = None
+        # vrai entre une déconnexion et la resynchronisation des tables
+        self.stale = False
+        self.supervisor = None  # le thread qui reconnecte, cf. __supervise
+        self.dropped = threading.Event()
+        # dernières copies des tables, cf. table_snapshot
+        self.snapshots = {}
+        # débits et délais des messages par (table, action), cf. metrics.stats
+        self.metrics = WSMetrics() if WS_METRICS else None
         self.__reset()
         self.apiKey = apiKey
         self.apiSecret = apiSecret
         self.logger = get_logger(logger, name=__name__, sLL="INFO")
-        self.retries = 1
+        self.retries = 0  # tentatives de reconnexion depuis la dernière resync
         # not goog practice as it will be only for one symbol can't do ...arbitrage
         self.wsURL = None  # will contain the wsURL after first connection
         self.symbol = symbol
+        self.symbols = [symbol] if symbol else []
+        self.instruments = get_instrument_symbols(symbol)
+        self.orderBook = None  # la table du carnet d'ordres souscrite
+        self.subscriptions = []
         self.logger.debug(f"Init {self}")
 
     def __repr__(self):
-        return f"symbol={self.symbol} BitMexWebSocket Object (wsURL={self.wsURL}) with apiKey={self.apiKey}, logger={self.logger}"
+        return f"symbols={self.symbols} BitMexWebSocket Object (wsURL={self.wsURL}) with apiKey={self.apiKey}, logger={self.logger}"
 
     def __del__(self):
         self.exit()
@@ -53,52 +112,147 @@ class BitMEXWebsocket:
         self.subscriptions = self.__subscribe(symbol, shouldAuth)
         self.logger.info(f"Creating a connexion")
         self.wsURL = get_wsURL(self.subscriptions, endpoint)
-        self.ws = create_connection(self.wsURL, header=self.__get_auth())
+        self.ws = create_connection(self.wsURL, header=self.get_auth_headers())
         self.logger.info(self.ws.recv())
         return self.ws
 
-    def connect(self, endpoint="", symbol=SYMBOL, shouldAuth=True):
-        """Connect to the websocket and initialize data stores."""
+    def connect(
+        self,
+        endpoint="",
+        symbol=SYMBOL,
+        shouldAuth=True,
+        decoder=JSON_DECODER,
+        instruments=INSTRUMENTS_ALLOWLIST,
+        symbols=None,
+        capture=WS_CAPTURE,
+        orderBook=WS_ORDERBOOK,
+    ):
+        """
+        Connect to the websocket and initialize data stores.
+
+        - decoder: json decoder for the messages, see jsondecode.get_decoder
+        - instruments: instruments to follow besides symbol and its index
+        - symbols: other symbols to multiplex on this connexion, see add_symbols
+        - capture: path of a file where to record the raw messages, see
+        start_capture
+        - orderBook: the order book table to follow for each symbol, see
+        market_depth
+        """
+        self.wsURL = self.prepare(
+            endpoint,
+            symbol,
+            shouldAuth,
+            decoder,
+            instruments,
+            symbols,
+            capture,
+            orderBook,
+        )
+        self.__connect(self.wsURL)
+
+        # Connected. Wait for partials
+        for _symbol in self.symbols:
+            self.__wait_for_symbol(_symbol)
+        if self.shouldAuth:
+            self.__wait_for_account()
+
+    def prepare(
+        self,
+        endpoint="",
+        symbol=SYMBOL,
+        shouldAuth=True,
+        decoder=JSON_DECODER,
+        instruments=INSTRUMENTS_ALLOWLIST,
+        symbols=None,
+        capture=None,
+        orderBook=None,
+    ):
+        """Set the connexion parameters and return the wsURL, see connect."""
+        if capture:
+            self.start_capture(capture)
 
         self.symbol = symbol
+        self.symbols = unique([symbol] + list(symbols or []))
         self.shouldAuth = shouldAuth
+        self.endpoint = endpoint
+        self.orderBook = orderBook
+        self.decoderName, self.decode = get_decoder(decoder)
+        self.logger.info(f"Decoding ws messages with {self.decoderName}")
 
         # We can subscribe right in the connection querystring, so let's build that.
         # Subscribe to all pertinent endpoints
-        subscriptions = [f"{sub}:{symbol}" for sub in ["quote", "trade"]]
-        subscriptions += ["instrument"]  # We want all of them
+        # only the instruments we need, not all of them
+        self.instruments = unique(
+            [i for s in self.symbols for i in get_instrument_symbols(s, instruments)]
+        )
+        self.subscriptions = get_subscriptions(
+            self.symbols, self.instruments, self.shouldAuth, self.orderBook
+        )
         if self.shouldAuth:
-            subscriptions += [f"{sub}:{symbol}" for sub in ["order", "execution"]]
-            subscriptions += ["margin", "position"]
-
-        # Get WS URL and connect.  Serais mieux de faire avec request
-        urlParts = list(urlparse(endpoint))
-        urlParts[0] = urlParts[0].replace("http", "ws")
-        urlParts[2] = "/realtime?subscribe=" + ",".join(subscriptions)
-        #        wsURL = urlparse(urlParts)
-        wsURL = "{0}://{1}{2}".format(*urlParts)
-        self.__connect(wsURL)
-        self.wsURL = wsURL
+            self.subscriptions += ["margin", "position"]
 
-        # Connected. Wait for partials
-        self.__wait_for_symbol(symbol)
-        if self.shouldAuth:
-            self.__wait_for_account()
+        return get_wsURL(self.subscriptions, endpoint)
+
+    def add_symbols(self, symbols):
+        """
+        Subscribe to the tables of symbols on the open connexion.
+
+        Les données des symbols sont multiplexées sur cette connexion, chaque
+        client lit les siennes en passant son symbol (cf. table_view).
+        Block until the partials of the new symbols are received.
+        """
+        newSymbols, subscriptions = self.prepare_symbols(symbols)
+        if newSymbols:
+            self.send_command("subscribe", subscriptions)
+
+        for symbol in newSymbols:
+            self.__wait_for_symbol(symbol)
+
+        return newSymbols
+
+    def prepare_symbols(self, symbols):
+        """Add the new symbols, return them with their subscriptions."""
+        newSymbols = [s for s in unique(symbols) if s not in self.symbols]
+        if not newSymbols:
+            return [], []
+
+        instruments = [
+            i
+            for s in newSymbols
+            for i in get_instrument_symbols(s)
+            if i not in self.instruments
+        ]
+        subscriptions = get_subscriptions(
+            newSymbols, instruments, self.shouldAuth, self.orderBook
+        )
+        self.logger.info(f"Adding {newSymbols} to the ws: {subscriptions}")
+
+        self.symbols += newSymbols
+        self.instruments += instruments
+        self.subscriptions += subscriptions
+        # pour que les reconnexions souscrivent aussi aux nouveaux symbols
+        self.wsURL = get_wsURL(self.subscriptions, self.endpoint)
+
+        return newSymbols, subscriptions
 
     #
     # Data methods
     #
     def get_instrument(self, symbol=SYMBOL):
-        instruments = self.data["instrument"]
-        matchingInstruments = [i for i in instruments if i["symbol"] == symbol]
-        if len(matchingInstruments) == 0:
-            raise Exception("Unable to find instrument or index with symbol: " + symbol)
-        instrument = matchingInstruments[0]
-        # Turn the 'tickSize' into 'tickLog' for use in rounding
-        # http://stackoverflow.com/a/6190291/832202
-        instrument["tickLog"] = (
-            decimal.Decimal(str(instrument["tickSize"])).as_tuple().exponent * -1
-        )
+        """
+        Return the instrument record of symbol.
+
+        The table is indexed on symbol and the record is updated in place by
+        the messages, tickLog is set when the record is received.
+        """
+        instrument = find_item(self.data["instrument"], ["symbol"], {"symbol": symbol})
+        if not instrument:
+            raise Exception(
+                f"Unable to find instrument or index with symbol: {symbol}."
+                f" Is it in the followed instruments {self.instruments}?"
+            )
+        if "tickLog" not in instrument:
+            set_tickLog(instrument)
         return instrument
 
     def get_instrument2(self, symbol=SYMBOL) -> DataFrame:
@@ -115,9 +269,7 @@ class BitMEXWebsocket:
         ), "Check {symbol} in {ins.loc[ins.state == 'Open'].symbol}"
         # converting the DataFrame to the Serie
         instrument = instrument.iloc[0]
-        instrument["tickLog"] = (
-            decimal.Decimal(str(instrument["tickSize"])).as_tuple().exponent * -1
-        )
+        instrument["tickLog"] = get_tickLog(instrument["tickSize"])
         return instrument
 
     def get_ticker(self, symbol=SYMBOL):
@@ -151,32 +303,66 @@ class BitMEXWebsocket:
     def funds(self):
         return self.data["margin"][0]
 
-    def market_depth(self, symbol=SYMBOL):
-        raise NotImplementedError(
-            "orderBook is not subscribed; use askPrice and bidPrice on instrument"
-        )
-        # return self.data['orderBook25'][0]
+    def margin(self, currency="XBt"):
+        """
+        Return the margin row of currency or None if not received.
+
+        La ligne est tenue à jour par les updates de la table margin
+        (availableMargin, walletBalance, marginBalance...).
+        """
+        for row in self.data.get("margin", []):
+            if row.get("currency") == currency:
+                return row
+        return None
+
+    def market_depth(self, symbol=None):
+        """
+        Return the OrderBook of symbol (def. self.symbol).
+
+        Le carnet est trié par prix: best_bid, best_ask, levels et
+        impact_price pour le prix d'exécution d'une quantité.
+        """
+        symbol = self.symbol if symbol is None else symbol
+        store = self.data.get(self.orderBook)
+        book = store.book(symbol) if isinstance(store, OrderBookL2) else None
+        if book is None:
+            raise Exception(
+                f"No order book for {symbol}, orderBook={self.orderBook}"
+                " (see settings.WS_ORDERBOOK)."
+            )
+        return book
 
-    def open_orders(self, clOrdIDPrefix=ORDERID_PREFIX):
+    def open_orders(self, clOrdIDPrefix=ORDERID_PREFIX, symbol=None):
+        """Return my open orders, only those of symbol if given."""
         orders = self.data["order"]
         # Filter to only open orders (leavesQty > 0) and those that we actually placed
         return [
             o
             for o in orders
-            if str(o["clOrdID"]).startswith(clOrdIDPrefix) and o["leavesQty"] > 0
+            if str(o["clOrdID"]).startswith(clOrdIDPrefix)
+            and o["leavesQty"] > 0
+            and (symbol is None or o["symbol"] == symbol)
         ]
 
-    def exec_orders(self, clOrdIDPrefix=ORDERID_PREFIX):
+    def exec_orders(self, clOrdIDPrefix=ORDERID_PREFIX, symbol=None):
         """
         Renvois tous mes ordres qui sont dans la table.
         
         Renvois True si l'ordre a été exécuté.
         see https://www.onixs.biz/fix-dictionary/5.0.SP2/msgType_D_68.html
         for order explanation
+        - symbol: si donné seulement les ordres de ce symbol
         """
         orders = self.data["execution"]
+        if symbol is not None and isinstance(orders, SymbolRings):
+            orders = orders.rows(symbol=symbol)
         # Filter to only open orders (leavesQty > 0) and those that we actually placed
-        return [o for o in orders if str(o["clOrdID"]).startswith(clOrdIDPrefix)]
+        return [
+            o
+            for o in orders
+            if str(o["clOrdID"]).startswith(clOrdIDPrefix)
+            and (symbol is None or o["symbol"] == symbol)
+        ]
 
     def position(self, symbol_=None, full=False):
         """Get the position for symbol."""
@@ -211,8 +397,51 @@ class BitMEXWebsocket:
                 "symbol": _symbol,
             }
 
-    def recent_trades(self):
-        return self.data["trade"]
+    def recent_trades(self, symbol=None):
+        """Return the trades of symbol (def. self.symbol)."""
+        trades = self.data["trade"]
+        if isinstance(trades, SymbolRings):
+            return trades.rows(symbol=self.symbol if symbol is None else symbol)
+        return trades
+
+    def table_view(self, table, n=None, symbol=None, copy=False):
+        """
+        Return read only numpy views (no copy) of the n last rows of table.
+
+        Seulement pour les tables en ring buffer (trade, quote, execution),
+        les lignes de symbol (def. self.symbol), renvoie None sinon.
+        Les vues sont réécrites par les inserts du ws: une fenêtre de tout le
+        ring n'est plus triée et ses colonnes peuvent venir de lignes
+        différentes.  Avec copy, une copie cohérente (cf. RingTable.snapshot).
+        """
+        store = self.data.get(table)
+        if isinstance(store, SymbolRings):
+            symbol = self.symbol if symbol is None else symbol
+            return store.snapshot(n, symbol) if copy else store.view(n, symbol)
+        return None
+
+    def table_snapshot(self, table, symbol=None) -> TableSnapshot:
+        """
+        Return the (version, frame) copy of table, rebuilt only if it changed.
+
+        Pour les tables en ring buffer seulement les lignes de symbol (def.
+        self.symbol).  La frame est partagée entre les lecteurs et ne doit pas
+        être modifiée.  Sa version est celle de self.events, lue avant la
+        copie: la copie est au moins aussi récente.
+        """
+        symbol = self.symbol if symbol is None else symbol
+        version = self.events.version(table)[0]
+        snapshot = self.snapshots.get((table, symbol))
+        if snapshot is None or snapshot.version != version:
+            store = self.data.get(table, [])
+            if isinstance(store, SymbolRings):
+                frame = store.frame(symbol=symbol)
+            else:
+                # des copies des lignes, le ws les met à jour en place
+                frame = DataFrame([dict(row) for row in store])
+            snapshot = TableSnapshot(version, frame)
+            self.snapshots[(table, symbol)] = snapshot
+        return snapshot
 
     #
     # Lifecycle methods
@@ -223,54 +452,128 @@ class BitMEXWebsocket:
 
     def exit(self):
         self.exited = True
-        self.ws.close()
+        self.dropped.set()  # libère le superviseur
+        self.stop_capture()
+        if self.ws is not None:
+            self.ws.close()
+
+    def start_capture(self, path):
+        """
+        Record every raw message received into the capture file path.
+
+        path peut contenir {date}, cf. capture.FrameRecorder.  Les captures se
+        rejouent avec capture.replay(path, ws.handle_message, speed).
+        """
+        self.stop_capture()
+        self.recorder = FrameRecorder(path)
+        self.logger.info(f"Recording the ws messages to {self.recorder.path}")
+
+    def stop_capture(self):
+        """Stop recording the raw messages."""
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
 
     #
     # Private methods
     #
     def __connect(self, wsURL):
         """Connect to the websocket in a thread."""
+        if not self.__open(wsURL):
+            self.logger.warning(
+                "Ending the connexion because not connected"
+                f" or self._error={self._error}"
+            )
+            self.exit()
+            sys.exit(1)
+
+    def __open(self, wsURL, fresh=None):
+        """
+        Open a connexion in a thread, return True once connected (5s max).
+
+        - fresh: les tables où ranger les messages de la connexion tant que
+        tous les partials ne sont pas arrivés, cf. handle_message.
+        """
         ssl_defaults = ssl.get_default_verify_paths()
         sslopt_ca_certs = {"ca_certs": ssl_defaults.cafile}
-        self.ws = websocket.WebSocketApp(
+        done = threading.Event()  # ouverte ou déjà fermée
+        opened = threading.Event()
+
+        def on_open(*args):
+            opened.set()
+            done.set()
+
+        def on_close(*args):
+            done.set()
+            self.__on_close(ws)
+
+        # websocket-client >= 0.58 passe aussi le WebSocketApp aux callbacks
+        ws = websocket.WebSocketApp(
             wsURL,
-            on_message=self.__on_message,
-            on_close=self.__on_close,
-            on_error=self.__on_error,
-            header=self.__get_auth(),
+            on_open=on_open,
+            on_message=lambda *args: self.__on_message(args[-1], fresh),
+            on_close=on_close,
+            on_error=lambda *args: self.__on_error(ws, args[-1]),
+            header=self.get_auth_headers(),
         )
+        self.ws = ws
 
         self.wst = threading.Thread(
-            target=lambda: self.ws.run_forever(sslopt=sslopt_ca_certs)
+            target=lambda: ws.run_forever(sslopt=sslopt_ca_certs)
         )
         self.wst.daemon = True
         self.wst.start()
 
-        # Wait for connect before continuing
-        conn_timeout = 5
-        while (
-            (not self.ws.sock or not self.ws.sock.connected)
-            and conn_timeout
-            and not self._error
-        ):
-            sleep(1)
-            conn_timeout -= 1
-
-        if not conn_timeout or self._error:
+        # Wait for connect before continuing, une connexion ouverte puis
+        # aussitôt fermée est reprise par le superviseur (cf. __on_close)
+        done.wait(5)
+        return opened.is_set() and not self._error
+
+    def __drop(self):
+        """Mark the data as stale and let the supervisor reconnect."""
+        self.stale = True
+        if self.supervisor is None:
+            self.supervisor = threading.Thread(
+                target=self.__supervise, name="wsSupervisor", daemon=True
+            )
+            self.supervisor.start()
+        self.dropped.set()
+
+    def __supervise(self):
+        """
+        Reconnect each time the connexion drops, in its own thread.
+
+        Le délai entre deux tentatives est plafonné (cf. get_backoff).  Les
+        messages de la nouvelle connexion sont rangés dans des tables
+        neuves qui remplacent les anciennes d'un coup, une fois tous les
+        partials reçus (cf. resync).  Jusque-là les tables restent lisibles
+        mais self.stale est vrai.
+        """
+        while True:
+            self.dropped.wait()
+            if self.exited:
+                return
+            self.dropped.clear()
+
+            # l'ancienne connexion ne doit plus déclencher de reconnexion
+            dropped, self.ws = self.ws, None
+            if dropped is not None:
+                dropped.close()
+
+            delay = get_backoff(self.retries)
+            self.retries += 1
             self.logger.warning(
-                f"Ending the connexion because not conn_timeout={not conn_timeout} or self._error={self._error}"
+                f"ws dropped, reconnecting in {delay:.1f}s (attempt {self.retries})"
             )
-            self.exit()
-            sys.exit(1)
+            sleep(delay)
+            if self.exited:
+                return
 
-    def __reconnect(self):
-        self.logger.warning(f"Reconnecting...")
-        self.__connect(self.wsURL)
-        self.__wait_for_symbol(self.symbol)
-        if self.shouldAuth:
-            self.__wait_for_account()
+            if not self.__open(self.wsURL, new_tables()):
+                self.logger.error(f"Reconnexion to {self.wsURL} failed")
+                self.dropped.set()
 
-    def __get_auth(self):
+    def get_auth_headers(self):
         """Return auth headers. Will use API Keys if present in settings."""
         if self.shouldAuth is False:
             return []
@@ -288,22 +591,82 @@ class BitMEXWebsocket:
     def __wait_for_account(self):
         """On subscribe, this data will come down. Wait for it."""
         # Wait for the keys to show up from the ws
-        while not {"margin", "position", "order"} <= set(self.data):
-            self.logger.debug(f"len data = {len(set(self.data))}")
-            sleep(0.1)
+        self.events.wait_for(self.account_ready, ACCOUNT_TABLES)
+        self.logger.debug(f"len data = {len(set(self.data))}")
 
     def __wait_for_symbol(self, symbol=SYMBOL):
         """On subscribe, this data will come down. Wait for it."""
-        while not {"instrument", "trade", "quote"} <= set(self.data):
-            sleep(0.1)
+        self.events.wait_for(lambda: self.symbol_ready(symbol), self.symbol_tables())
+
+    def account_ready(self, tables=None):
+        """Tell if the partials of the account tables have been received."""
+        return all(self.has_partial(table, tables=tables) for table in ACCOUNT_TABLES)
+
+    def symbol_ready(self, symbol=SYMBOL, tables=None):
+        """
+        Tell if the partials for symbol have been received.
+
+        - tables: (data, keys, partials) à vérifier, def. les tables courantes
+        """
+        data = self.data if tables is None else tables[0]
+        # one instrument partial per followed symbol, wait for ours
+        return any(i["symbol"] == symbol for i in data.get("instrument", [])) and all(
+            self.has_partial(table, symbol, tables)
+            for table in self.symbol_tables()[1:]
+        )
+
+    def symbol_tables(self):
+        """Return the tables whose partials are waited for each symbol."""
+        return SYMBOL_TABLES + ((self.orderBook,) if self.orderBook else ())
+
+    def has_partial(self, table, symbol=None, tables=None):
+        """Tell if the partial of table (for symbol) has been received."""
+        partials = self.partials if tables is None else tables[2]
+        return (table, symbol) in partials or (table, None) in partials
+
+    def resync(self, fresh):
+        """
+        Swap in the fresh tables if they got all their partials.
+
+        Les tables sont remplacées d'un coup, un lecteur voit les anciennes
+        ou les nouvelles, et tous les consommateurs sont réveillés.
+        Return True if swapped.
+        """
+        ready = all(self.symbol_ready(s, fresh) for s in self.symbols) and (
+            not self.shouldAuth or self.account_ready(fresh)
+        )
+        if not ready:
+            return False
+
+        self.keys, self.partials = fresh[1], fresh[2]
+        self.data = fresh[0]
+        self.stale = False
+        self.retries = 0
+        self.logger.info(f"ws resynced: {list(self.data)}")
 
-    def __send_command(self, command, args):
+        for table, store in list(self.data.items()):
+            self.events.notify(table, list(store))
+        return True
+
+    def send_command(self, command, args):
         """Send a raw command."""
         self.ws.send(json.dumps({"op": command, "args": args or []}))
 
-    def __on_message(self, message):
+    def __on_message(self, message, fresh=None):
         """Handler for parsing WS messages."""
-        message = json.loads(message)
+        self.handle_message(message, fresh)
+
+    def handle_message(self, message, fresh=None):
+        """
+        Parse a WS message and update the tables, whatever the transport.
+
+        - fresh: (data, keys, partials) neuves d'une reconnexion, mises à jour
+        à la place des tables courantes jusqu'à leur resync.
+        """
+        received = time_ns()
+        if self.recorder is not None:
+            self.recorder.write(message)
+        message = self.decode(message)
         # self.logger.debug(json.dumps(message))  # interesting but dict too much
         # table = message["table"] if "table" in message else None
         # action = message["action"] if "action" in message else None
@@ -311,6 +674,11 @@ class BitMEXWebsocket:
         # je ne comprends pas la dif avec.. il n'y en a pas
         table = message.get("table", None)
         action = message.get("action", None)
+        staging = fresh is not None and fresh[0] is not self.data
+        if staging:
+            data, keys, partials = fresh
+        else:
+            data, keys, partials = self.data, self.keys, self.partials
         try:
             if "subscribe" in message:
                 if ~message["success"]:
@@ -330,11 +698,11 @@ class BitMEXWebsocket:
 
             elif action:
 
-                if table not in self.data:
-                    self.data[table] = []
+                if table not in data:
+                    data[table] = []
 
-                if table not in self.keys:
-                    self.keys[table] = []
+                if table not in keys:
+                    keys[table] = []
 
                 # There are four possible actions from the WS:
                 # 'partial' - full table image
@@ -343,22 +711,44 @@ class BitMEXWebsocket:
                 # 'delete'  - delete row
                 if action == "partial":
                     self.logger.debug(f"{table}: partial")
-                    self.data[table] += message["data"]
                     # typesK = list(message.get('types', {}).keys())
                     # filterD = message.get('filter', None)
                     # self.logger.debug(f"{table}: partial, typeK={typeK},
                     # ... filterD={filterD}")
-                    # self.data[table] += message['data']
 
                     # Keys are communicated on partials to let you know how
                     # to uniquely identify
-                    # an item. We use it for updates.
-                    self.keys[table] = message["keys"]
+                    # an item. We use it to index the table for updates.
+                    keys[table] = message["keys"]
+                    if table == "instrument":
+                        for instrument in message["data"]:
+                            set_tickLog(instrument)
+
+                    # il y a un partial par symbol souscrit (et par reconnexion)
+                    symbol = (message.get("filter") or {}).get("symbol")
+                    store = data[table]
+                    if isinstance(store, (SymbolRings, OrderBookL2)):
+                        store.replace(message["data"], symbol)
+                    elif isinstance(store, IndexedTable):
+                        store.insert(message["data"])
+                    else:
+                        data[table] = new_table(
+                            keys[table],
+                            store + message["data"],
+                            schema=RING_SCHEMAS.get(table),
+                            capacity=self.ringCapacity.get(table),
+                            book=table in BOOK_TABLES,
+                        )
+                    partials.add((table, symbol))
 
                 elif action == "insert":
 
                     mdata = message["data"]
 
+                    if table == "instrument":
+                        for instrument in mdata:
+                            set_tickLog(instrument)
+
                     if table == "execution":
                         _stars = "*"
                         self.logger.debug(
@@ -366,18 +756,25 @@ class BitMEXWebsocket:
                             f" {[trim_dic(d, trimid=12) for d in mdata]}"
                         )
 
-                    self.data[table] += mdata
+                    # les SymbolRings sont bornées et ne sont jamais trimmées
+                    if isinstance(data[table], list):
+                        data[table] += mdata
+                    else:
+                        data[table].insert(mdata)
 
                     # Limit the max length of the table to avoid excessive
                     # memory usage.
                     # Don't trim orders because we'll lose valuable state if we do.
                     if (
                         table not in ["order", "orderBookL2"]
-                        and len(self.data[table]) > BitMEXWebsocket.MAX_TABLE_LEN
+                        and len(data[table]) > BitMEXWebsocket.MAX_TABLE_LEN
                     ):
-                        self.data[table] = self.data[table][
-                            (BitMEXWebsocket.MAX_TABLE_LEN // 2) :
-                        ]
+                        if isinstance(data[table], list):
+                            data[table] = data[table][
+                                (BitMEXWebsocket.MAX_TABLE_LEN // 2) :
+                            ]
+                        else:
+                            data[table].trim(BitMEXWebsocket.MAX_TABLE_LEN)
 
                 elif action == "update":
 
@@ -388,10 +785,16 @@ class BitMEXWebsocket:
                     # if len(message['data']):
                     #     self.logger.debug(f'{table}: updating {message["data"]}')
 
+                    updates = message["data"]
+                    if isinstance(data[table], OrderBookL2):
+                        # the book sorts its levels itself
+                        data[table].update(updates)
+                        updates = []
+
                     # Locate the item in the collection and update it.
-                    for updateData in message["data"]:
-                        item = findItemByKeys(
-                            self.keys[table], self.data[table], updateData
+                    for updateData in updates:
+                        item = find_item(
+                            data[table], keys[table], updateData
                         )
                         if not item:
 
@@ -420,61 +823,126 @@ class BitMEXWebsocket:
 
                         # Update this item.
                         item.update(updateData)
+                        if table == "instrument" and "tickSize" in updateData:
+                            set_tickLog(item)
 
                         # Remove canceled / filled orders
                         if table == "order" and item["leavesQty"] <= 0:
-                            self.data[table].remove(item)
+                            data[table].remove(item)
 
                 elif action == "delete":
                     self.logger.debug("%s: deleting %s" % (table, message["data"]))
+                    deletes = message["data"]
+                    if isinstance(data[table], OrderBookL2):
+                        data[table].delete(deletes)
+                        deletes = []
+
                     # Locate the item in the collection and remove it.
-                    for deleteData in message["data"]:
-                        item = findItemByKeys(
-                            self.keys[table], self.data[table], deleteData
+                    for deleteData in deletes:
+                        item = find_item(
+                            data[table], keys[table], deleteData
                         )
-                        self.data[table].remove(item)
+                        data[table].remove(item)
                 else:
                     raise Exception("Unknown action: %s" % action)
         except Exception:
             pass
 
+        if staging:
+            # les consommateurs lisent encore les anciennes tables
+            self.resync(fresh)
+        elif action:
+            # wake up the consumers waiting for this table
+            self.events.notify(table, message.get("data", []))
+
+        if action and self.metrics is not None:
+            self.metrics.record(
+                table, action, message.get("data") or [], received, time_ns()
+            )
+
     def __on_open(self):
         self.logger.debug("Websocket Opened.")
 
-    def __on_close(self):
+    def __on_close(self, ws):
+        if self.exited or ws is not self.ws:
+            return
         self.logger.info("ws is closed!")
-        self.exit()
+        self.__drop()
 
-    def __on_error(self, error):
-        self.logger.error(f"WS Error, retries={self.retries}: error='{error}'. Pause")
-        sleep(60 * self.retries)
-        self.retries *= 2
-        # faire un système de gestion des erreur low level
-        if error == "Connection is already closed":
-            self.logger.error(f'error="{error}", reconnecting...')
-            self.__reconnect()
-        elif not self.exited:
-            self.error(error)
-            raise ke.wsException(error)
+    def __on_error(self, ws, error):
+        if self.exited or ws is not self.ws:
+            return
+        self.logger.error(f"WS Error, retries={self.retries}: error='{error}'")
+        self.__drop()
 
     def __reset(self):
         self.data = {}
         self.keys = {}
+        self.partials = set()  # (table, symbol) des partials reçus
         self.exited = False
         self._error = None
 
 
-def findItemByKeys(keys, table, matchData):
-    """parcours les items de la table.
-Pour chaque item vérifie que tous les éléments clefs sont les même que ceux de match Data.
-Sinon, si l'un des éléments clefs est !=, ne renvois pas l'item"""
-    for item in table:
-        matched = True
-        for key in keys:
-            if item[key] != matchData[key]:
-                matched = False
-        if matched:
-            return item
+def get_tickLog(tickSize):
+    """
+    Turn the 'tickSize' into 'tickLog' for use in rounding.
+
+    http://stackoverflow.com/a/6190291/832202
+    """
+    return decimal.Decimal(str(tickSize)).as_tuple().exponent * -1
+
+
+def set_tickLog(instrument):
+    """Set the tickLog of the instrument record."""
+    if "tickSize" in instrument:
+        instrument["tickLog"] = get_tickLog(instrument["tickSize"])
+
+
+def get_instrument_symbols(symbol, allowlist=None):
+    """
+    Return the instrument symbols to subscribe to.
+
+    symbol, its settlement index then the allowlist, without duplicates.
+    """
+    symbols = [symbol, SETTLEMENTPRICES.get(symbol)] + list(allowlist or [])
+    return [s for i, s in enumerate(symbols) if s and s not in symbols[:i]]
+
+
+def get_subscriptions(symbols, instruments, shouldAuth=True, orderBook=None):
+    """
+    Return the topics to subscribe to for symbols and instruments.
+
+    - orderBook: la table du carnet d'ordres à suivre pour chaque symbol
+    """
+    subs = ["quote", "trade"] + ([orderBook] if orderBook else [])
+    subscriptions = [f"{sub}:{s}" for s in symbols for sub in subs]
+    subscriptions += [f"instrument:{i}" for i in instruments]
+    if shouldAuth:
+        subscriptions += [
+            f"{sub}:{s}" for s in symbols for sub in ["order", "execution"]
+        ]
+    return subscriptions
+
+
+def new_tables():
+    """Return empty (data, keys, partials) tables."""
+    return {}, {}, set()
+
+
+def get_backoff(attempt, base=WS_BACKOFF[0], cap=WS_BACKOFF[1]):
+    """
+    Return the delay (s) before the reconnexion attempt.
+
+    Le délai double à chaque tentative jusqu'à cap, la moitié est tirée au
+    hasard pour que les clients ne se reconnectent pas tous ensemble.
+    """
+    delay = min(cap, base * 2 ** min(attempt, 32))
+    return delay / 2 + uniform(0, delay / 2)
+
+
+def unique(elements):
+    """Return elements without duplicates, in order."""
+    return list(dict.fromkeys(elements))
 
 
 def get_wsURL(subscriptions, endpoint=TEST_URL):
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Métriques des requêtes REST, par endpoint (verbe, path).
+
+Pour chaque endpoint: le nombre de requêtes, d'erreurs et de retries, les
+octets envoyés et reçus, la durée des requêtes (attente d'une connexion du
+pool comprise) et l'attente du seau de jetons avant l'envoi, en
+histogrammes (cf. StreamHistogram).  Le nombre de requêtes en vol et son
+pic disent si le pool est à la taille des threads qui l'utilisent: un pic à
+la taille du pool et des durées qui montent, on attend des connexions; des
+durées hautes sous la taille du pool, c'est la bourse qui est lente.
+"""
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+from pandas import DataFrame
+from requests.adapters import HTTPAdapter
+
+from kolaBitMEXBot.kola.connexion.wsmetrics import StreamHistogram
+
+
+class EndpointMetrics:
+    """Les compteurs et histogrammes d'un (verb, path)."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0  # timeouts, connexions perdues et status >= 400
+        self.retries = 0
+        self.sent = 0  # octets
+        self.received = 0
+        self.statuses: Dict[Optional[int], int] = {}
+        self.latency = StreamHistogram()  # durée de la requête, ms
+        self.rateWait = StreamHistogram()  # attente du seau de jetons, ms
+
+
+class HTTPMetrics:
+    """
+    Les métriques de toutes les requêtes d'un client BitMEX.
+
+    start et record encadrent chaque envoi, depuis n'importe quel thread.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.endpoints: Dict[Tuple[str, str], EndpointMetrics] = {}
+        self.inflight = 0
+        self.peak = 0  # pic des requêtes en vol
+
+    def __repr__(self):
+        return f"HTTPMetrics(endpoints={list(self.endpoints)}, peak={self.peak})"
+
+    def get(self, verb: str, path: str) -> EndpointMetrics:
+        """Return the metrics of the endpoint, lock held."""
+        metrics = self.endpoints.get((verb, path))
+        if metrics is None:
+            metrics = self.endpoints[(verb, path)] = EndpointMetrics()
+        return metrics
+
+    def start(self) -> float:
+        """Count a request in flight, return its start (monotonic, s)."""
+        with self._lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        return monotonic()
+
+    def record(
+        self,
+        verb: str,
+        path: str,
+        start: float,
+        status: Optional[int],
+        sent: int = 0,
+        received: int = 0,
+        rateWait: float = 0,
+    ):
+        """
+        Record the request sent at start, status None if it got no response.
+
+        - rateWait: attente du seau de jetons avant l'envoi, en s
+        """
+        duration = (monotonic() - start) * 1e3
+        with self._lock:
+            self.inflight -= 1
+            metrics = self.get(verb, path)
+            metrics.count += 1
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            if status is None or status >= 400:
+                metrics.errors += 1
+            metrics.sent += sent
+            metrics.received += received
+            metrics.latency.record(duration)
+            metrics.rateWait.record(rateWait * 1e3)
+
+    def retry(self, verb: str, path: str):
+        """Count a retry of the endpoint."""
+        with self._lock:
+            self.get(verb, path).retries += 1
+
+    def reset(self):
+        """Forget everything recorded so far, but the requests in flight."""
+        with self._lock:
+            self.endpoints = {}
+            self.peak = self.inflight
+
+    def stats(self) -> Dict[Tuple[str, str], Dict[str, Optional[float]]]:
+        """
+        Return the statistics of each (verb, path).
+
+        count, errors, retries, sent et received (octets), lat_p50, lat_p99,
+        lat_max, lat_mean (ms par requête), wait_p99 et wait_max (ms
+        d'attente du seau de jetons).
+        """
+        with self._lock:
+            items = list(self.endpoints.items())
+        return {
+            key: {
+                "count": m.count,
+                "errors": m.errors,
+                "retries": m.retries,
+                "sent": m.sent,
+                "received": m.received,
+                "lat_p50": m.latency.quantile(0.5),
+                "lat_p99": m.latency.quantile(0.99),
+                "lat_max": m.latency.maximum(),
+                "lat_mean": m.latency.mean(),
+                "wait_p99": m.rateWait.quantile(0.99),
+                "wait_max": m.rateWait.maximum(),
+            }
+            for key, m in sorted(items)
+        }
+
+    def frame(self) -> DataFrame:
+        """Return the stats as a DataFrame indexed by (verb, path)."""
+        df = DataFrame.from_dict(self.stats(), orient="index")
+        if len(df):
+            df.index.names = ["verb", "path"]
+        return df
+
+
+def get_pool_adapter(size: int, block: bool = True) -> HTTPAdapter:
+    """
+    Return an adapter keeping up to size connexions alive per host.
+
+    Avec block, un thread attend qu'une connexion se libère plutôt que d'en
+    ouvrir une de plus, fermée aussitôt après (et un warning de urllib3).
+    """
+    return HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=block)
+
+
+def get_pool_stats(adapter: HTTPAdapter) -> Dict[str, int]:
+    """
+    Return the connexions of the adapter's pools.
+
+    size: connexions max par hôte, opened: connexions ouvertes depuis le
+    début, idle: connexions libres en ce moment, requests: requêtes servies.
+    """
+    pools = adapter.poolmanager.pools
+    stats = {"size": adapter._pool_maxsize, "opened": 0, "idle": 0, "requests": 0}
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["opened"] += pool.num_connections
+        stats["requests"] += pool.num_requests
+        # la file du pool contient les connexions libres et des None
+        stats["idle"] += sum(1 for c in list(pool.pool.queue) if c is not None)
+    return stats
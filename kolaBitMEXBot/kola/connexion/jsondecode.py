@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Décodeurs json pour les messages du websocket.
+
+orjson ou simdjson sont utilisés s'ils sont installés, sinon le json standard.
+"""
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+
+# par ordre de préférence
+DECODER_NAMES: List[str] = ["orjson", "simdjson", "json"]
+
+
+def _load_orjson() -> Callable[[Any], Any]:
+    return import_module("orjson").loads
+
+
+def _load_simdjson() -> Callable[[Any], Any]:
+    return import_module("simdjson").loads
+
+
+def _load_json() -> Callable[[Any], Any]:
+    return json.loads
+
+
+LOADERS: Dict[str, Callable[[], Callable[[Any], Any]]] = {
+    "orjson": _load_orjson,
+    "simdjson": _load_simdjson,
+    "json": _load_json,
+}
+
+
+def available_decoders() -> List[str]:
+    """Return the names of the decoders that can be imported here."""
+    names = []
+    for name in DECODER_NAMES:
+        try:
+            LOADERS[name]()
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+def get_decoder(name: Optional[str] = None) -> Tuple[str, Callable[[Any], Any]]:
+    """
+    Return (name, loads) for the decoder name.
+
+    Si name is None, renvoie le plus rapide des décodeurs installés.
+    Lève ImportError si le décodeur demandé n'est pas installé.
+    """
+    if name is not None:
+        assert name in LOADERS, f"name={name} should be one of {DECODER_NAMES}"
+        return name, LOADERS[name]()
+
+    for _name in DECODER_NAMES:
+        try:
+            return _name, LOADERS[_name]()
+        except ImportError:
+            pass
+
+    return "json", json.loads
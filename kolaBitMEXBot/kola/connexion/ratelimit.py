@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Limiteur de débit des requêtes REST, en seau de jetons.
+
+BitMEX accorde `X-Ratelimit-Limit` requêtes par minute et par clé, rendues au
+fil de l'eau.  Chaque requête prend un jeton, le seau se remplit de limit/60
+jetons par seconde: une requête part tout de suite s'il reste un jeton et
+n'attend que le temps d'en regagner un sinon.  Les en-têtes de chaque réponse
+(`X-Ratelimit-Remaining`, `X-Ratelimit-Reset`) recalent le seau sur le
+décompte du serveur, qui voit aussi les requêtes des autres process.
+Un seau est partagé par tous les clients d'une même clé, cf. get_bucket.
+"""
+from threading import Lock
+import asyncio
+from time import monotonic, sleep, time
+from typing import Dict, Mapping, Optional
+
+from kolaBitMEXBot.kola.settings import HTTP_RATE_LIMIT
+
+
+class TokenBucket:
+    """Un seau de capacity jetons, rempli de capacity jetons par period s."""
+
+    def __init__(
+        self, capacity: int = HTTP_RATE_LIMIT[0], period: float = HTTP_RATE_LIMIT[1]
+    ):
+        self.capacity = capacity
+        self.rate = capacity / period  # jetons par seconde
+        self.tokens = float(capacity)
+        self.stamp = monotonic()
+        self.blockedUntil = 0.0  # monotonic, après un 429
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f"TokenBucket(tokens={self.tokens:.1f}/{self.capacity})"
+
+    def _refill(self, t: float):
+        """Add the tokens earned since the last refill, lock held."""
+        self.tokens = min(self.capacity, self.tokens + (t - self.stamp) * self.rate)
+        self.stamp = t
+
+    def acquire(self, cost: float = 1) -> float:
+        """
+        Take cost tokens, waiting as long as needed, return the wait in s.
+
+        Le jeton est réservé sous le verrou (le seau peut devenir négatif),
+        l'attente se fait hors verrou: les threads suivants attendent d'autant.
+        """
+        wait = self._take(cost)
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+    async def acquire_async(self, cost: float = 1) -> float:
+        """Like acquire but awaits in the running event loop."""
+        wait = self._take(cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _take(self, cost: float) -> float:
+        """Reserve cost tokens, return how long to wait for them in s."""
+        with self._lock:
+            t = monotonic()
+            self._refill(t)
+            self.tokens -= cost
+            return max(self.blockedUntil - t, -self.tokens / self.rate, 0)
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Align the bucket on the X-Ratelimit-* headers of a response.
+
+        Le seau ne garde que le plus petit des deux décomptes: le nôtre
+        compte déjà les requêtes en vol que le serveur n'a pas encore vues.
+        """
+        remaining = headers.get("X-Ratelimit-Remaining")
+        if remaining is None:
+            return
+        limit = headers.get("X-Ratelimit-Limit")
+        with self._lock:
+            self._refill(monotonic())
+            if limit is not None and int(limit) != self.capacity:
+                self.rate *= int(limit) / self.capacity
+                self.capacity = int(limit)
+            self.tokens = min(self.tokens, float(remaining))
+
+    def block(self, reset: Optional[float] = None):
+        """
+        Empty the bucket until reset (s since epoch), eg. after a 429.
+
+        Sans reset, le seau est vidé et se remplit au débit normal.
+        """
+        with self._lock:
+            t = monotonic()
+            self._refill(t)
+            self.tokens = 0.0
+            if reset is not None:
+                self.blockedUntil = max(self.blockedUntil, t + reset - time())
+
+    def wait_time(self, cost: float = 1) -> float:
+        """Return how long a request of cost would wait now, in s."""
+        with self._lock:
+            t = monotonic()
+            self._refill(t)
+            return max(self.blockedUntil - t, (cost - self.tokens) / self.rate, 0)
+
+
+# un seau par clé d'API, partagé par les clients BitMEX de cette clé
+_buckets: Dict[str, TokenBucket] = {}
+_bucketsLock = Lock()
+
+
+def get_bucket(apiKey: str) -> TokenBucket:
+    """Return the bucket shared by the clients of apiKey."""
+    with _bucketsLock:
+        bucket = _buckets.get(apiKey)
+        if bucket is None:
+            bucket = _buckets[apiKey] = TokenBucket(*HTTP_RATE_LIMIT)
+        return bucket
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Relance des requêtes REST et disjoncteurs par endpoint.
+
+Une requête en échec passager (timeout, connexion perdue, 429, 502, 503)
+est relancée après une pause exponentielle plafonnée et tirée au hasard
+(cf. RetryPolicy.pause), tant qu'il reste des retries et que sa deadline
+n'est pas passée.  Chaque endpoint (verbe, path) a un disjoncteur: après
+threshold échecs de suite où il n'a pas répondu (timeouts, connexions
+perdues, 502, 503, cf. RetryRequest.failure) il s'ouvre et les requêtes
+échouent tout de suite en ke.CircuitOpen, sans attendre les timeouts; après
+cooldown s une requête d'essai est laissée passer, qui le referme si elle
+aboutit.
+Les disjoncteurs sont partagés par tous les clients d'une url, cf. get_breaker.
+"""
+from random import uniform
+from threading import Lock
+from time import monotonic
+from typing import Dict, Tuple
+
+from kolaBitMEXBot.kola.settings import (
+    HTTP_BACKOFF,
+    HTTP_BREAKER,
+    HTTP_DEADLINE,
+    HTTP_MAX_RETRIES,
+)
+
+
+class RetryPolicy:
+    """
+    Les pauses et limites des relances d'une requête.
+
+    - maxRetries: nb max de tentatives,
+    - base, cap: pause de la première relance et pause max, en s,
+    - deadline: durée max en s depuis le premier envoi, pauses comprises.
+    """
+
+    def __init__(
+        self,
+        maxRetries: int = HTTP_MAX_RETRIES,
+        base: float = HTTP_BACKOFF[0],
+        cap: float = HTTP_BACKOFF[1],
+        deadline: float = HTTP_DEADLINE,
+    ):
+        self.maxRetries = maxRetries
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+
+    def __repr__(self):
+        return (
+            f"RetryPolicy(maxRetries={self.maxRetries}, base={self.base},"
+            f" cap={self.cap}, deadline={self.deadline})"
+        )
+
+    def pause(self, retries: int) -> float:
+        """
+        Return the pause in s before the retry number retries (from 1).
+
+        Entre la moitié et le tout de base * 2 ** (retries - 1), plafonné à
+        cap: le hasard évite que les threads relancent tous en même temps.
+        """
+        delay = min(self.cap, self.base * 2 ** (retries - 1))
+        return uniform(delay / 2, delay)
+
+    def give_up(
+        self, retries: int, start: float, pause: float, maxRetries=None
+    ) -> bool:
+        """
+        Tell if the request started at start (monotonic) should not be retried.
+
+        - maxRetries: pour cette requête, def. self.maxRetries
+        """
+        maxRetries = maxRetries or self.maxRetries
+        return retries >= maxRetries or monotonic() - start + pause > self.deadline
+
+
+class CircuitBreaker:
+    """
+    Le disjoncteur d'un endpoint: "closed", "open" ou "half-open".
+
+    allow dit si une requête peut partir, success et failure rendent compte
+    de son résultat.  Un échec est un échec passager (timeout, 5xx...), une
+    erreur métier (ordre invalide...) montre que l'endpoint répond.
+    """
+
+    def __init__(
+        self, threshold: int = HTTP_BREAKER[0], cooldown: float = HTTP_BREAKER[1]
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0  # échecs de suite
+        self.openedAt = 0.0  # monotonic
+        self._lock = Lock()
+
+    def __repr__(self):
+        return f"CircuitBreaker(state={self.state}, failures={self.failures})"
+
+    def allow(self) -> bool:
+        """Tell if a request can be sent, let one through after cooldown."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and monotonic() - self.openedAt >= self.cooldown:
+                # une seule requête d'essai, les autres échouent jusqu'à sa fin
+                self.state = "half-open"
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """Return the s before a trial request is let through."""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            return max(0.0, self.openedAt + self.cooldown - monotonic())
+
+    def success(self):
+        """Close the breaker."""
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def failure(self):
+        """Count a failure, open the breaker after threshold of them."""
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.openedAt = monotonic()
+
+
+class RetryRequest(Exception):
+    """
+    La requête est à relancer après une pause.
+
+    - failure: l'endpoint n'a pas répondu (timeout, connexion, 502, 503),
+    un échec pour son disjoncteur; faux s'il a répondu (429, 400 expirée,
+    404 d'un GET), ce qui le referme.
+    """
+
+    def __init__(self, exception, failure: bool = True):
+        super().__init__(exception)
+        self.exception = exception
+        self.failure = failure
+
+
+# un disjoncteur par (url, verbe, path), partagé par les clients de l'url
+_breakers: Dict[Tuple[str, str, str], CircuitBreaker] = {}
+_breakersLock = Lock()
+
+
+def get_breaker(base_url: str, verb: str, path: str) -> CircuitBreaker:
+    """Return the breaker of the endpoint."""
+    key = (base_url, verb, path)
+    with _breakersLock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(*HTTP_BREAKER)
+        return breaker
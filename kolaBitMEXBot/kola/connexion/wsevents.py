@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Notification des changements des tables du websocket."""
+from collections import defaultdict
+from threading import Event, Lock
+import asyncio
+from time import monotonic, sleep
+from typing import Callable, Dict, Hashable, Iterable, Optional, Set, Tuple, Union
+
+# colonnes qui identifient les lignes qu'un consommateur peut attendre
+EVENT_KEYS = ("clOrdID", "orderID", "symbol")
+
+Tables = Union[str, Iterable[str]]
+
+
+class TableEvents:
+    """
+    Publie les changements des tables du websocket.
+
+    Chaque table a un numéro de version incrémenté à chaque message traité.
+    Un consommateur s'enregistre sur (table, ID) où ID est un clOrdID, un
+    orderID, un symbol ou None pour tous les changements de la table, et il
+    est réveillé dès qu'une ligne concernée change au lieu de sonder la table.
+    Des callbacks peuvent aussi être enregistrés sur (table, ID), ils sont
+    appelés dans le thread du websocket et doivent donc être rapides.
+    Les coroutines d'une boucle asyncio attendent avec wait_async et
+    wait_for_async, quel que soit le thread qui publie.
+    """
+
+    def __init__(self):
+        """Init the registry."""
+        self._lock = Lock()
+        self.versions: Dict[str, int] = defaultdict(int)
+        # les waiters ont une méthode set (threading.Event ou LoopWaiter)
+        self._waiters: Dict[Tuple[str, Hashable], Set] = defaultdict(set)
+        self._callbacks: Dict[Tuple[str, Hashable], list] = defaultdict(list)
+
+    def __repr__(self):
+        return f"TableEvents(versions={dict(self.versions)})"
+
+    def version(self, tables: Tables) -> Tuple[int, ...]:
+        """Return the current versions of tables."""
+        return tuple(self.versions[t] for t in as_tables(tables))
+
+    def notify(self, table: str, rows: Iterable[dict] = ()):
+        """
+        Publish a change of table, called by the websocket thread.
+
+        - rows: les lignes du message, leurs EVENT_KEYS désignent les
+        consommateurs à réveiller en plus de ceux de toute la table.
+        """
+        keys = {(table, None)} | {
+            (table, row[k]) for row in rows for k in EVENT_KEYS if row.get(k)
+        }
+        with self._lock:
+            self.versions[table] += 1
+            events = [e for key in keys for e in self._waiters.get(key, ())]
+            callbacks = [c for key in keys for c in self._callbacks.get(key, ())]
+
+        for event in events:
+            event.set()
+
+        for callback in callbacks:
+            callback(table, rows)
+
+    def wait(
+        self,
+        tables: Tables,
+        timeout: Optional[float] = None,
+        ID: Hashable = None,
+        since: Optional[Tuple[int, ...]] = None,
+    ) -> bool:
+        """
+        Block until one of tables changes (rows of ID if given) or timeout (s).
+
+        - since: les versions de référence (cf. version), def. les actuelles,
+        Return True if a change was published.
+        """
+        event = Event()
+        keys = self._register(event, tables, ID, since)
+        if keys is None:
+            return True
+        try:
+            return event.wait(timeout)
+        finally:
+            self._unregister(event, keys)
+
+    async def wait_async(
+        self,
+        tables: Tables,
+        timeout: Optional[float] = None,
+        ID: Hashable = None,
+        since: Optional[Tuple[int, ...]] = None,
+    ) -> bool:
+        """Like wait but awaits in the running event loop."""
+        event = asyncio.Event()
+        waiter = LoopWaiter(asyncio.get_running_loop(), event)
+        keys = self._register(waiter, tables, ID, since)
+        if keys is None:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._unregister(waiter, keys)
+
+    def _register(self, waiter, tables, ID, since):
+        """Register waiter, return its keys or None if tables changed since."""
+        tables = as_tables(tables)
+        keys = [(t, ID) for t in tables]
+        with self._lock:
+            if since is not None and since != self.version(tables):
+                return None
+            for key in keys:
+                self._waiters[key].add(waiter)
+        return keys
+
+    def _unregister(self, waiter, keys):
+        with self._lock:
+            for key in keys:
+                self._waiters[key].discard(waiter)
+                if not self._waiters[key]:
+                    del self._waiters[key]
+
+    def wait_for(
+        self,
+        predicate: Callable,
+        tables: Tables,
+        timeout: Optional[float] = None,
+        ID: Hashable = None,
+    ):
+        """
+        Block until predicate() is true or timeout (s), return its last value.
+
+        predicate est évalué hors du verrou, à chaque changement de tables
+        (des lignes de ID si donné).
+        """
+        end = None if timeout is None else monotonic() + timeout
+        while True:
+            # version lue avant le prédicat pour ne pas rater un changement
+            since = self.version(tables)
+            result = predicate()
+            if result:
+                return result
+            timeLeft = None if end is None else end - monotonic()
+            if timeLeft is not None and timeLeft <= 0:
+                return result
+            self.wait(tables, timeLeft, ID, since)
+
+    async def wait_for_async(
+        self,
+        predicate: Callable,
+        tables: Tables,
+        timeout: Optional[float] = None,
+        ID: Hashable = None,
+    ):
+        """Like wait_for but awaits in the running event loop."""
+        loop = asyncio.get_running_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while True:
+            since = self.version(tables)
+            result = predicate()
+            if result:
+                return result
+            timeLeft = None if end is None else end - loop.time()
+            if timeLeft is not None and timeLeft <= 0:
+                return result
+            await self.wait_async(tables, timeLeft, ID, since)
+
+    def subscribe(self, table: str, callback: Callable, ID: Hashable = None):
+        """Call callback(table, rows) on each change of table (rows of ID)."""
+        with self._lock:
+            self._callbacks[(table, ID)].append(callback)
+
+    def unsubscribe(self, table: str, callback: Callable, ID: Hashable = None):
+        """Remove a callback registered with subscribe."""
+        with self._lock:
+            callbacks = self._callbacks.get((table, ID), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._callbacks.pop((table, ID), None)
+
+
+class LoopWaiter:
+    """Réveille un asyncio.Event depuis n'importe quel thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, event: asyncio.Event):
+        self.loop = loop
+        self.event = event
+
+    def set(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # la boucle est fermée, plus personne n'attend
+
+
+def as_tables(tables: Tables) -> Tuple[str, ...]:
+    """Return tables as a tuple of table names."""
+    return (tables,) if isinstance(tables, str) else tuple(tables)
+
+
+def poll_for(predicate: Callable, timeout: Optional[float] = None, waitstep=0.1):
+    """Like TableEvents.wait_for but polls predicate every waitstep seconds."""
+    end = None if timeout is None else monotonic() + timeout
+    result = predicate()
+    while not result and (end is None or monotonic() < end):
+        sleep(waitstep if end is None else max(0, min(waitstep, end - monotonic())))
+        result = predicate()
+    return result
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Métriques des messages du websocket, par table et par action.
+
+Pour chaque (table, action): le nombre et le débit des messages, le délai
+entre l'horodatage de la bourse (timestamp ou transactTime de la dernière
+ligne) et la réception, et la durée du traitement local.  Les délais sont
+rangés dans des histogrammes à seaux logarithmiques: mémoire fixe,
+enregistrement en O(1), quantiles à ~5% près.
+"""
+from datetime import datetime
+from math import exp, inf, log
+from threading import Lock
+from time import time_ns
+from typing import Dict, List, Optional, Tuple
+
+from pandas import DataFrame
+
+# colonnes horodatées par la bourse, dans l'ordre de préférence
+TIME_COLUMNS = ("timestamp", "transactTime")
+
+
+class StreamHistogram:
+    """
+    Un histogramme en flux de durées en ms, de taille fixe.
+
+    Les seaux sont en progression géométrique de raison 1 + precision entre
+    low et high, les valeurs hors bornes vont dans le premier ou le dernier.
+    """
+
+    def __init__(
+        self, low: float = 0.01, high: float = 1e6, precision: float = 0.05
+    ):
+        """Init the buckets, low and high in ms."""
+        self.low = low
+        self.logRatio = log(1 + precision)
+        self.size = int(log(high / low) / self.logRatio) + 2
+        # log(value / low) / logRatio = log(value) * scale - offset
+        self.scale = 1 / self.logRatio
+        self.offset = log(low) * self.scale - 1
+        self.buckets: List[int] = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.min = inf
+        self.max = -inf
+
+    def __repr__(self):
+        return (
+            f"StreamHistogram(count={self.count}, p50={self.quantile(0.5)},"
+            f" p99={self.quantile(0.99)}, max={self.maximum()})"
+        )
+
+    def record(self, value: float):
+        """Add a value in ms, negative values (clock skew) count as 0."""
+        if value < self.low:
+            i = 0
+        else:
+            i = min(self.size - 1, int(log(value) * self.scale - self.offset))
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value < self.min:
+            self.min = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the q quantile (upper bound of its bucket) or None if empty."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                if i == self.size - 1:
+                    return self.max  # le dernier seau n'a pas de borne
+                # le seau i couvre [low * r ** (i - 1), low * r ** i[
+                return min(self.low * exp(i * self.logRatio), self.max)
+        return self.max
+
+    def maximum(self) -> Optional[float]:
+        """Return the max or None if empty."""
+        return self.max if self.count else None
+
+    def mean(self) -> Optional[float]:
+        """Return the mean or None if empty."""
+        return self.total / self.count if self.count else None
+
+
+class MessageMetrics:
+    """Les compteurs et histogrammes d'un (table, action)."""
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.first: Optional[int] = None  # réception du premier message, ns
+        self.last: Optional[int] = None
+        self.latency = StreamHistogram()  # bourse -> réception, ms
+        self.processing = StreamHistogram()  # durée de traitement, ms
+
+    def rate(self) -> float:
+        """Return the messages per second since the first one."""
+        if not self.count or self.last == self.first:
+            return 0.0
+        return (self.count - 1) / ((self.last - self.first) / 1e9)
+
+
+class WSMetrics:
+    """
+    Les métriques de tous les (table, action) reçus par un websocket.
+
+    record est appelé par le thread (ou la boucle) du websocket, stats et
+    frame peuvent l'être de n'importe quel thread.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.messages: Dict[Tuple[str, str], MessageMetrics] = {}
+        self.since = time_ns()
+        # (minute 'YYYY-MM-DDTHH:MM', ms epoch) de la dernière date lue
+        self.minute: Tuple[str, float] = ("", 0.0)
+
+    def __repr__(self):
+        return f"WSMetrics(keys={list(self.messages)})"
+
+    def record(
+        self, table: str, action: str, rows: list, received: int, done: int
+    ):
+        """
+        Record a message handled between received and done (ns, epoch).
+
+        Le délai bourse n'est pas mesuré sur les partials, leurs lignes sont
+        des images de l'état et non des événements.
+        """
+        key = (table, action)
+        metrics = self.messages.get(key)
+        if metrics is None:
+            with self._lock:
+                metrics = self.messages.setdefault(key, MessageMetrics())
+
+        metrics.count += 1
+        metrics.rows += len(rows)
+        if metrics.first is None:
+            metrics.first = received
+        metrics.last = received
+        metrics.processing.record((done - received) / 1e6)
+
+        if action != "partial" and rows:
+            stamp = self.exchange_time(rows[-1])
+            if stamp is not None:
+                metrics.latency.record(received / 1e6 - stamp)
+
+    def exchange_time(self, row: dict) -> Optional[float]:
+        """
+        Return the exchange time of row in ms since epoch or None.
+
+        Les dates bitmex sont 'YYYY-MM-DDTHH:MM:SS.mmmZ', celle de la minute
+        est gardée, seules les secondes sont lues à chaque message.
+        """
+        for col in TIME_COLUMNS:
+            stamp = row.get(col)
+            if stamp:
+                break
+        else:
+            return None
+
+        if len(stamp) != 24 or stamp[-1] != "Z":
+            return get_exchange_time(row)
+        minute, epoch = self.minute
+        if stamp[:16] != minute:
+            try:
+                epoch = datetime.fromisoformat(stamp[:16] + "+00:00").timestamp() * 1e3
+            except ValueError:
+                return None
+            self.minute = stamp[:16], epoch
+        try:
+            return epoch + float(stamp[17:23]) * 1e3
+        except ValueError:
+            return None
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.messages = {}
+            self.since = time_ns()
+
+    def stats(self) -> Dict[Tuple[str, str], Dict[str, Optional[float]]]:
+        """
+        Return the statistics of each (table, action).
+
+        count, rows, rate (msg/s), lat_p50, lat_p99, lat_max (ms entre la
+        bourse et la réception), proc_p50, proc_p99, proc_max (ms de
+        traitement).
+        """
+        with self._lock:
+            items = list(self.messages.items())
+        return {
+            key: {
+                "count": m.count,
+                "rows": m.rows,
+                "rate": m.rate(),
+                "lat_p50": m.latency.quantile(0.5),
+                "lat_p99": m.latency.quantile(0.99),
+                "lat_max": m.latency.maximum(),
+                "proc_p50": m.processing.quantile(0.5),
+                "proc_p99": m.processing.quantile(0.99),
+                "proc_max": m.processing.maximum(),
+            }
+            for key, m in sorted(items)
+        }
+
+    def frame(self) -> DataFrame:
+        """Return the stats as a DataFrame indexed by (table, action)."""
+        stats = self.stats()
+        df = DataFrame.from_dict(stats, orient="index")
+        if len(df):
+            df.index.names = ["table", "action"]
+        return df
+
+
+def get_exchange_time(row: dict) -> Optional[float]:
+    """Return the exchange time of row in ms since epoch or None."""
+    for col in TIME_COLUMNS:
+        stamp = row.get(col)
+        if stamp:
+            try:
+                # '2020-08-01T00:00:00.000Z', fromisoformat ne lit Z qu'en 3.11
+                stamp = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+                return stamp.timestamp() * 1e3
+            except (AttributeError, ValueError):
+                return None
+    return None
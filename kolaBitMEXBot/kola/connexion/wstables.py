@@ -0,0 +1,595 @@
+# -*- coding: utf-8 -*-
+"""Stockage des tables reçues par le websocket."""
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from pandas import DataFrame, concat
+
+
+class TableSnapshot(NamedTuple):
+    """
+    Une copie d'une table et sa version (cf. TableEvents.version).
+
+    La frame est partagée entre les lecteurs, ne pas la modifier.  Tant que
+    la version ne change pas, les calculs faits dessus restent valables.
+    """
+
+    version: int
+    frame: DataFrame
+
+
+class IndexedTable:
+    """
+    Une table du websocket indexée sur ses clefs.
+
+    Les lignes (des dict) sont rangées dans un dict, ordonné par insertion,
+    dont la clef est le tuple des valeurs des colonnes `keys` annoncées
+    dans le partial.  Recherche, mise à jour et suppression sont en O(1).
+    La table se lit toujours comme une liste de dict.
+    """
+
+    def __init__(self, keys: Sequence[str], rows: Optional[List[dict]] = None):
+        """
+        Init the table.
+
+        - keys: les noms des colonnes qui identifient une ligne (cf. partial),
+        - rows: les lignes initiales.
+        """
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.rows: Dict[Tuple, dict] = {}
+        if rows:
+            self.insert(rows)
+
+    def __repr__(self):
+        return f"IndexedTable(keys={self.keys}, len={len(self)})"
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[dict]:
+        # on itère sur une copie car la table est mise à jour depuis le thread du ws
+        return iter(list(self.rows.values()))
+
+    def __getitem__(self, i):
+        """
+        Return the row at position i, in insertion order.
+
+        Sans copie de la table: les extrémités (0, -1) sont en O(1), une
+        autre position en O(i) depuis le bout le plus proche.  Pour tout lire,
+        itérer sur la table plutôt que de l'indexer.
+        """
+        if isinstance(i, slice):
+            return list(self.rows.values())[i]
+        n = len(self.rows)
+        if not -n <= i < n:
+            raise IndexError(f"IndexedTable index {i} out of range")
+        i %= n
+        if i <= n // 2:
+            return next(islice(self.rows.values(), i, None))
+        return next(islice(reversed(self.rows.values()), n - 1 - i, None))
+
+    def key_of(self, row: dict) -> Tuple:
+        """Return the index key of row."""
+        return tuple(row[k] for k in self.keys)
+
+    def insert(self, rows: List[dict]):
+        """Insert or replace the rows."""
+        for row in rows:
+            self.rows[self.key_of(row)] = row
+
+    def find(self, matchData: dict) -> Optional[dict]:
+        """Return the row with the same keys as matchData or None."""
+        return self.rows.get(self.key_of(matchData))
+
+    def remove(self, item: dict):
+        """Remove item from the table (same API as list.remove)."""
+        if self.rows.pop(self.key_of(item), None) is None:
+            raise ValueError(f"{self.key_of(item)} not in table")
+
+    def delete(self, matchData: dict) -> Optional[dict]:
+        """Remove and return the row matching matchData if any."""
+        return self.rows.pop(self.key_of(matchData), None)
+
+    def trim(self, maxLen: int):
+        """Si la table dépasse maxLen, ne garde que les maxLen // 2 plus récentes."""
+        if len(self.rows) > maxLen:
+            toDrop = len(self.rows) - maxLen // 2
+            for key in list(islice(self.rows, toDrop)):
+                del self.rows[key]
+
+
+class RingTable:
+    """
+    Un ring buffer en colonnes (numpy) pour les tables qui ne font que grossir.
+
+    trade, quote, execution ne reçoivent que des inserts.  Chaque colonne du
+    schéma est un tableau de taille fixe 2 * capacity: une ligne est écrite
+    aux positions i et i + capacity, ainsi les `capacity` dernières lignes
+    sont toujours contiguës et lisibles sans copie.  L'insertion est en O(1),
+    la mémoire est bornée et il n'y a jamais de trim.
+    Les colonnes hors schéma sont ignorées.
+    """
+
+    def __init__(
+        self,
+        schema: Dict[str, str],
+        capacity: int,
+        rows: Optional[List[dict]] = None,
+    ):
+        """
+        Init the buffer.
+
+        - schema: {colonne: dtype numpy}, 'O' pour les str et valeurs nullables,
+        - capacity: nombre maximum de lignes gardées,
+        - rows: les lignes initiales.
+        """
+        assert capacity > 0, f"capacity={capacity}"
+        self.schema: Dict[str, str] = dict(schema)
+        self.capacity = capacity
+        self.count = 0  # nombre total de lignes reçues
+        self.head = 0  # nombre de lignes dont l'écriture a commencé
+        self.columns: Dict[str, np.ndarray] = {}
+        self._writers: List[Tuple[np.ndarray, str, Callable]] = []
+
+        for name, dtype in self.schema.items():
+            col = np.empty(2 * capacity, dtype=dtype)
+            col.fill(to_cell(None, col.dtype))
+            self.columns[name] = col
+            self._writers.append((col, name, cell_converter(col.dtype)))
+
+        if rows:
+            self.insert(rows)
+
+    def __repr__(self):
+        return (
+            f"RingTable(columns={list(self.schema)}, len={len(self)},"
+            f" capacity={self.capacity}, count={self.count})"
+        )
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.rows())
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.rows()[i]
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError(f"RingTable index {i} out of range")
+        pos = self.window().start + (i % n)
+        return {
+            name: col[pos] if col.dtype.kind == "O" else col[pos].item()
+            for name, col in self.columns.items()
+        }
+
+    def insert(self, rows: List[dict]):
+        """Append rows, overwriting the oldest ones when full."""
+        cap = self.capacity
+        for row in rows:
+            i = self.count % cap
+            self.head = self.count + 1
+            for col, name, convert in self._writers:
+                col[i] = col[i + cap] = convert(row.get(name))
+            self.count += 1
+
+    def trim(self, maxLen: int):
+        """Nothing to do, the capacity bounds the table."""
+        pass
+
+    def window(self, n: Optional[int] = None) -> slice:
+        """Return the slice of the n (def. all) most recent rows in the columns."""
+        size = len(self)
+        n = size if n is None else max(0, min(n, size))
+        start = (self.count - n) % self.capacity
+        return slice(start, start + n)
+
+    def column(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        """
+        Return a read only view (no copy) of the n last values of column name.
+
+        Attention la vue peut être réécrite par les inserts suivants,
+        la copier pour la garder.
+        """
+        view = self.columns[name][self.window(n)]
+        view.flags.writeable = False
+        return view
+
+    def view(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Return the read only views of all the columns, see column."""
+        # une seule fenêtre pour que les colonnes restent alignées
+        sl = self.window(n)
+        views = {name: col[sl] for name, col in self.columns.items()}
+        for view in views.values():
+            view.flags.writeable = False
+        return views
+
+    def snapshot(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Return a consistent copy of the columns of the n last rows.
+
+        Sans verrou: les lignes que des inserts concurrents ont pu réécrire
+        pendant la copie (les plus anciennes) sont retirées de la copie.
+        """
+        while True:
+            count = self.count
+            sl = self.window(n)
+            copies = {name: col[sl].copy() for name, col in self.columns.items()}
+            # la ligne k réécrit la ligne k - capacity, la copie commence à la
+            # ligne count - n: les head - capacity - (count - n) premières sont
+            # peut-être réécrites
+            torn = self.head - self.capacity - (count - (sl.stop - sl.start))
+            if torn <= 0:
+                return copies
+            if torn < sl.stop - sl.start:
+                return {name: col[torn:] for name, col in copies.items()}
+
+    def frame(self, n: Optional[int] = None) -> DataFrame:
+        """Return a consistent copy of the n last rows as a DataFrame."""
+        return DataFrame(self.snapshot(n), copy=False)
+
+    def rows(self, n: Optional[int] = None) -> List[dict]:
+        """Return the n last rows as a list of dict, oldest first."""
+        sl = self.window(n)
+        names = list(self.columns)
+        values = [self.columns[name][sl].tolist() for name in names]
+        return [dict(zip(names, vals)) for vals in zip(*values)]
+
+
+class SymbolRings:
+    """
+    Un RingTable par symbol pour les tables d'une connexion multi-symbols.
+
+    Les lignes sont rangées dans le ring de leur symbol, créé à la première
+    ligne reçue, ainsi chaque symbol garde ses `capacity` dernières lignes
+    et ses vues restent contiguës.  Se lit comme la liste de toutes les
+    lignes, symbol par symbol.
+    """
+
+    def __init__(
+        self,
+        schema: Dict[str, str],
+        capacity: int,
+        rows: Optional[List[dict]] = None,
+    ):
+        """Init the rings, see RingTable."""
+        self.schema: Dict[str, str] = dict(schema)
+        self.capacity = capacity
+        self.rings: Dict[str, RingTable] = {}
+        if rows:
+            self.insert(rows)
+
+    def __repr__(self):
+        return (
+            f"SymbolRings(symbols={list(self.rings)}, len={len(self)},"
+            f" capacity={self.capacity})"
+        )
+
+    def __len__(self):
+        return sum(len(ring) for ring in list(self.rings.values()))
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.rows())
+
+    def __getitem__(self, i):
+        return self.rows()[i]
+
+    def ring(self, symbol: str) -> Optional[RingTable]:
+        """Return the ring of symbol or None if no row was received."""
+        return self.rings.get(symbol)
+
+    def insert(self, rows: List[dict]):
+        """Append each row to the ring of its symbol."""
+        bySymbol: Dict[str, List[dict]] = {}
+        for row in rows:
+            bySymbol.setdefault(row.get("symbol"), []).append(row)
+
+        for symbol, symbolRows in bySymbol.items():
+            if symbol not in self.rings:
+                self.rings[symbol] = RingTable(self.schema, self.capacity)
+            self.rings[symbol].insert(symbolRows)
+
+    def replace(self, rows: List[dict], symbol: Optional[str] = None):
+        """Replace the rings of symbol and of the rows' symbols by rows (partial)."""
+        for _symbol in {symbol} | {row.get("symbol") for row in rows}:
+            self.rings.pop(_symbol, None)
+        self.insert(rows)
+
+    def trim(self, maxLen: int):
+        """Nothing to do, the capacity bounds the rings."""
+        pass
+
+    def view(self, n: Optional[int] = None, symbol: Optional[str] = None):
+        """Return the read only views of symbol's ring or None, see RingTable."""
+        ring = self.ring(symbol)
+        return None if ring is None else ring.view(n)
+
+    def snapshot(self, n: Optional[int] = None, symbol: Optional[str] = None):
+        """Return a consistent copy of symbol's ring or None, see RingTable."""
+        ring = self.ring(symbol)
+        return None if ring is None else ring.snapshot(n)
+
+    def frame(self, n: Optional[int] = None, symbol: Optional[str] = None):
+        """Return the n last rows of symbol (def. all symbols) as a DataFrame."""
+        rings = list(self.rings.values()) if symbol is None else [self.ring(symbol)]
+        frames = [ring.frame(n) for ring in rings if ring is not None]
+        if not frames:
+            return DataFrame({name: [] for name in self.schema})
+        return concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def rows(self, n: Optional[int] = None, symbol: Optional[str] = None):
+        """Return the n last rows of symbol (def. all) as a list of dict."""
+        if symbol is not None:
+            ring = self.ring(symbol)
+            return [] if ring is None else ring.rows(n)
+        return [row for ring in list(self.rings.values()) for row in ring.rows(n)]
+
+
+class OrderBook:
+    """
+    Le carnet d'ordres L2 d'un symbol, trié par niveau de prix.
+
+    Chaque ligne de orderBookL2 est un niveau (id, side, price, size).  Les
+    lignes sont indexées sur leur id, les prix de chaque côté sont gardés
+    triés (croissants) dans une liste et leur taille dans un dict.  Une mise
+    à jour de taille est en O(1), l'ajout ou le retrait d'un niveau est une
+    recherche dichotomique en O(log n), le meilleur bid ou ask en O(1).
+    """
+
+    def __init__(self, symbol: Optional[str] = None, rows: Optional[List[dict]] = None):
+        """Init the book of symbol with the rows of a partial."""
+        self.symbol = symbol
+        self.rows: Dict[int, dict] = {}
+        self.prices: Dict[str, List[float]] = {"Buy": [], "Sell": []}
+        self.sizes: Dict[str, Dict[float, int]] = {"Buy": {}, "Sell": {}}
+        if rows:
+            self.insert(rows)
+
+    def __repr__(self):
+        return (
+            f"OrderBook(symbol={self.symbol}, bid={self.best_bid()},"
+            f" ask={self.best_ask()}, len={len(self)})"
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(list(self.rows.values()))
+
+    def insert(self, rows: List[dict]):
+        """Insert or replace the levels."""
+        for row in rows:
+            old = self.rows.get(row["id"])
+            if old is not None:
+                self._drop(old)
+            row = dict(row)
+            self.rows[row["id"]] = row
+            self._add(row)
+
+    def update(self, rows: List[dict]):
+        """Update the size (and price if given) of the levels."""
+        for data in rows:
+            row = self.rows.get(data["id"])
+            if row is None:
+                continue
+            if data.get("size") == 0:
+                # un niveau vidé est retiré comme par delete: le meilleur
+                # bid ou ask et impact_price ne voient pas de niveau vide
+                self._drop(self.rows.pop(data["id"]))
+            elif data.get("price", row["price"]) == row["price"]:
+                # le cas courant, seule la taille change
+                self.sizes[row["side"]][row["price"]] += data["size"] - row["size"]
+                row.update(data)
+            else:
+                self._drop(row)
+                row.update(data)
+                self._add(row)
+
+    def delete(self, rows: List[dict]):
+        """Remove the levels."""
+        for data in rows:
+            row = self.rows.pop(data["id"], None)
+            if row is not None:
+                self._drop(row)
+
+    def _add(self, row: dict):
+        prices, sizes = self.prices[row["side"]], self.sizes[row["side"]]
+        price = row["price"]
+        if price not in sizes:
+            insort(prices, price)
+            sizes[price] = 0
+        sizes[price] += row["size"]
+
+    def _drop(self, row: dict):
+        prices, sizes = self.prices[row["side"]], self.sizes[row["side"]]
+        price = row["price"]
+        sizes[price] -= row["size"]
+        if sizes[price] <= 0:
+            del sizes[price]
+            del prices[bisect_left(prices, price)]
+
+    def best_bid(self) -> Optional[float]:
+        """Return the highest bid price or None."""
+        bids = self.prices["Buy"]
+        return bids[-1] if bids else None
+
+    def best_ask(self) -> Optional[float]:
+        """Return the lowest ask price or None."""
+        asks = self.prices["Sell"]
+        return asks[0] if asks else None
+
+    def levels(self, side: str, depth: Optional[int] = None) -> List[Tuple[float, int]]:
+        """
+        Return the (price, size) of the depth best levels of side.
+
+        - side: 'Buy' pour les bids, 'Sell' pour les asks, du meilleur au pire.
+        """
+        side = as_side(side)
+        prices, sizes = self.prices[side], self.sizes[side]
+        ordered = reversed(prices) if side == "Buy" else iter(prices)
+        return [(p, sizes.get(p, 0)) for p in islice(ordered, depth)]
+
+    def impact_price(
+        self, side: str, orderQty: int, average: bool = True
+    ) -> Optional[float]:
+        """
+        Return the price to fill orderQty against the book, None if too deep.
+
+        - side: le côté de l'ordre, un achat ('buy') consomme les asks,
+        - average: si True le prix moyen pondéré par les tailles, sinon le
+        prix du dernier niveau atteint (le prix limite à donner à l'ordre).
+        Only the levels needed are walked.
+        """
+        book = "Sell" if as_side(side) == "Buy" else "Buy"
+        prices, sizes = self.prices[book], self.sizes[book]
+        ordered = reversed(prices) if book == "Buy" else iter(prices)
+        left, cost = orderQty, 0.0
+        for price in ordered:
+            qty = min(left, sizes.get(price, 0))
+            cost += qty * price
+            left -= qty
+            if left <= 0:
+                return cost / orderQty if average else price
+        return None
+
+
+class OrderBookL2:
+    """
+    La table orderBookL2 (ou orderBookL2_25), un OrderBook par symbol.
+
+    Les updates et deletes sont appliqués par le carnet (cf. OrderBook) et
+    non en modifiant les lignes.  Se lit comme la liste de tous les niveaux.
+    """
+
+    def __init__(self, rows: Optional[List[dict]] = None):
+        """Init the books."""
+        self.books: Dict[str, OrderBook] = {}
+        if rows:
+            self.insert(rows)
+
+    def __repr__(self):
+        return f"OrderBookL2(symbols={list(self.books)}, len={len(self)})"
+
+    def __len__(self):
+        return sum(len(book) for book in list(self.books.values()))
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter([row for book in list(self.books.values()) for row in book])
+
+    def __getitem__(self, i):
+        return list(self)[i]
+
+    def book(self, symbol: str) -> Optional[OrderBook]:
+        """Return the book of symbol or None if no partial was received."""
+        return self.books.get(symbol)
+
+    def _by_symbol(self, rows: List[dict]) -> Dict[str, List[dict]]:
+        bySymbol: Dict[str, List[dict]] = {}
+        for row in rows:
+            bySymbol.setdefault(row["symbol"], []).append(row)
+        return bySymbol
+
+    def insert(self, rows: List[dict]):
+        """Insert the levels in the book of their symbol."""
+        for symbol, symbolRows in self._by_symbol(rows).items():
+            if symbol not in self.books:
+                self.books[symbol] = OrderBook(symbol)
+            self.books[symbol].insert(symbolRows)
+
+    def update(self, rows: List[dict]):
+        """Update the levels of the books."""
+        for symbol, symbolRows in self._by_symbol(rows).items():
+            if symbol in self.books:
+                self.books[symbol].update(symbolRows)
+
+    def delete(self, rows: List[dict]):
+        """Remove the levels from the books."""
+        for symbol, symbolRows in self._by_symbol(rows).items():
+            if symbol in self.books:
+                self.books[symbol].delete(symbolRows)
+
+    def replace(self, rows: List[dict], symbol: Optional[str] = None):
+        """Replace the books of symbol and of the rows' symbols by rows (partial)."""
+        bySymbol = self._by_symbol(rows)
+        for _symbol in {symbol} | set(bySymbol):
+            self.books.pop(_symbol, None)
+        for _symbol, symbolRows in bySymbol.items():
+            self.books[_symbol] = OrderBook(_symbol, symbolRows)
+
+    def trim(self, maxLen: int):
+        """Nothing to do, the book is kept whole."""
+        pass
+
+
+def as_side(side: str) -> str:
+    """Return side as in the book, 'Buy' or 'Sell'."""
+    return side.capitalize()
+
+
+def to_cell(value, dtype: np.dtype):
+    """Convert a json value to a numpy cell of dtype."""
+    if dtype.kind == "M":
+        if value is None:
+            return np.datetime64("NaT")
+        # les timestamps bitmex sont en UTC '2020-05-01T12:00:00.123Z'
+        return np.datetime64(value.rstrip("Z"), "ms")
+    if dtype.kind == "f":
+        return np.nan if value is None else value
+    if dtype.kind in "iub" and value is None:
+        return 0
+    return value
+
+
+def cell_converter(dtype: np.dtype) -> Callable:
+    """Return the fonction converting json values to cells of dtype."""
+    if dtype.kind == "O":
+        return lambda value: value
+    return lambda value: to_cell(value, dtype)
+
+
+def new_table(
+    keys: Sequence[str],
+    rows: Optional[List[dict]] = None,
+    schema: Optional[Dict[str, str]] = None,
+    capacity: Optional[int] = None,
+    book: bool = False,
+):
+    """
+    Return a store for a table.
+
+    - si book, un OrderBookL2 (tables orderBookL2),
+    - si un schema est donné, un RingTable de taille capacity par symbol,
+    - sinon si la table a des clefs, une IndexedTable,
+    - sinon une liste.
+    """
+    if book:
+        return OrderBookL2(rows)
+    if schema:
+        return SymbolRings(schema, capacity, rows)
+    if keys:
+        return IndexedTable(keys, rows)
+    return list(rows) if rows else []
+
+
+def find_item(table, keys, matchData) -> Optional[dict]:
+    """Return the item of table matching matchData on keys."""
+    if isinstance(table, IndexedTable):
+        return table.find(matchData)
+    return findItemByKeys(keys, table, matchData)
+
+
+def findItemByKeys(keys, table, matchData):
+    """parcours les items de la table.
+Pour chaque item vérifie que tous les éléments clefs sont les même que ceux de match Data.
+Sinon, si l'un des éléments clefs est !=, ne renvois pas l'item"""
+    for item in table:
+        matched = True
+        for key in keys:
+            if item[key] != matchData[key]:
+                matched = False
+        if matched:
+            return item
@@ -1,21 +1,38 @@
 #  -*- coding: utf-8 -*-
 """BitMEX API Connector."""
 from __future__ import absolute_import
-from time import sleep, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic, sleep, time
+from typing import Optional
 
 from json import dumps
-from numpy import random
 import datetime as dt
 import requests as rq
 import pandas as pd
 
 from kolaBitMEXBot.kola.connexion.auth import APIKeyAuthWithExpires
 from kolaBitMEXBot.kola.connexion.custom_ws_thread import BitMEXWebsocket
-from kolaBitMEXBot.kola.utils.general import round_sprice, trim_output
+from kolaBitMEXBot.kola.connexion.httpmetrics import (
+    HTTPMetrics,
+    get_pool_adapter,
+    get_pool_stats,
+)
+from kolaBitMEXBot.kola.connexion.ratelimit import get_bucket
+from kolaBitMEXBot.kola.connexion.retrypolicy import (
+    RetryPolicy,
+    RetryRequest,
+    get_breaker,
+)
+from kolaBitMEXBot.kola.orders.order import to_postdict
+from kolaBitMEXBot.kola.utils.general import trim_output
 from kolaBitMEXBot.kola.settings import (
-    HTTP_SIMPLE_RATE_LIMITE,
-    HTTP_BULK_RATE_LIMITE,
     ORDERID_PREFIX,
+    INSTRUMENTS_ALLOWLIST,
+    WS_TRANSPORT,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_BLOCK,
+    HTTP_METRICS,
+    HTTP_BACKGROUND_WORKERS,
 )
 from kolaBitMEXBot.kola.utils.constantes import PRICE_PRECISION
 from kolaBitMEXBot.kola.utils.orderfunc import newClID, split_ids, get_abbv_from_ID
@@ -40,8 +57,24 @@ class BitMEX(object):
         postOnly=False,
         timeout=8,
         logger=None,
+        ringCapacity=None,
+        instruments=INSTRUMENTS_ALLOWLIST,
+        ws=None,
+        transport=WS_TRANSPORT,
+        poolSize=HTTP_POOL_SIZE,
+        retryPolicy=None,
     ):
-        """Init connector."""
+        """
+        Init connector.
+
+        - ringCapacity: {table: nb lignes} for the websocket ring buffers
+        - instruments: instruments followed by the websocket besides symbol
+        - ws: a connected BitMEXWebsocket to share with other clients, symbol
+        is added to its subscriptions.  Sinon on en crée un pour symbol.
+        - transport: of the websocket, "thread" or "asyncio", see get_ws_class
+        - poolSize: connexions keep-alive du pool REST, cf. get_pool_adapter
+        - retryPolicy: relances des requêtes, def. RetryPolicy()
+        """
         self.dummy = False  # to flag this as not dummy
         self.logger = get_logger(logger, name=__name__, sLL="INFO")
         self.base_url = base_url
@@ -59,10 +92,23 @@ class BitMEX(object):
                 "settings.ORDERID_PREFIX must be at most 13 characters long!"
             )
         self.orderIDPrefix = orderIDPrefix
-        self.retries = 0  # initialize counter
+        # relances et disjoncteurs des requêtes, cf. _curl_bitmex
+        self.retryPolicy = retryPolicy or RetryPolicy()
+        # relance les GET de fetch sans bloquer l'appelant
+        self.background = ThreadPoolExecutor(
+            HTTP_BACKGROUND_WORKERS, thread_name_prefix="restGET"
+        )
+        # débit des requêtes REST, partagé par les clients de la même clé
+        self.rateLimit = get_bucket(apiKey)
 
         # Prepare HTTPS session
         self.session = rq.Session()
+        # un pool partagé par les threads, ses connexions restent ouvertes
+        self.poolAdapter = get_pool_adapter(poolSize, HTTP_POOL_BLOCK)
+        self.session.mount("https://", self.poolAdapter)
+        self.session.mount("http://", self.poolAdapter)
+        # durées, retries et octets par endpoint, cf. http_stats
+        self.httpMetrics = HTTPMetrics() if HTTP_METRICS else None
         # These headers are always sent
         self.session.headers.update(
             {"user-agent": "idev-"}
@@ -71,12 +117,23 @@ class BitMEX(object):
         self.session.headers.update({"accept": "application/json"})
 
         # Create websocket for streaming data
-        ws = BitMEXWebsocket(
-            self.apiKey, self.apiSecret, logger=self.logger, symbol=symbol
-        )
+        # or multiplex symbol on the shared one
+        self.ownWS = ws is None
+        if self.ownWS:
+            ws = get_ws_class(transport)(
+                self.apiKey,
+                self.apiSecret,
+                logger=self.logger,
+                symbol=symbol,
+                ringCapacity=ringCapacity,
+            )
+            ws.connect(
+                base_url, symbol, shouldAuth=shouldWSAuth, instruments=instruments
+            )
+        else:
+            ws.add_symbols([symbol])
         self.ws = ws
         self.logger.debug(f"ws={ws}")
-        self.ws.connect(base_url, symbol, shouldAuth=shouldWSAuth)
         self.timeout = timeout
         self.logger.info(f"Fini init {self}")
 
@@ -99,10 +156,17 @@ class BitMEX(object):
         rethrow_errors=True,
         max_retries=None,
     ):
-        """Send a request to BitMEX Servers."""
-        # Handle URL
-        url = self.base_url + path
-
+        """
+        Send a request to BitMEX Servers.
+
+        Les échecs passagers (timeouts, 429, 502, 503, 404 sur un GET) sont
+        relancés selon self.retryPolicy: pauses croissantes, max_retries
+        tentatives et une deadline, puis ke.MaxRetries.  Seuls les timeouts,
+        connexions perdues, 502 et 503 comptent pour le disjoncteur de
+        l'endpoint; ouvert, ke.CircuitOpen est levée sans rien envoyer.
+        Un POST refusé pour un clOrdID en double a déjà été placé (relance
+        après un timeout...), on renvoie l'ordre existant, cf. get_placed.
+        """
         if timeout is None:
             timeout = self.timeout
 
@@ -116,45 +180,106 @@ class BitMEX(object):
         # or you could change the clOrdID (set {"clOrdID": "new", "origClOrdID": "old"})
         # so that an amend can't erroneously be applied twice.
         if max_retries is None or max_retries <= 0:
-            max_retries = 30
+            max_retries = self.retryPolicy.maxRetries
+
+        url = self.base_url + path
+        if verb in ["POST", "PUT"]:  # don't want to log GET
+            self.logger.info(
+                f'sending {verb} to {url}: {dumps(postdict or query or "no postdict nor query.")}'
+            )
+        # for logging exception
+        load = {
+            "path": path,
+            "query": query,
+            "postdict": postdict,
+            "timeout": timeout,
+            "verb": verb,
+            "rethrow_errors": rethrow_errors,
+            "max_retries": max_retries,
+        }
+
+        breaker = get_breaker(self.base_url, verb, path)
+        start, retries = monotonic(), 0
+        while True:
+            if not breaker.allow():
+                raise ke.CircuitOpen(
+                    f"{verb} {path}: circuit open",
+                    load=postdict,
+                    extra=f"retry in {breaker.retry_in():.1f}s",
+                )
+            try:
+                reply = self._send_once(load)
+            except RetryRequest as retry:
+                if retry.failure:
+                    breaker.failure()
+                else:
+                    breaker.success()  # l'endpoint a répondu
+                exception = retry.exception
+            except Exception:
+                # erreur métier, l'endpoint a répondu
+                breaker.success()
+                raise
+            else:
+                breaker.success()
+                return reply
+
+            retries += 1
+            pause = self.retryPolicy.pause(retries)
+            if self.retryPolicy.give_up(retries, start, pause, max_retries):
+                raise ke.MaxRetries(
+                    exception, load=postdict, extra=f"{path}: Max retries hit"
+                )
+            if self.httpMetrics is not None:
+                self.httpMetrics.retry(verb, path)
+            self.logger.warning(
+                f"retry {verb} {path} {retries}/{max_retries}: "
+                f"Pause de {pause:.2f} sec:"
+                f' postdict={dumps(postdict or "")}'
+            )
+            sleep(pause)
+
+    def fetch(self, path, query=None, timeout=None) -> Future:
+        """
+        GET path in the background, return the Future of its json.
+
+        La requête et ses relances tournent dans un thread de self.background:
+        l'appelant n'attend pas les pauses et lit le résultat (ou l'exception,
+        ke.MaxRetries, ke.CircuitOpen...) quand il en a besoin.  Seulement
+        pour qui utilise le Future: les GET de secours (http_margin,
+        http_position...) et les pages de get_bucketed_trades attendent leur
+        réponse dans le thread appelant, sans faire la queue derrière ceux
+        des autres threads sur les HTTP_BACKGROUND_WORKERS.
+        """
+        return self.background.submit(
+            self._curl_bitmex, path=path, query=query, timeout=timeout, verb="GET"
+        )
+
+    def _send_once(self, load):
+        """Send the request of load once, return its json, raise RetryRequest."""
+        path, query, postdict = load["path"], load["query"], load["postdict"]
+        verb, timeout = load["verb"], load["timeout"]
+        url = self.base_url + path
 
         # Auth: API Key/Secret
         auth = APIKeyAuthWithExpires(self.apiKey, self.apiSecret)
 
         def exit_or_throw(e, reponse=None, load=None):
             """ Gère la sortie en cas d'erreur socket ou de request"""
-            if rethrow_errors:
+            if load["rethrow_errors"]:
                 error = response.json().get("error", {}) if response is not None else {}
                 self.logger.error(f"msg={error}, load={load}")
-
-                if load["verb"] == "GET":
-                    self.retry(**load)
-
                 raise ke.InvalidOrder(e, load, error)
 
         # Make the request
         response = None
-
-        if verb in ["POST", "PUT"]:  # don't want to log GET
-            self.logger.info(
-                f'sending {verb} to {url}: {dumps(postdict or query or "no postdict nor query.")}'
-            )
-        load = None
         try:
-            # for logging exception
-            load = {
-                "path": path,
-                "query": query,
-                "postdict": postdict,
-                "timeout": timeout,
-                "verb": verb,
-                "rethrow_errors": rethrow_errors,
-                "max_retries": max_retries,
-            }
-
             req = rq.Request(verb, url, json=postdict, auth=auth, params=query)
             prepped = self.session.prepare_request(req)
-            response = self.session.send(prepped, timeout=timeout)
+            waited = self.rateLimit.acquire()
+            if waited > 1:
+                self.logger.info(f"Rate limited: waited {waited:.1f}s for {path}")
+            response = self.send(prepped, path, timeout, waited)
+            self.rateLimit.update(response.headers)
 
             # Make non-200s throw
             response.raise_for_status()
@@ -171,39 +296,13 @@ class BitMEX(object):
                 message = error.get("message", "No message").lower()
                 self.logger.warning(f'Error message="{message}", load={load}')
 
-                # Duplicate clOrdID: that's fine, probably a deploy,
-                # go get the order(s) and return it
-                # This request has expired can happend when server is overloaded
-                if (
-                    "duplicate clordid" in message
-                    or "this request has expired" in message
-                ):
-                    return self.retry(**load)
-
-                if "insufficient available balance" in message:
-                    raise ke.InsufficientBalance(e, load, message)
-
-                if "invalid ordstatus" in message:
-                    # probablement un changement trop brusque dans un amend on ignore l'ordre
-                    # problème car attente de valeur retour
-                    self.logger.info(
-                        f"Raising an InvalidOrdStatus exception message={message}"
-                    )
-                    raise ke.InvalidOrdStatus(e, load, message)
-
-                if "invalid orderid" in message:
-                    # probablement un changement trop brusque dans un amend on ignore l'ordre
-                    self.logger.info("Raising an InvalidOrderID exception")
-                    raise ke.InvalidOrderID(e, load, message)
-
-                if "invalid orderqty" in message:
-                    # Une quantité trop petite probablement.  On envois à Chronos
-                    # pour vérifier
-                    self.logger.info("Raising an InvalidOrderID exception")
-                    raise ke.InvalidOrderQty(e, load, message)
-
-                # other 400 error raise
-                raise ke.InvalidOrder(e, load, message)
+                if is_duplicate(verb, postdict, message):
+                    return self.get_placed(postdict)
+                exception = get_bad_request_error(e, load, message)
+                if exception is None:
+                    raise RetryRequest(e, failure=False)
+                self.logger.info(f"Raising {exception.__class__.__name__}")
+                raise exception
 
             # 401 - Auth error. This is fatal.
             elif response.status_code == 401:
@@ -222,6 +321,8 @@ class BitMEX(object):
                         f"Order not found. postdict = {postdict} and load={load}"
                     )
                     return None
+                if verb == "GET":
+                    raise RetryRequest(e, failure=False)
                 exit_or_throw(e, response, load)
 
             # 429, ratelimit; cancel orders & wait until X-Ratelimit-Reset
@@ -248,44 +349,82 @@ class BitMEX(object):
                     f"Sleeping for {to_sleep} seconds."
                 )
 
-                sleep(to_sleep)
-                return self.retry(**load)  # ne passe pas are exit_or_throw
+                # toutes les requêtes de la clé attendent le reset dans acquire
+                self.rateLimit.block(int(ratelimit_reset))
+                # ne passe pas are exit_or_throw
+                raise RetryRequest(e, failure=False)
 
             # 502 Server Error: Bad Gateway
             elif response.status_code in [502, 503]:
-                load = {
-                    "path": path,
-                    "query": query,
-                    "postdict": postdict,
-                    "timeout": timeout,
-                    "verb": verb,
-                    "rethrow_errors": rethrow_errors,
-                    "max_retries": max_retries,
-                    "exception": e,
-                }
-
-                return self.retry(**load)
+                raise RetryRequest(e)
 
             # in other status_code cases
             exit_or_throw(e, "Unhandled Error", load)
-        except (rq.exceptions.Timeout, rq.exceptions.ConnectionError):
+        except (rq.exceptions.Timeout, rq.exceptions.ConnectionError) as e:
             # Timeout, re-run this request
-            load = {
-                "path": path,
-                "query": query,
-                "postdict": postdict,
-                "timeout": timeout,
-                "verb": verb,
-                "rethrow_errors": rethrow_errors,
-                "max_retries": max_retries,
-            }
+            raise RetryRequest(e)
 
-            return self.retry(**load)
+        return response.json()
 
-        # Reset retry counter on success
-        self.retries = 0
+    def get_placed(self, postdict):
+        """
+        Return the orders of postdict, already placed with their clOrdID.
 
-        return response.json()
+        Le POST qui les a placés a pu répondre trop tard: on les relit par
+        clOrdID au lieu de les renvoyer.  Un ordre ou la liste d'un bulk.
+        """
+        placed = self._curl_bitmex(
+            path="order", query=get_placed_query(postdict), verb="GET"
+        )
+        return get_placed_reply(postdict, placed)
+
+    def send(self, prepped, path, timeout, waited=0):
+        """
+        Send the prepared request to path, recording its duration and size.
+
+        - waited: attente du seau de jetons avant l'envoi, en s
+        """
+        if self.httpMetrics is None:
+            return self.session.send(prepped, timeout=timeout)
+
+        start, response = self.httpMetrics.start(), None
+        try:
+            response = self.session.send(prepped, timeout=timeout)
+        finally:
+            self.httpMetrics.record(
+                prepped.method,
+                path,
+                start,
+                None if response is None else response.status_code,
+                sent=len(prepped.body or b""),
+                received=0 if response is None else len(response.content),
+                rateWait=waited,
+            )
+        return response
+
+    def http_stats(self) -> Optional[pd.DataFrame]:
+        """
+        Return the REST statistics per (verb, path), see HTTPMetrics.stats.
+
+        None si HTTP_METRICS est faux.
+        """
+        if self.httpMetrics is None:
+            return None
+        return self.httpMetrics.frame()
+
+    def pool_stats(self) -> dict:
+        """
+        Return the connexions of the pool and the requests in flight.
+
+        size, opened, idle, requests (cf. get_pool_stats), inflight et peak
+        (pic des requêtes en vol): un peak à size, les threads attendent
+        des connexions, le pool est à agrandir.
+        """
+        stats = get_pool_stats(self.poolAdapter)
+        if self.httpMetrics is not None:
+            stats["inflight"] = self.httpMetrics.inflight
+            stats["peak"] = self.httpMetrics.peak
+        return stats
 
     def amend(self, order, **kwargs):
         """
@@ -329,8 +468,6 @@ class BitMEX(object):
         if "text" in kwargs:
             newOrder["text"] = kwargs["text"]
 
-        # invalide orderStatus
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         return self._curl_bitmex(path="order", postdict=newOrder, verb="PUT")
 
     def authentication_required(fn):
@@ -350,7 +487,6 @@ class BitMEX(object):
     def amend_bulk_orders(self, orders):
         """Amend multiple orders."""
         # Note rethrow; if this fails, we want to catch it and re-tick
-        sleep(HTTP_BULK_RATE_LIMITE)
         return self._curl_bitmex(
             path="order/bulk",
             postdict={"orders": orders},
@@ -371,14 +507,12 @@ class BitMEX(object):
 
             if clIDList:
                 postdict = {"clOrdID": clIDList}
-                sleep(HTTP_SIMPLE_RATE_LIMITE)
                 ret["clID"] = self._curl_bitmex(
                     path=path, postdict=postdict, verb="DELETE"
                 )
 
             if oIDList:
                 postdict = {"orderID": oIDList}
-                sleep(HTTP_SIMPLE_RATE_LIMITE)
                 ret["oID"] = self._curl_bitmex(
                     path=path, postdict=postdict, verb="DELETE"
                 )
@@ -393,7 +527,6 @@ class BitMEX(object):
         else:
             postdict = {"orderID": orderID}
 
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         return self._curl_bitmex(path=path, postdict=postdict, verb="DELETE")
 
     @authentication_required
@@ -402,16 +535,31 @@ class BitMEX(object):
         return self.position(self.symbol)["homeNotional"]
 
     def exit(self):
-        """Close websocket."""
-        self.ws.exit()
+        """Stop the background GETs, close websocket if it is not shared."""
+        self.background.shutdown(wait=False, cancel_futures=True)
+        if self.ownWS:
+            self.ws.exit()
 
     @authentication_required
     @trim_output()
     def margin(self, currency="XBt"):
-        """Get avalaible margin."""
+        """
+        Get avalaible margin.
+
+        Lue dans la table margin du websocket, par REST seulement si le ws
+        est en reconnexion ou n'a pas encore de ligne pour currency.
+        """
+        if not self.ws.stale:
+            margin = self.ws.margin(currency)
+            if margin is not None:
+                return margin
+        return self.http_margin(currency)
+
+    @authentication_required
+    def http_margin(self, currency="XBt"):
+        """Get avalaible margin via HTTP."""
         path = "user/margin"
         query = {"currency": currency}
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         return self._curl_bitmex(path=path, query=query, verb="GET")
 
     @authentication_required
@@ -425,7 +573,6 @@ class BitMEX(object):
     def http_open_orders(self):
         """Get 10 open orders via HTTP. Used on close to ensure we catch them all."""
         path = "order"
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         orders = self._curl_bitmex(
             path=path,
             query={
@@ -442,14 +589,22 @@ class BitMEX(object):
 
     @trim_output()
     def instrument(self, symbol):
-        """Get an instrument's details."""
+        """Get an instrument's details, trimmed for display."""
+        return self.instrument_record(symbol)
+
+    def instrument_record(self, symbol):
+        """
+        Return the live instrument record of symbol, see ws.get_instrument.
+
+        Sans copie: le record est mis à jour en place par le websocket, à
+        lire sans le modifier (Bargain.prices...).
+        """
         return self.ws.get_instrument(symbol)
 
     @trim_output()
     def instruments(self, filtre=None):
         """Get http instruments ?. What for filter ?."""
         query = {"filter": dumps(filtre)} if filtre else {}
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         return self._curl_bitmex(path="instrument", query=query, verb="GET")
 
     @authentication_required
@@ -458,7 +613,6 @@ class BitMEX(object):
         """Set the leverage on an isolated margin position. Not sure about that."""
         path = "position/leverage"
         postdict = {"symbol": symbol, "leverage": leverage}
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         return self._curl_bitmex(
             path=path, postdict=postdict, verb="POST", rethrow_errors=rethrow_errors
         )
@@ -474,7 +628,7 @@ class BitMEX(object):
     def open_orders(self):
         """Get open orders."""
         try:
-            return self.ws.open_orders(self.orderIDPrefix)
+            return self.ws.open_orders(self.orderIDPrefix, self.symbol)
         except Exception:
             self.logger.exception("open_orders")
 
@@ -486,7 +640,7 @@ class BitMEX(object):
         (def None). exectype can be Trade, New, Replaced, Canceled
         """
         try:
-            orders = self.ws.exec_orders(self.orderIDPrefix)
+            orders = self.ws.exec_orders(self.orderIDPrefix, self.symbol)
         except Exception:
             self.logger.exception("exec_orders")
         return [o for o in orders if o["execType"] == exectype] if exectype else orders
@@ -510,12 +664,10 @@ class BitMEX(object):
             raise (e)
         # self.logger.warning(f"postdict={postdict}")
         if asBulk:
-            sleep(HTTP_BULK_RATE_LIMITE)
             return self._curl_bitmex(
                 path="order/bulk", postdict={"orders": [postdict]}, verb="POST"
             )
         else:
-            sleep(HTTP_SIMPLE_RATE_LIMITE)
             retVal = self._curl_bitmex(path="order", postdict=postdict, verb="POST")
             # self.logger.info(f"retVal = {retVal}")
             return retVal
@@ -531,54 +683,61 @@ class BitMEX(object):
         if clOrdID is None:
             clOrdID = newClID()
 
-        postdict = {"symbol": self.symbol, "clOrdID": clOrdID}
-
-        # setting the orderQty
-        if side:
-            orderQty = -orderQty if "sell" == side.lower() else orderQty
-        orderQty = round(orderQty)
+        self.checking_positive_value(opts, "price", "stopPx")
 
         # we handle number of contracts not crypto
         # on suppose orderQty >=1 et on ne veux pas afficher 0
         # 'displayQty': int(random.random() * (abs(orderQty) - 1)) + 1  # crypt_qty
-        postdict["orderQty"] = orderQty
-
-        self.checking_positive_value(opts, "price", "stopPx")
-
-        # adding building arguments
-        # opts = {k:v for (k,v) in opts.items() if v is not None}
-        # postdict.update(opts)
-        for k, v in opts.items():
-            if v is not None:
-                postdict[k] = v
-
-        return postdict
+        return to_postdict(self.symbol, side, orderQty, clOrdID, opts)
 
     @authentication_required
     def create_bulk_orders(self, orders):
-        """Create multiple orders. chaque ordre est un tuble (side, orderQty), orders est une listede tuple"""
+        """
+        Create multiple orders in one request.
+
+        Chaque ordre est un tuple (side, orderQty) ou un dict des arguments de
+        create_order (side, orderQty, clOrdID, price, stopPx, ordType...).
+        """
         oes = []
         for order in orders:
-            o = self.create_order(*order)
+            if isinstance(order, dict):
+                o = self.create_order(**order)
+            else:
+                o = self.create_order(*order)
             if self.postOnly:
                 o["execInst"] = "ParticipateDoNotInitiate"
-                oes.append(o)
-        sleep(HTTP_BULK_RATE_LIMITE)
+            oes.append(o)
         return self._curl_bitmex(
             path="order/bulk", postdict={"orders": oes}, verb="POST"
         )
 
     @authentication_required
     def position(self, symbol):
-        """Get your open position."""
+        """Get your open position, via HTTP while the websocket is stale."""
         try:
+            if self.ws.stale:
+                return self.http_position(symbol)
             return self.ws.position(symbol)
         except Exception as e:
-            self.logger.exception("{e}: position error")
+            self.logger.exception(f"{e}: position error")
+
+    @authentication_required
+    def http_position(self, symbol):
+        """Get the position of symbol via HTTP, stubbed like ws.position."""
+        query = {"filter": dumps({"symbol": symbol})}
+        positions = self._curl_bitmex(path="position", query=query, verb="GET")
+        if positions:
+            return positions[0]
+        return {
+            "avgCostPrice": 0,
+            "avgEntryPrice": 0,
+            "currentQty": 0,
+            "symbol": symbol,
+        }
 
     def recent_trades(self):
         try:
-            return self.ws.recent_trades()
+            return self.ws.recent_trades(self.symbol)
         except Exception:
             self.logger.exception("recent_trades")
 
@@ -599,7 +758,6 @@ class BitMEX(object):
     def withdraw(self, amount, fee, address):
         path = "user/requestWithdrawal"
         postdict = {"amount": amount, "fee": fee, "currency": "XBt", "address": address}
-        sleep(HTTP_SIMPLE_RATE_LIMITE)
         return self._curl_bitmex(
             path=path, postdict=postdict, verb="POST", max_retries=0
         )
@@ -609,44 +767,6 @@ class BitMEX(object):
         positiveValues = [dico[k] > 0 for k in keys if dico.get(k, False)]
         assert all(positiveValues), f"All Prices {keys} must be positive in {dico}"
 
-    def retry(
-        self,
-        path,
-        error=None,
-        query=None,
-        postdict=None,
-        timeout=None,
-        verb=None,
-        rethrow_errors=False,
-        max_retries=None,
-        fast=False,
-        exception=None,
-    ):
-        """Renvois la réponse du borker après un retry
-        Relance l'ordre un certain nombre de fois, un après avoir attendu quelques secondes.
-        Nécessite les même argurments que _curl_bitmex et dans le même ordre"""
-        self.retries += 1
-
-        if self.retries >= max_retries:
-            raise ke.MaxRetries(
-                exception, load=postdict, extra=f"{path}: Max retries hit"
-            )
-
-        tps1 = random.uniform(1, 2)
-        tps2 = random.uniform(4, 10) if self.retries > 3 else 0
-        tps3 = random.uniform(20, 80) if self.retries > 6 else 0
-        self.logger.warning(
-            f"retry {verb} {path} {self.retries}/{max_retries}: "
-            f"Pause de {round_sprice(tps1+tps2+tps3, self.symbol)} sec:"
-            f' postdict={dumps(postdict or "")}'
-        )
-        # going to sleep
-        sleep(tps1) if fast else sleep(round_sprice(tps1 + tps2 + tps3, self.symbol))
-
-        return self._curl_bitmex(
-            path, query, postdict, timeout, verb, rethrow_errors, max_retries
-        )
-
     def change_orderId(self, postdict):
         """Change l'id d'un ordre pour que le retry ne pose pas de problème."""
 
@@ -706,11 +826,90 @@ class BitMEX(object):
 
         verb = "GET"
 
-        if count < 750:
-            sleep(HTTP_SIMPLE_RATE_LIMITE)
-            trades = self._curl_bitmex(path, query=query, verb=verb)
-        else:
-            # paginer avec start et end date
-            sleep(HTTP_SIMPLE_RATE_LIMITE)
-            trades = self._curl_bitmex(path, query=query, verb=verb)
+        # bitmex renvoie au plus 1000 bins par requête, on pagine avec start
+        # (cf. BucketCache pour de longues périodes, en parallèle et en cache)
+        trades = []
+        while len(trades) < count:
+            query.update(count=min(1000, count - len(trades)), start=len(trades))
+            page = self._curl_bitmex(path, query=query, verb=verb)
+            trades += page
+            if len(page) < query["count"]:
+                break
         return trades
+
+
+def is_duplicate(verb, postdict, message) -> bool:
+    """Tell if a 400 error of message refuses orders already placed."""
+    return verb == "POST" and bool(postdict) and "duplicate clordid" in message
+
+
+def get_placed_query(postdict) -> dict:
+    """Return the query of the orders of postdict by clOrdID."""
+    clOrdIDs = [o["clOrdID"] for o in postdict.get("orders", [postdict])]
+    return {"filter": dumps({"clOrdID": clOrdIDs}), "count": len(clOrdIDs)}
+
+
+def get_placed_reply(postdict, placed):
+    """
+    Return the placed orders in the order of postdict.
+
+    Comme la réponse du POST: un ordre, ou une liste pour un bulk.  Lève
+    ke.InvalidOrder si un des clOrdID n'est pas trouvé.
+    """
+    orders = postdict.get("orders", [postdict])
+    byID = {o["clOrdID"]: o for o in placed or []}
+    missing = [o["clOrdID"] for o in orders if o["clOrdID"] not in byID]
+    if missing:
+        raise ke.InvalidOrder(
+            "Duplicate clOrdID", load=postdict, extra=f"{missing} not found"
+        )
+    replies = [byID[o["clOrdID"]] for o in orders]
+    return replies if "orders" in postdict else replies[0]
+
+
+def get_bad_request_error(e, load, message):
+    """
+    Return the exception for a 400 error of message, None if worth a retry.
+
+    - message: le message d'erreur de bitmex, en minuscules.
+    Un clOrdID en double sur un POST est traité avant, cf. get_placed.
+    """
+    # This request has expired can happend when server is overloaded
+    if "this request has expired" in message:
+        return None
+
+    if "insufficient available balance" in message:
+        return ke.InsufficientBalance(e, load, message)
+
+    if "invalid ordstatus" in message:
+        # probablement un changement trop brusque dans un amend on ignore l'ordre
+        # problème car attente de valeur retour
+        return ke.InvalidOrdStatus(e, load, message)
+
+    if "invalid orderid" in message:
+        # probablement un changement trop brusque dans un amend on ignore l'ordre
+        return ke.InvalidOrderID(e, load, message)
+
+    if "invalid orderqty" in message:
+        # Une quantité trop petite probablement.  On envois à Chronos
+        # pour vérifier
+        return ke.InvalidOrderQty(e, load, message)
+
+    # other 400 error raise
+    return ke.InvalidOrder(e, load, message)
+
+
+def get_ws_class(transport=WS_TRANSPORT):
+    """
+    Return the websocket class for transport.
+
+    - "thread": BitMEXWebsocket, websocket-client dans un thread,
+    - "asyncio": AsyncBitMEXWebsocket, nécessite le paquet websockets.
+    """
+    if transport == "thread":
+        return BitMEXWebsocket
+    if transport == "asyncio":
+        from kolaBitMEXBot.kola.connexion.async_ws import AsyncBitMEXWebsocket
+
+        return AsyncBitMEXWebsocket
+    raise ValueError(f"transport={transport} should be 'thread' or 'asyncio'")
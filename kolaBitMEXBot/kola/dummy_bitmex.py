@@ -82,6 +82,9 @@ class DummyBitMEX:
             "lastPrice": markPrice - 0.25,
         }
 
+    def instrument_record(self, symbol=None):
+        return self.instrument(symbol)
+
     def cancel(self, ids):
         pass
 
@@ -197,6 +200,9 @@ class DummyBitMEX:
             "triggered": self.rnd_trigStatus(execType),
         }
 
+    def create_bulk_orders(self, orders):
+        return [self.place(**order) for order in orders]
+
     def amend(self, orderID, **kwargs):
         self.logger.debug(f"Dummy Ammending with {orderID, kwargs}")
         new_datum = self.new_datum()
@@ -208,6 +214,13 @@ class DummyBitMEX:
             "ordStatus": self.rnd_ordStatus(execType),
         }
 
+    def amend_bulk_orders(self, orders):
+        self.logger.debug(f"Dummy bulk ammending {orders}")
+        return [
+            self.amend(o["orderID"], **{k: v for k, v in o.items() if k != "orderID"})
+            for o in orders
+        ]
+
     def rnd_ordStatus(self, exectype):
         """Renvois un status au hasard mais avec fote chance de filled        """
         if exectype in ["Canceled", "New"]:
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Historique des trades agrégés (trade/bucketed) avec un cache sur disque.
+
+Le temps est découpé en pages fixes de PAGE_SIZE bins, alignées sur epoch:
+une période demandée couvre quelques pages, celles qui manquent au cache
+sont téléchargées en parallèle (dans le budget du seau de jetons de la clé,
+cf. ratelimit) et rangées une par fichier:
+`<cacheDir>/<symbol>/<binSize>/<début de page>.<fmt>`.
+Seules les pages terminées sont gardées, une même période est ensuite lue
+sur le disque.  fmt est "parquet" ou "feather" (nécessite pyarrow).
+"""
+from typing import List, Optional
+import asyncio
+import os
+
+import pandas as pd
+
+from kolaBitMEXBot.kola.connexion.async_rest import AsyncBitMEXRest
+from kolaBitMEXBot.kola.settings import BUCKET_CACHE_DIR, BUCKET_CACHE_FORMAT
+from kolaBitMEXBot.kola.utils.logfunc import get_logger
+
+# nb de bins par requête, le max de bitmex
+PAGE_SIZE = 1000
+BIN_SIZES = {
+    "1m": pd.Timedelta(minutes=1),
+    "5m": pd.Timedelta(minutes=5),
+    "1h": pd.Timedelta(hours=1),
+    "1d": pd.Timedelta(days=1),
+}
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+class BucketCache:
+    """
+    Télécharge et garde les trades agrégés par symbol et binSize.
+
+    get (ou await get_async) renvoie un DataFrame indexé par timestamp (la
+    fin de chaque bin, en UTC) avec les colonnes de bitmex: open, high, low,
+    close, trades, volume, vwap...
+    """
+
+    def __init__(
+        self,
+        rest: AsyncBitMEXRest,
+        cacheDir: str = BUCKET_CACHE_DIR,
+        fmt: str = BUCKET_CACHE_FORMAT,
+        logger=None,
+    ):
+        """
+        Init the cache.
+
+        - rest: le client qui télécharge les pages manquantes,
+        - fmt: "parquet" ou "feather".
+        """
+        if fmt not in ("parquet", "feather"):
+            raise ValueError(f"fmt={fmt} should be 'parquet' or 'feather'")
+        self.rest = rest
+        self.cacheDir = cacheDir
+        self.fmt = fmt
+        self.logger = get_logger(logger, name=__name__, sLL="INFO")
+
+    def __repr__(self):
+        return f"BucketCache(cacheDir={self.cacheDir}, fmt={self.fmt})"
+
+    def get(self, symbol, binSize, start, end=None, columns=None) -> pd.DataFrame:
+        """Return the buckets from start to end, see get_async."""
+
+        async def main():
+            try:
+                return await self.get_async(symbol, binSize, start, end, columns)
+            finally:
+                # la session est liée à la boucle de asyncio.run
+                await self.rest.close()
+
+        return asyncio.run(main())
+
+    async def get_async(
+        self, symbol, binSize, start, end=None, columns=None
+    ) -> pd.DataFrame:
+        """
+        Return the buckets of symbol whose timestamp is in [start, end].
+
+        - binSize: "1m", "5m", "1h" ou "1d",
+        - start, end: dates (str ou Timestamp, UTC par défaut), end def. now,
+        - columns: les colonnes à garder, def. toutes.
+        """
+        start, end = as_utc(start), as_utc(end)
+        pages = get_pages(binSize, start, end)
+
+        frames = [self.read_page(symbol, binSize, p) for p in pages]
+        missing = [p for p, df in zip(pages, frames) if df is None]
+        if missing:
+            self.logger.info(
+                f"Downloading {len(missing)}/{len(pages)} pages of {symbol} {binSize}"
+            )
+            fetched = await asyncio.gather(
+                *[self.fetch_page(symbol, binSize, p) for p in missing]
+            )
+            byPage = dict(zip(missing, fetched))
+            frames = [byPage[p] if df is None else df for p, df in zip(pages, frames)]
+
+        df = pd.concat(frames).sort_index()
+        df = df.loc[(start <= df.index) & (df.index <= end)]
+        return df if columns is None else df[columns]
+
+    def page_path(self, symbol, binSize, pageStart) -> str:
+        """Return the cache file of the page starting at pageStart."""
+        name = f"{pageStart.strftime('%Y%m%dT%H%M')}.{self.fmt}"
+        return os.path.join(self.cacheDir, symbol, binSize, name)
+
+    def read_page(self, symbol, binSize, pageStart) -> Optional[pd.DataFrame]:
+        """Return the cached page or None."""
+        path = self.page_path(symbol, binSize, pageStart)
+        if not os.path.exists(path):
+            return None
+        if self.fmt == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_feather(path).set_index("timestamp")
+
+    def write_page(self, symbol, binSize, pageStart, df):
+        """Write the page to the cache, through a temporary file."""
+        path = self.page_path(symbol, binSize, pageStart)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        if self.fmt == "parquet":
+            df.to_parquet(tmp)
+        else:
+            df.reset_index().to_feather(tmp)
+        os.replace(tmp, path)
+
+    async def fetch_page(self, symbol, binSize, pageStart) -> pd.DataFrame:
+        """Download the page starting at pageStart, cache it if it's over."""
+        binDelta = BIN_SIZES[binSize]
+        pageEnd = pageStart + (PAGE_SIZE - 1) * binDelta
+        query = {
+            "symbol": symbol,
+            "binSize": binSize,
+            "count": PAGE_SIZE,
+            "startTime": pageStart.isoformat(),
+            "endTime": pageEnd.isoformat(),
+            "reverse": "false",
+        }
+        rows = await self.rest.curl_bitmex("trade/bucketed", query=query, verb="GET")
+        df = to_frame(rows)
+
+        # le dernier bin de la page doit être clos pour ne plus changer
+        if pageEnd < pd.Timestamp.now(tz="UTC"):
+            self.write_page(symbol, binSize, pageStart, df)
+        return df
+
+
+def get_pages(binSize, start, end) -> List[pd.Timestamp]:
+    """Return the starts of the pages covering [start, end]."""
+    if binSize not in BIN_SIZES:
+        raise ValueError(f"binSize={binSize} should be in {list(BIN_SIZES)}")
+    if end < start:
+        raise ValueError(f"end={end} is before start={start}")
+    span = PAGE_SIZE * BIN_SIZES[binSize]
+    first, last = (start - EPOCH) // span, (end - EPOCH) // span
+    return [EPOCH + k * span for k in range(first, last + 1)]
+
+
+def to_frame(rows) -> pd.DataFrame:
+    """Return the rows of trade/bucketed as a DataFrame indexed by timestamp."""
+    if not rows:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="timestamp", tz="UTC"))
+    df = pd.DataFrame(rows)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    return df.set_index("timestamp")
+
+
+def as_utc(date) -> pd.Timestamp:
+    """Return date as a UTC Timestamp, now if None."""
+    if date is None:
+        return pd.Timestamp.now(tz="UTC")
+    date = pd.Timestamp(date)
+    return date.tz_localize("UTC") if date.tz is None else date.tz_convert("UTC")
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Regroupement des amends en un seul amend_bulk_orders.
+
+Les trailstops amendent leur stopPx à chaque mouvement du marché.  Au lieu
+d'un PUT order par amend, Chronos les confie à un AmendCoalescer qui les
+garde window secondes puis les envoie ensemble.  Pour chaque orderID seul
+le dernier prix demandé est envoyé, et la réponse est renvoyée à chacun des
+loads qui l'ont demandé.
+"""
+from threading import Lock, Timer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from kolaBitMEXBot.kola.settings import AMEND_WINDOW
+from kolaBitMEXBot.kola.utils.logfunc import get_logger
+import kolaBitMEXBot.kola.utils.exceptions as ke
+
+
+class AmendCoalescer:
+    """
+    Regroupe les amends reçus pendant window secondes.
+
+    add(load, amend) met l'amend en attente, le premier d'une fenêtre arme
+    un Timer qui appelle flush.  flush envoie les amends et appelle
+    on_reply(load, reply) pour chaque load, reply étant l'ordre amendé ou
+    None si l'amend a échoué (ordre déjà déclenché ou annulé...).  on_reply
+    est appelé dans le thread du Timer, cf. Chronos.on_amended.
+    """
+
+    def __init__(
+        self,
+        brg,
+        on_reply: Callable[[dict, Optional[dict]], None],
+        window: float = AMEND_WINDOW,
+        logger=None,
+    ):
+        self.brg = brg
+        self.on_reply = on_reply
+        self.window = window
+        self.logger = get_logger(logger, name=__name__, sLL="INFO")
+        self._lock = Lock()
+        self._timer: Optional[Timer] = None
+        # orderID: (dernier amend demandé, loads en attente de la réponse)
+        self.pending: Dict[str, Tuple[dict, List[dict]]] = {}
+
+    def __repr__(self):
+        return f"AmendCoalescer(window={self.window}, pending={len(self.pending)})"
+
+    def add(self, load: dict, amend: dict):
+        """Queue the amend (with an orderID) of load, the latest one wins."""
+        orderID = amend["orderID"]
+        with self._lock:
+            if orderID in self.pending:
+                _, loads = self.pending[orderID]
+                self.logger.debug(f"Replacing the pending amend of {orderID}")
+                self.pending[orderID] = (amend, loads + [load])
+            else:
+                self.pending[orderID] = (amend, [load])
+
+            if self._timer is None:
+                self._timer = Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Send the pending amends and route their replies."""
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self._timer = None
+        if not pending:
+            return
+
+        amends = [amend for amend, _ in pending.values()]
+        self.logger.info(f"Amending {len(amends)} order(s) in bulk: {amends}")
+        try:
+            replies = self.brg.bto.amend_bulk_orders(amends)
+        except (ke.InvalidOrdStatus, ke.InvalidOrderID) as e:
+            # un ordre déjà déclenché fait échouer tout le lot
+            self.logger.warning(f"Bulk amend failed ({e}), amending one by one.")
+            replies = [self.amend_one(amend) for amend in amends]
+        except Exception:
+            self.logger.exception(f"Bulk amend failed for {amends}")
+            replies = []
+
+        byID = {r["orderID"]: r for r in replies if r}
+        for orderID, (_, loads) in pending.items():
+            reply = byID.get(orderID)
+            for load in loads:
+                self.on_reply(load, reply)
+
+    def amend_one(self, amend: dict) -> Optional[dict]:
+        """Amend a single order, return None if it can't be amended."""
+        fields = {k: v for k, v in amend.items() if k != "orderID"}
+        try:
+            return self.brg.bto.amend({"orderID": amend["orderID"]}, **fields)
+        except (ke.InvalidOrdStatus, ke.InvalidOrderID):
+            return None
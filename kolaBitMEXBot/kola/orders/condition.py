@@ -231,7 +231,13 @@ class Condition:
         Vérifie avec les données de la prise web si la condition has t_value.
 
         Si t_value is false, retourne inverse le test.
+        Renvoie False tant que les données du marché sont périmées (ws en
+        reconnexion), on ne peut rien affirmer sur ces prix.
         """
+        if self.brg.is_stale():
+            self.throttled_log("Stale market data, condition not evaluated", "WARNING")
+            return False
+
         ret = None
         try:
             ret = all(self.evalue_les_conditions())
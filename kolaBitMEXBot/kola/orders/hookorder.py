@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 """Hooked Order"""
 from itertools import product
-from time import sleep
 from pandas import DataFrame
 
 from kolaBitMEXBot.kola.utils.general import trim_dic
@@ -108,7 +107,8 @@ class HookOrder(OrderConditionned):
                     break
 
             # sleep(2+randint(5))  # mitigate rate limite
-            sleep(1.05)
+            # le hook dépend aussi des exécutions des autres ordres
+            self.wait_for_market(("instrument", "execution"))
 
         reason = self.explain()
 
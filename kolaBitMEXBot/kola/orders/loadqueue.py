@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+La file des loads de Chronos, par priorité.
+
+Une Queue (mêmes put, get, get_nowait...) qui rend d'abord les loads les
+plus urgents plutôt que les plus anciens, cf. PRIORITIES: un cancel ou
+l'amend du stop d'un TrailStop ne doit pas attendre derrière les entrées
+envoyées par une relance.  Dans une classe, les loads sortent dans leur
+ordre d'arrivée.
+Pour qu'une classe basse ne soit pas affamée, un load gagne une classe
+toutes les aging secondes d'attente: on sert le load dont rang - attente /
+aging est le plus petit, le plus urgent à égalité.  Sans aging la priorité
+est stricte.
+Pour chaque classe: la profondeur de la file, son pic, le nombre de loads
+servis et leur attente en histogramme (cf. StreamHistogram).
+"""
+from collections import deque
+from queue import Queue
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple
+
+from pandas import DataFrame
+
+from kolaBitMEXBot.kola.connexion.wsmetrics import StreamHistogram
+from kolaBitMEXBot.kola.settings import LOAD_AGING
+from kolaBitMEXBot.kola.utils.orderfunc import get_order_from
+
+# les classes de loads, de la plus urgente à la moins urgente
+PRIORITIES = ("cancel", "amend", "stop", "entry")
+# les ordres déclenchés à un stopPx, stops et sorties (hookorder...)
+STOP_TYPES = {"Stop", "StopLimit", "MarketIfTouched", "LimitIfTouched"}
+# les ordres qui réduisent une position
+CLOSE_INSTS = ("Close", "ReduceOnly")
+
+
+def get_priority(rcvLoad) -> int:
+    """Return the rank of rcvLoad's class in PRIORITIES."""
+    order = get_order_from(rcvLoad)
+    ordType = order.get("ordType") or ""
+    if ordType == "cancel":
+        return 0
+    if ordType.startswith("amend"):
+        return 1
+    if ordType in STOP_TYPES or order.get("stopPx") is not None:
+        return 2
+    execInst = order.get("execInst") or ""
+    if any(inst in execInst for inst in CLOSE_INSTS):
+        return 2
+    return 3
+
+
+class ClassMetrics:
+    """Les compteurs et l'histogramme des attentes d'une classe."""
+
+    def __init__(self):
+        self.depth = 0
+        self.peak = 0
+        self.count = 0
+        self.wait = StreamHistogram()  # ms entre le put et le get
+
+
+class LoadQueue(Queue):
+    """
+    Une file de loads servis par priorité, cf. get_priority.
+
+    Comme PriorityQueue, surcharge les _init, _qsize, _put et _get appelés
+    par Queue sous son mutex.
+    """
+
+    def __init__(self, maxsize: int = 0, aging: Optional[float] = LOAD_AGING):
+        """
+        - aging: s d'attente qui font gagner une classe à un load,
+        0 ou None pour une priorité stricte.
+        """
+        self.aging = aging
+        Queue.__init__(self, maxsize)
+
+    def __repr__(self):
+        depths = {name: m.depth for name, m in zip(PRIORITIES, self.metrics)}
+        return f"LoadQueue(aging={self.aging}, {depths})"
+
+    def _init(self, maxsize):
+        # (t d'arrivée, load) par classe
+        self.queues: List[Deque[Tuple[float, object]]] = [
+            deque() for _ in PRIORITIES
+        ]
+        self.metrics = [ClassMetrics() for _ in PRIORITIES]
+
+    def _qsize(self):
+        return sum(len(q) for q in self.queues)
+
+    def _put(self, item):
+        rank = get_priority(item)
+        self.queues[rank].append((monotonic(), item))
+        metrics = self.metrics[rank]
+        metrics.depth += 1
+        metrics.peak = max(metrics.peak, metrics.depth)
+
+    def _get(self):
+        t = monotonic()
+        best, bestScore = None, None
+        for rank, queue in enumerate(self.queues):
+            if not queue:
+                continue
+            score = rank - (t - queue[0][0]) / self.aging if self.aging else rank
+            if best is None or score < bestScore:
+                best, bestScore = rank, score
+            if not self.aging:
+                break
+
+        putTime, item = self.queues[best].popleft()
+        metrics = self.metrics[best]
+        metrics.depth -= 1
+        metrics.count += 1
+        metrics.wait.record((t - putTime) * 1e3)
+        return item
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Return the statistics of each class.
+
+        depth et peak (loads en file), count (loads servis), wait_p50,
+        wait_p99, wait_max et wait_mean (ms entre le put et le get).
+        """
+        with self.mutex:
+            return {
+                name: {
+                    "depth": m.depth,
+                    "peak": m.peak,
+                    "count": m.count,
+                    "wait_p50": m.wait.quantile(0.5),
+                    "wait_p99": m.wait.quantile(0.99),
+                    "wait_max": m.wait.maximum(),
+                    "wait_mean": m.wait.mean(),
+                }
+                for name, m in zip(PRIORITIES, self.metrics)
+            }
+
+    def frame(self) -> DataFrame:
+        """Return the stats as a DataFrame indexed by class."""
+        return DataFrame.from_dict(self.stats(), orient="index")
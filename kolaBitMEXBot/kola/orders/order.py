@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Les ordres et les loads envoyés à Chronos.
+
+Un Order garde ses champs dans des __slots__ (pas de dict par ordre) et se
+lit comme le dict qu'il remplace: order["price"], order.get("stopPx"),
+"price" in order, **order...  Un champ à None est absent, comme pour
+BitMEX.create_order qui ne les envoie pas.  Les champs inconnus (pegs...)
+vont dans extra.
+Les copies sont explicites: get_load envoie une copie de l'ordre du sender
+(qui peut l'amender pendant que Chronos le traite), amend renvoie une copie
+modifiée.  Les valeurs sont des str et des nombres, une copie de surface
+suffit.  Chronos lit les champs sans modifier l'ordre (plus de copie pickle)
+et place_opts ou postdict en font les arguments des requêtes.
+"""
+from operator import attrgetter
+from typing import Any, Dict, Optional
+
+# les champs de l'ordre, dans l'ordre de leur affichage
+ORDER_FIELDS = (
+    "clOrdID",
+    "side",
+    "orderQty",
+    "ordType",
+    "price",
+    "stopPx",
+    "execInst",
+    "text",
+    "orderID",
+    "newPrice",
+    "oDelta",
+)
+# champs lus par Chronos mais pas envoyés à bitmex
+BOT_FIELDS = ("newPrice", "oDelta")
+# les options du postdict, après clOrdID, side et orderQty
+POST_OPTS = tuple(k for k in ORDER_FIELDS[3:] if k not in BOT_FIELDS)
+# les options des place_*, les prix étant passés à part
+PLACE_OPTS = ("clOrdID", "execInst", "text")
+# lisent tous les champs (ou les options) d'un coup, en un tuple
+_fields = attrgetter(*ORDER_FIELDS)
+_postOpts = attrgetter(*POST_OPTS)
+_placeOpts = attrgetter(*PLACE_OPTS)
+
+
+def to_postdict(symbol: str, side, orderQty, clOrdID, opts: dict) -> dict:
+    """
+    Return the postdict of an order for the REST api.
+
+    orderQty est en contrats, négatif pour un sell; les opts à None ne
+    sont pas envoyés.
+    """
+    postdict = {"symbol": symbol, "clOrdID": clOrdID}
+    if side:
+        orderQty = -orderQty if "sell" == side.lower() else orderQty
+    postdict["orderQty"] = round(orderQty)
+    for k, v in opts.items():
+        if v is not None:
+            postdict[k] = v
+    return postdict
+
+
+class Order:
+    """Un ordre du bot, cf. ORDER_FIELDS."""
+
+    __slots__ = ORDER_FIELDS + ("extra",)
+
+    def __init__(self, **fields):
+        self.clOrdID = self.side = self.orderQty = self.ordType = None
+        self.price = self.stopPx = self.execInst = self.text = None
+        self.orderID = self.newPrice = self.oDelta = None
+        self.extra: Optional[Dict[str, Any]] = None
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, order) -> "Order":
+        """Return a copy of order, an Order or a dict."""
+        if isinstance(order, Order):
+            return order.copy()
+        return cls(**order)
+
+    def copy(self) -> "Order":
+        """Return a shallow copy, the values are immutables."""
+        new = Order.__new__(Order)
+        (
+            new.clOrdID,
+            new.side,
+            new.orderQty,
+            new.ordType,
+            new.price,
+            new.stopPx,
+            new.execInst,
+            new.text,
+            new.orderID,
+            new.newPrice,
+            new.oDelta,
+        ) = (
+            self.clOrdID,
+            self.side,
+            self.orderQty,
+            self.ordType,
+            self.price,
+            self.stopPx,
+            self.execInst,
+            self.text,
+            self.orderID,
+            self.newPrice,
+            self.oDelta,
+        )
+        new.extra = None if self.extra is None else dict(self.extra)
+        return new
+
+    def amend(self, **changes) -> "Order":
+        """Return a copy of the order with changes, self is unchanged."""
+        new = self.copy()
+        for key, value in changes.items():
+            new[key] = value
+        return new
+
+    def to_dict(self) -> dict:
+        """Return the set fields in a new dict."""
+        return self._set_fields(ORDER_FIELDS, _fields(self))
+
+    def place_opts(self) -> dict:
+        """Return the options set for the place_* functions, see PLACE_OPTS."""
+        return self._set_fields(PLACE_OPTS, _placeOpts(self))
+
+    def _set_fields(self, names, values) -> dict:
+        """Return the names with a value and the extra fields set."""
+        order = {}
+        for k, v in zip(names, values):
+            if v is not None:
+                order[k] = v
+        if self.extra:
+            order.update((k, v) for k, v in self.extra.items() if v is not None)
+        return order
+
+    def postdict(self, symbol: str) -> dict:
+        """Return the postdict to place the order, see BitMEX.create_order."""
+        opts = dict(zip(POST_OPTS, _postOpts(self)))
+        if self.extra:
+            opts.update(self.extra)
+        return to_postdict(symbol, self.side, self.orderQty, self.clOrdID, opts)
+
+    # ### lecture et écriture comme un dict ###
+
+    def __getitem__(self, key):
+        if key in ORDER_FIELDS:
+            value = getattr(self, key)
+        elif self.extra is not None and key in self.extra:
+            value = self.extra[key]
+        else:
+            value = None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in ORDER_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in ORDER_FIELDS:
+            setattr(self, key, None)
+        else:
+            del self.extra[key]
+
+    def __contains__(self, key) -> bool:
+        if key in ORDER_FIELDS:
+            return getattr(self, key) is not None
+        return self.extra is not None and self.extra.get(key) is not None
+
+    def get(self, key, default=None):
+        """Return the field key or default if it is not set."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        """Remove the field key and return it, see dict.pop."""
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def keys(self):
+        """Return the names of the set fields."""
+        return self.to_dict().keys()
+
+    def items(self):
+        """Return the (name, value) of the set fields."""
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, Order):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == {k: v for k, v in other.items() if v is not None}
+        return NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self):
+        return f"Order({self.to_dict()})"
+
+
+class Load:
+    """
+    Ce qu'un sender met dans la file de Chronos.
+
+    - order: la copie de l'ordre à traiter,
+    - sender: l'OrderConditionned qui l'envoie,
+    - future: reçoit la validation de l'ordre (cf. Chronos.validate).
+    Se lit aussi comme un dict: load["order"], load.get("future").
+    """
+
+    __slots__ = ("order", "sender", "timeOut", "symbol", "future")
+
+    def __init__(self, order, sender=None, timeOut=None, symbol=None, future=None):
+        self.order = order
+        self.sender = sender
+        self.timeOut = timeOut
+        self.symbol = symbol
+        self.future = future
+
+    def __getitem__(self, key):
+        if key not in Load.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in Load.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key) -> bool:
+        return key in Load.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        """Return the attribute key or default if it is None."""
+        value = getattr(self, key, None) if key in Load.__slots__ else None
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"Load({self.order}, symbol={self.symbol}, timeOut={self.timeOut})"
@@ -3,15 +3,15 @@ from kolaBitMEXBot.kola.utils.logfunc import get_logger, throttled_log, get_logf
 from kolaBitMEXBot.kola.utils.orderfunc import (
     newClID,
     toggle_order,
-    get_order_from,
     remove_execInst,
 )
 from kolaBitMEXBot.kola.utils.datefunc import now
 from kolaBitMEXBot.kola.utils.general import trim_dic, compteur
 from kolaBitMEXBot.kola.utils.datefunc import setdef_timedelta
 from kolaBitMEXBot.kola.orders.condition import Condition
+from kolaBitMEXBot.kola.orders.order import Load, Order
 
-from time import sleep
+from concurrent.futures import Future
 from threading import Thread
 import pandas as pd
 
@@ -116,7 +116,7 @@ class OrderConditionned(Thread):
                 break
 
             # sleep(2+randint(5))  # mitigate rate limite
-            sleep(1.05)
+            self.wait_for_market()
 
         reason = self.explain()
 
@@ -128,6 +128,15 @@ class OrderConditionned(Thread):
         # on renvois les informations sur cet ordre pour les chained orders
         return execValidation
 
+    def wait_for_market(self, tables=("instrument",), timeout=1.05):
+        """
+        Wait for a change of the market before checking the condition again.
+
+        Le ws nous réveille dès que l'instrument de self.symbol change,
+        au plus tard après timeout secondes pour les conditions de temps.
+        """
+        return self.condition.brg.wait_for_change(tables, timeout, ID=self.symbol)
+
     def get_logfunc(self, level_="INFO"):
         """Return the object logger with level_."""
         return get_logfunc(self.logger, level_)
@@ -161,17 +170,22 @@ class OrderConditionned(Thread):
     def cancel_order(self):
         """Envois une demande pour annuler l'ordre en cours via chronos."""
         load, _order = self.get_load()
-        _order["ordType"] = "cancel"
+        _order.ordType = "cancel"  # self.order garde son type
         self.send_queue.put(load)
-        return self.wait_for_broker_reply()
+        return self.wait_for_broker_reply(load)
 
     def get_load(self, order=None):
-        """Set the default load pour this order."""
+        """
+        Set the default load pour this order.
+
+        Le load part avec une copie de l'ordre: self.order peut être amendé
+        pendant que Chronos le traite.  Chronos rend la validation de
+        l'ordre dans load.future.
+        """
         # un identifiant pour le suivi
         assert self.symbol is not None, f"order={order}"
-        load = {"sender": self, "timeOut": self.timeOut, "symbol": self.symbol}
-        _order = order if order else self.order
-        load["order"] = _order
+        _order = Order.from_dict(order if order else self.order)
+        load = Load(_order, self, self.timeOut, self.symbol, Future())
         return load, _order
 
     def send_order(self, order=None):
@@ -182,45 +196,33 @@ class OrderConditionned(Thread):
         """
         load, _order = self.get_load(order)
 
-        ordType = _order.get("ordType", None)
-        assert ordType, f"Should have an order Type here but order={order}"
+        assert _order.ordType, f"Should have an order Type here but order={order}"
 
         # check the execInst:
-        execInst = _order.get("execInst", None)
-        if execInst:
-            _order["execInst"] = remove_execInst(execInst, "lastMidPrice")
+        if _order.execInst:
+            _order.execInst = remove_execInst(_order.execInst, "lastMidPrice")
 
         self.logger.debug(f"Envoi à Chronos du load={load}")
         self.send_queue.put(load)
 
-        return self.wait_for_broker_reply()
+        return self.wait_for_broker_reply(load)
 
-    def wait_for_broker_reply(self):
+    def wait_for_broker_reply(self, load):
         """
-        Wait for the borker reply.
+        Wait for the borker reply to load.
 
-        Should only get a validated orders but if we get error we could cancel."""
+        Should only get a validated orders but if we get error we could cancel.
+        Chronos met la validation dans le future du load (cf. Chronos.validate),
+        on n'attend que la nôtre.
+        """
         self.logger.debug(f"{self} waiting for validation")
-
-        while True:
-            rcvLoad = self.valid_queue.get(block=True)
-            execValidation = rcvLoad["execValidation"]
-            try:
-                order = get_order_from(rcvLoad["exgLoad"])
-            except Exception as e:
-                self.logger.error(f"{self}, rcvLoad={rcvLoad}")
-                raise (e)
-
-            if self.oclid == order["clOrdID"]:
-                self.logger.debug(
-                    f"_Validation {bool(execValidation)}_ for order={order},"
-                )
-                # Normalement execValidation est une reply
-                return execValidation
-            else:
-                # received something that's not for us.  replace in queue
-                self.valid_queue.put(rcvLoad)
-                sleep(0.1)
+        rcvLoad = load.future.result()
+        execValidation = rcvLoad["execValidation"]
+        self.logger.debug(
+            f"_Validation {bool(execValidation)}_ for order={load.order},"
+        )
+        # Normalement execValidation est une reply
+        return execValidation
 
     def finalise(self, close=False, reason=None):
         """Finalise somme values depending on reason."""
@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 """To place orders."""
 from time import sleep
+from typing import List
 import logging
 
 from kolaBitMEXBot.kola.settings import API_ERROR_INTERVAL
 from kolaBitMEXBot.kola.utils.general import round_sprice, trim_dic
 from kolaBitMEXBot.kola.utils.pricefunc import setdef_stopPrice
 from kolaBitMEXBot.kola.utils.datefunc import now
-from kolaBitMEXBot.kola.utils.exceptions import InvalidOrdStatus
+from kolaBitMEXBot.kola.utils.exceptions import (
+    InvalidOrder,
+    InvalidOrdStatus,
+    MaxRetries,
+)
 from kolaBitMEXBot.kola.utils.constantes import PRICE_PRECISION
 
 # from kolaBitMEXBot.kola.utils.logfunc import get_logger
@@ -115,6 +120,75 @@ def place_LIT(brg, side, orderqty, stoppx, price, **opts):
     return brg.bto.place(orderqty, side=side, asBulk=True, **opts)
 
 
+class BulkPlacer:
+    """
+    Un Bargain qui diffère les placements pour les envoyer en un seul bulk.
+
+    Les fonctions place_* s'en servent comme d'un Bargain: brg.bto.place
+    enregistre l'ordre au lieu de l'envoyer, les autres attributs sont ceux
+    du Bargain.  send place ensuite tous les ordres en un POST order/bulk.
+    """
+
+    def __init__(self, brg):
+        self.brg = brg
+        self.orders: List[dict] = []
+
+    def __repr__(self):
+        return f"BulkPlacer({self.brg}, orders={len(self.orders)})"
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __getattr__(self, name):
+        return getattr(self.brg, name)
+
+    @property
+    def bto(self):
+        """Only place is used by the place_* functions."""
+        return self
+
+    def place(self, orderQty, side=None, clOrdID=None, asBulk=False, **opts):
+        """Record the order, see BitMEX.place."""
+        self.orders.append(
+            {"orderQty": orderQty, "side": side, "clOrdID": clOrdID, **opts}
+        )
+
+    def send(self) -> list:
+        """
+        Place the recorded orders in one bulk, return their replies in order.
+
+        Un bulk refusé (solde insuffisant, quantité invalide...) l'est pour
+        tous ses ordres: ils sont alors replacés un par un pour que chacun
+        ait sa réponse ou son exception.  Toute autre erreur (endpoint en
+        panne, connexion...) est la réponse de chacun des ordres.
+        """
+        orders, self.orders = self.orders, []
+        if not orders:
+            return []
+
+        bto = self.brg.bto
+        try:
+            replies = bto.create_bulk_orders(orders)
+            if len(replies) == len(orders):
+                return replies
+            mlogger.warning(f"{len(replies)} replies for {len(orders)} orders.")
+        except MaxRetries as e:
+            return [e] * len(orders)
+        except InvalidOrder as e:
+            mlogger.warning(f"Bulk placement failed ({e}), placing one by one.")
+        except Exception as e:
+            mlogger.exception(f"Bulk placement of {len(orders)} orders failed.")
+            return [e] * len(orders)
+
+        replies = []
+        for order in orders:
+            try:
+                replies.append(bto.place(asBulk=True, **order))
+            except Exception as e:
+                replies.append(e)
+        return replies
+
+
 # ### alias ####
 
 
@@ -206,23 +280,7 @@ def amend_prices(
     # devrait être fait en deux fois via chronos
     newOrder = {"orderID": orderid}
     absdelta = PRICE_PRECISION[brg.symbol] if absdelta is None else absdelta
-
-    which = which_.replace("amend", "")  # I get a standard order
-    assert which != "Market", "Market orders cannot be amended."
-    newStopPx = {}
-
-    if which in ["Stop", "MarketIfTouched"]:
-        newPrice = {"stopPx": newprice}
-    elif which == "Limit":
-        newPrice = {"price": newprice}
-    elif which in ["StopLimit", "LimitIfTouched"]:
-        newPrice = {"price": newprice}
-        assert side, f'Il faut renseigner "side" pour pouvoir amender "{which}"'
-        newStopPx = {
-            "stopPx": setdef_stopPrice(
-                entryPrice=newprice, side=side, ordtype=which, absdelta=absdelta
-            )
-        }
+    newPrice, newStopPx = get_amended_prices(newprice, which_, side, absdelta)
 
     newPrices = [newPrice, newStopPx]
     mlogger.info(f"Amending {newOrder} and {newPrices}")
@@ -247,6 +305,49 @@ def amend_prices(
     return amendedPx
 
 
+def get_amended_prices(newprice, which_, side=None, absdelta=1):
+    """
+    Return the ({price or stopPx}, {stopPx} or {}) to amend an order of type which_.
+
+    Pour les StopLimit et LimitIfTouched, newprice est le prix limite et le
+    stopPx en est déduit avec absdelta.
+    """
+    which = which_.replace("amend", "")  # I get a standard order
+    assert which != "Market", "Market orders cannot be amended."
+    newStopPx = {}
+
+    if which in ["Stop", "MarketIfTouched"]:
+        newPrice = {"stopPx": newprice}
+    elif which == "Limit":
+        newPrice = {"price": newprice}
+    elif which in ["StopLimit", "LimitIfTouched"]:
+        newPrice = {"price": newprice}
+        assert side, f'Il faut renseigner "side" pour pouvoir amender "{which}"'
+        newStopPx = {
+            "stopPx": setdef_stopPrice(
+                entryPrice=newprice, side=side, ordtype=which, absdelta=absdelta
+            )
+        }
+
+    return newPrice, newStopPx
+
+
+def get_bulk_amend(orderid, newprice, which_, side=None, absdelta=1, text=""):
+    """
+    Return the amend of orderid for amend_bulk_orders.
+
+    Contrairement à amend_prices, le prix et le stopPx des StopLimit et
+    LimitIfTouched sont amendés ensemble.
+    """
+    newPrice, newStopPx = get_amended_prices(newprice, which_, side, absdelta)
+    amend = {"orderID": orderid, **newPrice, **newStopPx}
+    if newStopPx:
+        amend["text"] = text + f"{now(), newPrice, newStopPx}"
+    elif text:
+        amend["text"] = text
+    return amend
+
+
 def amend_stop_price(brg, orderID, newStopPx):
     """Amend the stop price of an order.
     Params:
@@ -418,7 +519,13 @@ def is_newPrice_valide(brg, side, newPrice):
 
 
 def get_execPrice(
-    brg, side, typeprice=None, deftypeprice="lastPrice", symbol=None, _forceLive=False
+    brg,
+    side,
+    typeprice=None,
+    deftypeprice="lastPrice",
+    symbol=None,
+    _forceLive=False,
+    orderQty=None,
 ):
     """
     Return the current market price defined by the typeprice (def. lastMidPrice).
@@ -426,6 +533,8 @@ def get_execPrice(
     typeprice can be a dictionary with execInst.
     Will check for the price type in execInst.
     - symbol: the symbol to get the price for
+    - orderQty: pour typeprice 'impactPrice', le prix moyen d'exécution de
+    orderQty dans le carnet d'ordres (cf. Bargain.impact_price)
     """
     if typeprice is None:
         # 'lastMidPrice'  # == markPrice ?
@@ -443,6 +552,8 @@ def get_execPrice(
         raise Exception(msg)
 
     try:
+        if typePrice.lower() == "impactprice" and orderQty:
+            return brg.impact_price(side, orderQty, symbol)
         return brg.prices(
             typeprice=typePrice, side=side, symbol_=symbol, force_live=_forceLive
         )
@@ -226,6 +226,8 @@ class TrailStop(OrderConditionned):
             timeBin=self.timeBin,
             logger=self.logger,
             symbol=self.symbol,
+            # les trades sont des lastPrice
+            trades=self.brg.trades if self.refPrice_type == "lastPrice" else None,
         )
 
         # on met à jour la condition car déjà crée dans OCT
@@ -259,6 +261,11 @@ class TrailStop(OrderConditionned):
         # maj des tails en fonction des stratégies
         # self.PO.tail_perct = self.PO.set_tail_strategy()
 
+        if self.brg.is_stale():
+            # pas d'amend sur des prix d'avant la coupure du ws
+            self.log("Stale market data, not amending", "WARNING", 10)
+            return {"orderID": orderRefID}
+
         # maj des prix
         self.PO.update_to(
             price=self.brg.prices(self.mPrice_type, self.side),  # mPrice
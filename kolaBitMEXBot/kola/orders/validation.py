@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Validation des ordres de Chronos par un seul thread.
+
+Chaque ordre envoyé attend une exécution (Filled, New, Replaced ou Canceled
+selon son type).  Le ValidationDispatcher garde un index clOrdID ->
+validations en attente et s'abonne à la table execution du websocket: pour
+chaque ligne reçue il ne regarde que les validations de son clOrdID (les
+lignes de nos ordres ont toujours le clOrdID avec l'orderID), soit O(1) par
+exécution.  Son thread rend les validations avec la réponse du broker
+(cf. Chronos.validate) et expire celles dont le timeOut est passé.
+Sans websocket (dummy) les validations en attente sont vérifiées toutes les
+waitstep secondes.
+"""
+from heapq import heappop, heappush
+from itertools import count
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from kolaBitMEXBot.kola.utils.general import trim_dic
+from kolaBitMEXBot.kola.utils.logfunc import get_logger
+from kolaBitMEXBot.kola.utils.orderfunc import get_order_from
+
+
+class Validation:
+    """Une validation en attente: le load, ses conditions et sa deadline."""
+
+    def __init__(
+        self, rcvLoad: dict, clOrdID: str, valconditions, timeOut, reply=None
+    ):
+        """
+        - valconditions: [{"exectype": ..., "orderstatus": ...}], une suffit,
+        - timeOut: pd.Timedelta,
+        - reply: la réponse du broker à l'envoi de l'ordre.
+        """
+        self.rcvLoad = rcvLoad
+        self.clOrdID = clOrdID
+        self.reply = get_order_from(reply) if reply else None
+        self.valconditions = valconditions
+        self.conditions = {(c["exectype"], c["orderstatus"]) for c in valconditions}
+        self.timeOut = timeOut
+        self.start = monotonic()
+        self.deadline = self.start + timeOut.total_seconds()
+
+    def __repr__(self):
+        return f"Validation({self.clOrdID}, {sorted(self.conditions)})"
+
+    def matches(self, row: dict) -> bool:
+        """Tell if the execution row validates the order."""
+        return (row.get("execType"), row.get("ordStatus")) in self.conditions
+
+
+class ValidationDispatcher(Thread):
+    """
+    Le thread qui valide les ordres envoyés par Chronos.
+
+    add enregistre une validation, on_execution (thread du websocket) la
+    résout dès qu'une ligne d'exécution de son clOrdID remplit une de ses
+    conditions, le thread appelle alors on_validation(rcvLoad, brokerReply,
+    execValidation), execValidation étant la réponse ou False.
+    """
+
+    def __init__(
+        self,
+        brg,
+        on_validation: Callable[[dict, Optional[dict], Any], None],
+        check: Callable[[str, list], bool],
+        waitstep: float = 0.1,
+        logger=None,
+    ):
+        """
+        - on_validation: appelé dans le thread pour chaque validation,
+        - check(clOrdID, valconditions): cherche dans la table execution si
+        l'ordre est déjà exécuté, appelé par add (l'exécution a pu arriver
+        avant) et toutes les waitstep s sans websocket.
+        """
+        Thread.__init__(self, name="validations", daemon=True)
+        self.brg = brg
+        self.on_validation = on_validation
+        self.check = check
+        self.waitstep = waitstep
+        self.logger = get_logger(logger, name=__name__, sLL="INFO")
+        self.stop = False
+        self.polling = False
+
+        self._lock = Lock()
+        self.pending: Dict[str, List[Validation]] = {}
+        # (deadline, n, validation), n départage les deadlines égales
+        self.deadlines: List[Tuple[float, int, Validation]] = []
+        self._count = count()
+        # (validation, exécutée) à envoyer par le thread, None le réveille
+        self.resolved: Queue = Queue()
+
+    def __repr__(self):
+        return f"ValidationDispatcher(pending={len(self)})"
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(vs) for vs in self.pending.values())
+
+    def start(self):
+        """Subscribe to the execution table and start the thread."""
+        self.polling = not self.brg.subscribe("execution", self.on_execution)
+        self.logger.info(f"Validations started, polling={self.polling}")
+        Thread.start(self)
+
+    def run(self):
+        """Resolve and expire the validations until stop."""
+        try:
+            while not self.stop:
+                try:
+                    item = self.resolved.get(timeout=self.next_timeout())
+                except Empty:
+                    item = None
+                if item is not None:
+                    self.validate(*item)
+                if self.polling:
+                    self.poll()
+                self.expire()
+        finally:
+            if not self.polling:
+                self.brg.unsubscribe("execution", self.on_execution)
+
+    def next_timeout(self) -> float:
+        """Return how long to wait for a resolved validation, in s."""
+        if self.polling:
+            return self.waitstep
+        with self._lock:
+            if not self.deadlines:
+                return 1.0  # pour voir stop
+            return min(1.0, max(0.0, self.deadlines[0][0] - monotonic()))
+
+    def add(
+        self, rcvLoad: dict, valconditions: list, timeOut: pd.Timedelta, reply=None
+    ):
+        """Wait for the execution of the order of rcvLoad, see on_validation."""
+        bto = self.brg.bto
+        clOrdID = bto.dummyID if bto.dummy else get_order_from(rcvLoad)["clOrdID"]
+        validation = Validation(rcvLoad, clOrdID, valconditions, timeOut, reply)
+        with self._lock:
+            self.pending.setdefault(clOrdID, []).append(validation)
+            heappush(
+                self.deadlines, (validation.deadline, next(self._count), validation)
+            )
+
+        if self.check(clOrdID, valconditions) and self.take(validation):
+            self.resolved.put((validation, True))
+        else:
+            self.resolved.put(None)  # nouvelle deadline à attendre
+
+    def take(self, validation: Validation) -> bool:
+        """Remove validation from the pending ones, False if it was not there."""
+        with self._lock:
+            validations = self.pending.get(validation.clOrdID, [])
+            if validation not in validations:
+                return False
+            validations.remove(validation)
+            if not validations:
+                del self.pending[validation.clOrdID]
+            return True
+
+    def on_execution(self, table: str, rows: list):
+        """Resolve the validations of the rows, called by the websocket."""
+        resolved = []
+        with self._lock:
+            for row in rows:
+                validations = self.pending.get(row.get("clOrdID"))
+                if not validations:
+                    continue
+                matched = [v for v in validations if v.matches(row)]
+                for validation in matched:
+                    validations.remove(validation)
+                    resolved.append(validation)
+                if not validations:
+                    del self.pending[row["clOrdID"]]
+
+        for validation in resolved:
+            self.resolved.put((validation, True))
+
+    def poll(self):
+        """Check the pending validations in the execution table (dummy)."""
+        with self._lock:
+            validations = [v for vs in self.pending.values() for v in vs]
+        for validation in validations:
+            if self.check(validation.clOrdID, validation.valconditions):
+                if self.take(validation):
+                    self.validate(validation, True)
+
+    def expire(self):
+        """Fail the validations whose deadline passed."""
+        expired = []
+        with self._lock:
+            t = monotonic()
+            while self.deadlines and self.deadlines[0][0] <= t:
+                expired.append(heappop(self.deadlines)[2])
+        for validation in expired:
+            if self.take(validation):
+                self.validate(validation, False)
+
+    def validate(self, validation: Validation, executed: bool):
+        """Send the validation of the order, see on_validation."""
+        reply = validation.reply
+        if executed and reply is not None and not reply.get("error", False):
+            result = reply
+        else:
+            result = False
+
+        waited = pd.Timedelta(monotonic() - validation.start, unit="s")
+        self.logger.info(
+            f"_Attendu {waited}_  "
+            f"Validation for {validation.clOrdID} is {bool(result)}."
+        )
+        if executed and reply is None:
+            self.logger.warning(f"No reply for {validation.clOrdID}.")
+        elif not executed:
+            self.logger.debug(f"Timed out, reply={trim_dic(reply, trimid=12)}")
+
+        self.on_validation(validation.rcvLoad, reply, result)
@@ -40,6 +40,7 @@ class PriceObj:
         logger=None,
         min_flex: float = 0.2,
         symbol: symbT = "XBTUSD",
+        trades=None,
     ):
         """
         Head is the direction, need a price (market price and ref price) and
@@ -63,9 +64,14 @@ class PriceObj:
         la variation de prix.
         avec la updatepause permet d'estimer la main_window_size
         - symbol: keep track of price symbol to format and round price correctly
+        - trades: une fonction (eg. Bargain.trades) renvoyant les colonnes
+        timestamp et price des derniers trades, appelée avec copy=True. Si
+        présente, la variation des prix est calculée sur les trades plutôt
+        que sur l'historique de self.data
         """
 
         self.logger = get_logger(logger, sLL="INFO", name=__name__)
+        self.trades = trades
 
         self.head = head
         self.refPrice = refPrice
@@ -268,6 +274,13 @@ class PriceObj:
 
     def get_current_variation(self):
         """Renvoie var % des derniers et avant derniers prix moyens."""
+        if getattr(self, "trades", None) is not None:
+            # une copie: searchsorted veut des timestamps triés, les vues du
+            # ring sont réécrites par le ws
+            _trades = self.trades(copy=True)
+            if _trades is not None and len(_trades["price"]):
+                return self.get_trades_variation(_trades)
+
         if getattr(self, "data", None) is None:
             return 0, 0, 0
         # on suppose que le data à les données nécessaire pour les calculs suivants
@@ -289,6 +302,32 @@ class PriceObj:
                 mean_prev_price,
             )
 
+    def get_trades_variation(self, trades):
+        """
+        Renvoie var % des prix moyens des trades sur les deux dernières timeBin.
+
+        trades contient les colonnes numpy timestamp et price (ordre croissant),
+        une copie cohérente du ring (cf. Bargain.trades), les bins sont
+        relatives au dernier trade reçu.
+        """
+        times, prices = trades["timestamp"], trades["price"]
+        timeBin = np.timedelta64(int(self.timeBin * 1000), "ms")
+        last = times[-1]
+        prevStart, currStart = np.searchsorted(
+            times, [last - 2 * timeBin, last - timeBin], side="right"
+        )
+        if prevStart == currStart:
+            return 0, np.nan, np.nan
+
+        mean_curr_price = prices[currStart:].mean()
+        mean_prev_price = prices[prevStart:currStart].mean()
+
+        return (
+            (mean_curr_price - mean_prev_price) / mean_prev_price * 100,
+            mean_curr_price,
+            mean_prev_price,
+        )
+
     def get_scale(self, current_var):
         """
         implémente e^-f(t)
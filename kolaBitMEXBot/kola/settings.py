@@ -2,9 +2,66 @@
 API_REST_INTERVAL = 5
 API_ERROR_INTERVAL = 10
 HTTP_SIMPLE_RATE_LIMITE = 1.5
-HTTP_BULK_RATE_LIMITE = 0.30
+# requêtes REST permises par période en s, par clé d'API, cf. TokenBucket
+# (recalé sur les en-têtes X-Ratelimit-* des réponses)
+HTTP_RATE_LIMIT = (120, 60)
+# connexions keep-alive du pool REST de BitMEX, à régler sur le nb de threads
+# qui font des requêtes (Chronos, validations, trailstops...).  Avec
+# HTTP_POOL_BLOCK un thread attend une connexion libre plutôt qu'en ouvrir une
+HTTP_POOL_SIZE = 16
+HTTP_POOL_BLOCK = True
+# relance des requêtes REST en échec passager (timeout, 429, 502, 503):
+# nb max de tentatives, pause (base, plafond) en s et durée max en s
+# depuis le premier envoi, cf. RetryPolicy
+HTTP_MAX_RETRIES = 10
+HTTP_BACKOFF = (0.5, 16)
+HTTP_DEADLINE = 60
+# disjoncteur par endpoint: (nb d'échecs de suite pour l'ouvrir, s avant
+# une requête d'essai), cf. CircuitBreaker
+HTTP_BREAKER = (5, 30)
+# threads qui relancent les GET en tâche de fond, cf. BitMEX.fetch
+HTTP_BACKGROUND_WORKERS = 2
+# mesure les durées, retries et octets des requêtes REST par endpoint,
+# cf. BitMEX.http_stats
+HTTP_METRICS = True
+# connexions simultanées max du client REST asyncio, cf. AsyncBitMEXRest
+HTTP_ASYNC_CONNECTIONS = 8
+# cache des trades agrégés (trade/bucketed), cf. BucketCache
+# format "parquet" ou "feather" (nécessitent pyarrow)
+BUCKET_CACHE_DIR = "./Cache/buckets"
+BUCKET_CACHE_FORMAT = "parquet"
 TIMEOUT = 12
+# s pendant lesquelles Chronos regroupe les amends en un amend_bulk_orders,
+# 0 ou None pour les envoyer un par un, cf. AmendCoalescer
+AMEND_WINDOW = 0.05
+# nb max d'ordres que Chronos lit d'un coup dans sa file et place en un bulk
+BULK_MAX_ORDERS = 10
+# s d'attente qui font gagner une classe de priorité à un load de Chronos,
+# 0 ou None pour une priorité stricte, cf. LoadQueue
+LOAD_AGING = 0.5
 SYMBOL = "XBTUSD"
+
+# nombre de lignes gardées pour les tables en ring buffer du websocket
+RING_CAPACITY = {"trade": 2000, "quote": 2000, "execution": 1000}
+
+# décodeur json des messages du websocket: "orjson", "simdjson", "json"
+# ou None pour le plus rapide des décodeurs installés
+JSON_DECODER = None
+# transport du websocket: "thread" (websocket-client) ou "asyncio" (websockets)
+WS_TRANSPORT = "thread"
+# fichier où enregistrer les messages bruts du websocket, pour les rejouer
+# ({date} est remplacé par la date de connexion), None pour ne rien enregistrer
+WS_CAPTURE = None
+# carnet d'ordres suivi par symbol: "orderBookL2", "orderBookL2_25" (25 niveaux)
+# ou None pour ne pas souscrire, cf. BitMEXWebsocket.market_depth
+WS_ORDERBOOK = "orderBookL2"
+# délai de reconnexion du websocket en s: (base, plafond), cf. get_backoff
+WS_BACKOFF = (0.5, 30)
+# mesure les débits et délais des messages du websocket (~3µs par message),
+# cf. BitMEXWebsocket.metrics
+WS_METRICS = True
+# période en s du log de ces mesures par MarketAuditeur, None pour ne pas logger
+WS_METRICS_LOG_PERIOD = 600
 ORDERID_PREFIX = "mlk_"
 
 LIVE = False
@@ -20,6 +77,10 @@ XBTSATOSHI = 10 ** -8
 # for portfolio calculation
 CONTRACTS = ["XBTUSD"]
 
+# instruments suivis par le websocket en plus du symbol et de son index
+# de référence (cf. SETTLEMENTPRICES)
+INSTRUMENTS_ALLOWLIST = list(CONTRACTS)
+
 # definie if the run parse commande line or takes arguments from setting file
 PARSE_COMMANDE_LINE = True
 
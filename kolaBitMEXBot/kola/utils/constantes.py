@@ -19,6 +19,63 @@ EXECOLS = [
 
 EXECOLS_L = EXECOLS + ["lastQty", "lastPx", "lastMkt", "commission"]
 
+# colonnes (et dtype numpy) des tables du ws gardées en ring buffer
+# cf. kola.connexion.wstables.RingTable
+TRADE_SCHEMA = {
+    "timestamp": "datetime64[ms]",
+    "symbol": "O",
+    "side": "O",
+    "size": "float64",
+    "price": "float64",
+    "tickDirection": "O",
+    "trdMatchID": "O",
+    "grossValue": "float64",
+    "homeNotional": "float64",
+    "foreignNotional": "float64",
+}
+
+QUOTE_SCHEMA = {
+    "timestamp": "datetime64[ms]",
+    "symbol": "O",
+    "bidSize": "float64",
+    "bidPrice": "float64",
+    "askPrice": "float64",
+    "askSize": "float64",
+}
+
+# les executions gardent leurs valeurs python (None) sauf les dates
+EXECUTION_SCHEMA = {
+    **{col: "O" for col in EXECOLS_L},
+    **{
+        col: "O"
+        for col in [
+            "execID",
+            "symbol",
+            "pegPriceType",
+            "pegOffsetValue",
+            "leavesQty",
+            "cumQty",
+            "avgPx",
+            "execCost",
+            "execComm",
+            "homeNotional",
+            "foreignNotional",
+            "text",
+        ]
+    },
+    "transactTime": "datetime64[ms]",
+    "timestamp": "datetime64[ms]",
+}
+
+RING_SCHEMAS = {
+    "trade": TRADE_SCHEMA,
+    "quote": QUOTE_SCHEMA,
+    "execution": EXECUTION_SCHEMA,
+}
+
+# tables du websocket rangées dans un carnet trié, cf. wstables.OrderBookL2
+BOOK_TABLES = ("orderBookL2", "orderBookL2_25")
+
 # to get price in bargain.price
 SETTLEMENTPRICES = {"XBTUSD": ".BXBT", "ADAU20": ".BADAXBT30M"}
 
@@ -20,6 +20,11 @@ class MaxRetries(InvalidOrder):
         super().__init__(message, load, extra)
 
 
+class CircuitOpen(MaxRetries):
+    def __init__(self, message, load=None, extra=None):
+        super().__init__(message, load, extra)
+
+
 class InvalidOrdStatus(InvalidOrder):
     def __init__(self, message, load=None, extra=None):
         super().__init__(message, load, extra)
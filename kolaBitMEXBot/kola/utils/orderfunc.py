@@ -4,6 +4,7 @@ from uuid import uuid4
 import re
 from typing import Optional
 
+from kolaBitMEXBot.kola.orders.order import Load, Order
 from kolaBitMEXBot.kola.utils.pricefunc import get_prix_decl, setdef_stopPrice
 from kolaBitMEXBot.kola.utils.general import opt_add_to_, contains
 from kolaBitMEXBot.kola.settings import LOGNAME, ORDERID_PREFIX
@@ -70,6 +71,17 @@ def newClID(prefix=ORDERID_PREFIX, abbv_=""):
     return prefix + abbv_ + b64encode(uuid4().bytes).decode("utf8").rstrip("=\n")
 
 
+def renewClID(clOrdID: str):
+    """
+    Génère un nouvel identifiant qui garde le prefix et l'abbreviation de
+    clOrdID (cf. newClID), pour renvoyer un ordre que bitmex a refusé.
+    """
+    uuid = newClID(prefix="")
+    if len(clOrdID) > len(uuid):
+        return newClID(prefix=clOrdID[: -len(uuid)])
+    return newClID()
+
+
 def get_abbv_from_ID(oClOrdID_: str):
     """Identify dans oClOrdID_ ce qui ressemble à une abbrevation de hook.
 
@@ -83,7 +95,7 @@ def create_order(
     side, _q, opType, ordtype, execinst, prices=None, absdelta=0.5, text=None
 ):
     """
-    Crée un 'side' ordre de type ordtype et de volume '_q'.
+    Crée un 'side' ordre (un Order) de type ordtype et de volume '_q'.
     Ajoute les options 'execinst'.
     Si ordtype is stopLimit ou LimitIfTouched, absdelta détermine l'écart entre
     le prix d'entrée sur le marché et le stopPrice.
@@ -100,30 +112,30 @@ def create_order(
         raise Exception(msg)
 
     # création de l'ordre principal
-    order = {"side": side, "orderQty": _q}
+    order = Order(side=side, orderQty=_q)
 
     if ordtype == "Limit":
-        order["price"] = get_prix_decl(prices, side, ordtype)
+        order.price = get_prix_decl(prices, side, ordtype)
     elif ordtype in ["Stop", "MarketIfTouched"]:
-        order["stopPx"] = get_prix_decl(prices, side, ordtype)
+        order.stopPx = get_prix_decl(prices, side, ordtype)
     elif ordtype in ["StopLimit", "LimitIfTouched"]:
         _price = get_prix_decl(prices, side, ordtype)
-        order["price"] = _price
-        order["stopPx"] = setdef_stopPrice(_price, side, ordtype, absdelta)
+        order.price = _price
+        order.stopPx = setdef_stopPrice(_price, side, ordtype, absdelta)
     else:
         # cad ou ordType == 'Market'
         # par défault le prix sera celui du marché lorsque la condition sera validé
         pass
 
-    order["ordType"] = ordtype
+    order.ordType = ordtype
 
     # on traduit le nom lastMidPrice en un nom de prix reconnu par Bitmex.
     # lastMidPrice nous sert pour définir correctement le stop price (il me semble)
     opType = "lastPrice" if opType == "lastMidPrice" else opType
-    order["execInst"] = opt_add_to_(
+    order.execInst = opt_add_to_(
         opType, execinst
     )  # ': 'ReduceOnly',  #'ParticipateDoNotInitiate',
-    order["text"] = text
+    order.text = text
     return order
 
 
@@ -132,6 +144,10 @@ def get_order_from(rcvLoad):
     Find an order in the received load and return it,
     if the load is empty juste return it like that
     """
+    if isinstance(rcvLoad, Load):
+        return rcvLoad.order
+    if isinstance(rcvLoad, Order):
+        return rcvLoad
 
     if not rcvLoad:
         # we handle the case of empty loads
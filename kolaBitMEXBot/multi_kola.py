@@ -16,6 +16,7 @@ from kolaBitMEXBot.kola.bargain import Bargain
 from kolaBitMEXBot.kola.chronos import Chronos
 from kolaBitMEXBot.kola.dummy_bitmex import DummyBitMEX
 from kolaBitMEXBot.kola.orders.hookorder import HookOrder
+from kolaBitMEXBot.kola.orders.loadqueue import LoadQueue
 from kolaBitMEXBot.kola.orders.ordercond import OrderConditionned
 from kolaBitMEXBot.kola.orders.trailstop import TrailStop
 from kolaBitMEXBot.kola.settings import (
@@ -23,6 +24,7 @@ from kolaBitMEXBot.kola.settings import (
     HTTP_SIMPLE_RATE_LIMITE,
     LOGNAME,
     LOGFMT,
+    WS_METRICS_LOG_PERIOD,
     ordStatusTrans,
 )
 from kolaBitMEXBot.kola.utils.argfunc import (
@@ -46,10 +48,13 @@ time.tzset()
 class MarketAuditeur:
     """Classe du Market Auditeur."""
 
-    def __init__(self, live: bool = False, dbo=None, logger=None, symbol=SYMBOL):
+    def __init__(
+        self, live: bool = False, dbo=None, logger=None, symbol=SYMBOL, ws=None
+    ):
         """
         Une classe  pour placer un ordre conditionné et sa trace sur bitmex.
         Place an order pair on symbol market. 
+        - ws: la connexion d'un autre auditeur (ma.brg.bto.ws) à partager
 
         Un auditeur de marché, c'est une connexion qui écoute les prix du marché
         - serveur chronos:  envoie les ordres au marché
@@ -65,6 +70,7 @@ class MarketAuditeur:
         self.symbol = symbol
 
         self.dbo = dbo  # dummy bitmex for test
+        self.ws = ws  # websocket partagé avec d'autres symbols
 
         # on garde un suivi de la balance ici pour further analysis
         self.resultats = pd.DataFrame(
@@ -95,14 +101,18 @@ class MarketAuditeur:
     def start_server(self):
         """Démarre les services."""
         # canal échange ordre, serveur dispacheur
-        self.fileDattente: Queue = Queue()
+        self.fileDattente: Queue = LoadQueue()
 
         # canal échange ordre, serveur dispacheur
         self.fileDeConfirmation: Queue = Queue()
 
         # connexion avec Bitmex
         self.brg: Bargain = Bargain(
-            live=self.live, logger=self.logger, dbo=self.dbo, symbol=self.symbol
+            live=self.live,
+            logger=self.logger,
+            dbo=self.dbo,
+            symbol=self.symbol,
+            ws=self.ws,
         )
         # Serveur dispacheur d'ordre
         self.chrs: Chronos = Chronos(
@@ -112,6 +122,14 @@ class MarketAuditeur:
             logger=self.logger,
         )
         self.chrs.start()
+        # mesures du websocket et des requêtes REST
+        if self.dbo is None and WS_METRICS_LOG_PERIOD:
+            threading.Thread(
+                target=self.log_metrics,
+                args=(WS_METRICS_LOG_PERIOD,),
+                name="metrics",
+                daemon=True,
+            ).start()
         # Resultats financiers
         self.resultats.loc[now(), :] = (self.balance(), np.nan)
 
@@ -394,6 +412,38 @@ class MarketAuditeur:
 
         self.brg.execution.to_csv(fout_)  # append
 
+    def log_metrics(self, period=WS_METRICS_LOG_PERIOD):
+        """
+        Log the websocket, REST and Chronos queue metrics every period s until stop.
+
+        Le websocket partagé (self.ws) est logué par l'auditeur qui l'a créé,
+        chacun logue ses requêtes REST et son pool.
+        """
+        while not self.stop:
+            sleep(period)
+            metrics = self.brg.ws_metrics() if self.ws is None else None
+            if metrics is not None and len(metrics):
+                self.logger.info(f"ws metrics (ms):\n{metrics.round(2)}")
+
+            metrics = self.brg.http_stats()
+            if metrics is not None and len(metrics):
+                self.logger.info(
+                    f"http metrics (ms), pool={self.brg.bto.pool_stats()}:\n"
+                    f"{metrics.round(2)}"
+                )
+
+            metrics = self.chrs.queue_stats()
+            if metrics is not None and len(metrics):
+                self.logger.info(f"chronos queue (ms):\n{metrics.round(2)}")
+
+    def dump_ws_metrics(self, fout_="./Logs/ws_metrics.csv"):
+        """Write the websocket metrics to fout_, return them."""
+        metrics = self.brg.ws_metrics()
+        if metrics is not None:
+            self.logger.info(f"Dumping ws metrics to {fout_}")
+            metrics.to_csv(fout_)
+        return metrics
+
     def fin_essai(self, i, n, close=False, dr_pause=None, dr_essai_theo=None):
         """
         Affiche les infos de finalisation de l'esssai et close quantity close.
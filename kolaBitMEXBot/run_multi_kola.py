@@ -12,6 +12,8 @@ from kolaBitMEXBot.multi_kola import MarketAuditeur, go_multi
 
 rlogger = setup_logging()
 
+SYMBOL_DEF = "XBTUSD"  # define the market to listent too
+
 
 class argsO:
     def __init__(
@@ -61,25 +63,40 @@ def main_prg():
         fmt_=LOGFMT,
     )
 
-    dbo = DummyBitMEX(up=0, logger=logger) if cmdArgs.dummy else None
-
-    tma = MarketAuditeur(
-        live=cmdArgs.liveRun, dbo=dbo, logger=logger, symbol=cmdArgs.symbol
+    symbols = cmdArgs.symbol or [SYMBOL_DEF]
+    morders = cmdArgs.morders or [get_morders_def(s) for s in symbols]
+    assert len(symbols) == len(morders), (
+        f"One morders file per symbol but symbols={symbols} and morders={morders}"
     )
-    tma.start_server()
 
+    # un market auditeur par symbol, tous sur la connexion ws du premier
+    ws = None
     try:
-        go_multi(
-            tma,
-            arg_file=cmdArgs.morders,
-            logpause=defaultArgs.logPause,
-            updatepause=defaultArgs.updatePause,
-        )
+        for symbol, morder in zip(symbols, morders):
+            dbo = DummyBitMEX(up=0, logger=logger) if cmdArgs.dummy else None
+            tma = MarketAuditeur(
+                live=cmdArgs.liveRun, dbo=dbo, logger=logger, symbol=symbol, ws=ws
+            )
+            tma.start_server()
+            if dbo is None:
+                ws = tma.brg.bto.ws
+
+            go_multi(
+                tma,
+                arg_file=morder,
+                logpause=defaultArgs.logPause,
+                updatepause=defaultArgs.updatePause,
+            )
     except ke.wsException:
         rlogger.exception("Erreur dans la socket... Quelque chose se prépare.")
         # les thread sont-ils alive ?
 
 
+def get_morders_def(symbol):
+    """Return the default morders file of symbol."""
+    return f"./Orders/{symbol.lower()[:3]}_test.tsv"
+
+
 def get_cmd_args():
     """Parse the function's arguments."""
     description = """Lance les ordres du fichier morders."""
@@ -89,19 +106,22 @@ def get_cmd_args():
     logLevel_help = "Le log level"
     dummy_help = "Si présent utilise un dummy bitmex"
     liveRun_help = "Si présent utilise live bitmex !"
-    symbol_def = "XBTUSD"  # define the market to listent too
-    symbol_help = f"Market to listen too. could be XBTM20 XBTU20 ADAU20 BCHM20 ETHUSD LTCM20 (default={symbol_def})"
+    symbol_help = (
+        "Market to listen too. could be XBTM20 XBTU20 ADAU20 BCHM20 ETHUSD LTCM20"
+        f" (default={SYMBOL_DEF}). Can be repeated, all the symbols share"
+        " the same websocket connexion."
+    )
 
-    morders_def = f"./Orders/{symbol_def.lower()[:3]}_test.tsv"
-    morders_help = f"Path to the 'tsv' file containing the market orders. usually one per symbol ({morders_def})."
+    morders_help = (
+        "Path to the 'tsv' file containing the market orders. usually one per"
+        f" symbol, given in the same order ({get_morders_def(SYMBOL_DEF)})."
+    )
 
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
-        "--morders", "-m", type=str, default=morders_def, help=morders_help
-    )
-    parser.add_argument(
-        "--symbol", "-S", type=str, default=symbol_def, help=symbol_help
+        "--morders", "-m", type=str, action="append", help=morders_help
     )
+    parser.add_argument("--symbol", "-S", type=str, action="append", help=symbol_help)
 
     parser.add_argument(
         "--logLevel", "-l", type=str, default=logLevel_def, help=logLevel_help
@@ -35,6 +35,9 @@ setup(
         "dev": ["mypy", "flake8", "black"],
         "packaging": ["twine"],
         "test": ["pytest", "hypothesis"],
+        "fastjson": ["orjson"],
+        "async": ["websockets>=13", "aiohttp"],
+        "history": ["aiohttp", "pyarrow"],
     },
     classifiers=[
         "Development Status :: 4 - Beta",